@@ -1,3 +1,7 @@
 from django.contrib import admin
+from apps.ai.models import GenerationJob, TranscriptJob
 
 # Register your models here.
+
+admin.site.register(GenerationJob)
+admin.site.register(TranscriptJob)
@@ -0,0 +1,118 @@
+"""
+Input compaction stages run before text is sent to the model.
+
+Each stage removes content that costs input tokens without carrying
+anything worth a flashcard: running headers/footers and page numbers
+repeated across PDF pages, caption overlap between transcript chunks, and
+trailing reference lists.
+"""
+
+import re
+from collections import Counter
+
+PAGE_FURNITURE_EDGE_LINES = 2
+PAGE_FURNITURE_MIN_PAGES = 3
+PAGE_FURNITURE_MIN_SHARE = 0.5
+PAGE_FURNITURE_MAX_LINE_CHARS = 100
+REFERENCE_SECTION_MIN_POSITION = 0.6
+CAPTION_OVERLAP_MIN_WORDS = 2
+CAPTION_OVERLAP_MAX_WORDS = 20
+
+_PAGE_NUMBER_LINE = re.compile(
+    r"^\s*(?:page\s+)?[-–—]?\s*\d{1,4}\s*[-–—]?(?:\s*(?:of|/)\s*\d{1,4})?\s*$",
+    re.IGNORECASE,
+)
+_REFERENCE_HEADING = re.compile(
+    r"^[ \t]*(?:\d+\.?[ \t]*)?(?:references|bibliography|works cited|literature cited)[ \t]*:?[ \t]*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+_DIGITS = re.compile(r"\d+")
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+")
+
+
+def _furniture_key(line: str) -> str:
+    # Running headers usually differ only by the page number they carry.
+    return _DIGITS.sub("#", " ".join(line.split()).casefold())
+
+
+def _edge_indices(lines: list[str]) -> list[int]:
+    content = [i for i, line in enumerate(lines) if line.strip()]
+    edge = content[:PAGE_FURNITURE_EDGE_LINES] + content[-PAGE_FURNITURE_EDGE_LINES:]
+    return sorted(set(edge))
+
+
+def strip_page_furniture(pages: list[str]) -> list[str]:
+    """
+    Drops page-number lines and lines repeated at the top or bottom of at
+    least half the pages. Only short lines among the first and last few
+    non-blank lines of a page are candidates, so body text is kept.
+    """
+    split_pages = [page.split("\n") for page in pages]
+
+    repeated = set()
+    if len(pages) >= PAGE_FURNITURE_MIN_PAGES:
+        counts = Counter()
+        for lines in split_pages:
+            counts.update({_furniture_key(lines[i]) for i in _edge_indices(lines)})
+        threshold = max(2, len(pages) * PAGE_FURNITURE_MIN_SHARE)
+        repeated = {key for key, count in counts.items() if count >= threshold}
+
+    compacted = []
+    for lines in split_pages:
+        drop = {
+            i
+            for i in _edge_indices(lines)
+            if _PAGE_NUMBER_LINE.match(lines[i])
+            or (
+                len(lines[i]) <= PAGE_FURNITURE_MAX_LINE_CHARS
+                and _furniture_key(lines[i]) in repeated
+            )
+        }
+        compacted.append("\n".join(line for i, line in enumerate(lines) if i not in drop).strip())
+    return compacted
+
+
+def strip_reference_section(text: str) -> str:
+    """Cuts a trailing reference list that starts in the last part of the text."""
+    match = _REFERENCE_HEADING.search(text, int(len(text) * REFERENCE_SECTION_MIN_POSITION))
+    if match is None:
+        return text
+    return text[: match.start()].rstrip()
+
+
+def trim_caption_overlap(texts: list[str]) -> list[str]:
+    """
+    Rolling captions often repeat the tail of the previous chunk at the
+    start of the next one. Removes that shared run of words, and empties
+    chunks that are exact repeats of the previous one. The result stays
+    aligned with `texts`.
+    """
+    trimmed = []
+    previous: list[str] = []
+    for text in texts:
+        words = text.split()
+        if words and words == previous:
+            trimmed.append("")
+            continue
+        limit = min(len(previous), len(words), CAPTION_OVERLAP_MAX_WORDS)
+        for size in range(limit, CAPTION_OVERLAP_MIN_WORDS - 1, -1):
+            if previous[-size:] == words[:size]:
+                words = words[size:]
+                break
+        trimmed.append(" ".join(words))
+        previous = text.split()
+    return trimmed
+
+
+def collapse_repeated_sentences(text: str) -> str:
+    """Removes sentences that repeat the one immediately before them."""
+    sentences = _SENTENCE_BOUNDARY.split(text)
+    kept = []
+    previous_key = None
+    for sentence in sentences:
+        key = " ".join(sentence.split()).casefold()
+        if key and key == previous_key:
+            continue
+        kept.append(sentence)
+        previous_key = key
+    return " ".join(kept)
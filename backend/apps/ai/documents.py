@@ -0,0 +1,131 @@
+"""
+Server-side document sessions.
+
+Extraction results are kept in the cache under a document id so that
+/generate/ can reference a page or time range of an uploaded document
+instead of the browser sending the text back. Payloads are
+zlib-compressed JSON: extracted text compresses several times over, and
+a 200-page PDF would otherwise cost megabytes of Redis memory per upload.
+
+The id is derived from the user and the document's source (a PDF's
+content hash, a video id), so re-uploading a PDF or changing the range
+of a video reuses the stored entry instead of compressing and storing
+the whole document again.
+"""
+
+import json
+import uuid
+import zlib
+from collections.abc import Callable
+
+from django.core.cache import cache
+from rest_framework.exceptions import NotFound, ValidationError
+
+from apps.ai.pdf import PDF_EXTRACTOR_VERSION
+from apps.ai.services import GENERATION_MAX_INPUT_CHARS, PAGE_SEPARATOR
+from apps.ai.transcript import Transcript
+
+DOCUMENT_TTL_SECONDS = 60 * 60 * 24
+DOCUMENT_KEY_PREFIX = "ai:document"
+DOCUMENT_COMPRESSION_LEVEL = 6
+DOCUMENT_MIN_TEXT_CHARS = 50
+DOCUMENT_ID_NAMESPACE = uuid.UUID("83c91eba-093a-4fc4-94f4-028109e1e0fe")
+
+
+def _document_key(document_id) -> str:
+    return f"{DOCUMENT_KEY_PREFIX}:{document_id}"
+
+
+def document_id_for(user, kind: str, source: str) -> str:
+    return str(uuid.uuid5(DOCUMENT_ID_NAMESPACE, f"{user.pk}:{kind}:{source}"))
+
+
+def store_document(user, kind: str, source: str, build_payload: Callable[[], dict]) -> str:
+    """
+    Stores the document identified by `source` for `user` and returns its
+    id. If it is already stored only its expiry is renewed, and
+    `build_payload` is not called.
+    """
+    document_id = document_id_for(user, kind, source)
+    key = _document_key(document_id)
+    if cache.touch(key, DOCUMENT_TTL_SECONDS):
+        return document_id
+    data = zlib.compress(
+        json.dumps(build_payload(), separators=(",", ":")).encode("utf-8"),
+        DOCUMENT_COMPRESSION_LEVEL,
+    )
+    cache.set(key, {"user_id": user.pk, "kind": kind, "data": data}, DOCUMENT_TTL_SECONDS)
+    return document_id
+
+
+def load_document(user, document_id) -> tuple[str, dict]:
+    """Returns (kind, payload) for one of `user`'s documents."""
+    entry = cache.get(_document_key(document_id))
+    # Someone else's document is reported exactly like an expired one.
+    if entry is None or entry["user_id"] != user.pk:
+        raise NotFound("Document not found or expired. Please upload it again.")
+    return entry["kind"], json.loads(zlib.decompress(entry["data"]))
+
+
+def store_pdf_document(user, content_hash: str, pages: list[str]) -> str:
+    # The extractor version is part of the source: pages extracted by older
+    # code are not reused.
+    source = f"v{PDF_EXTRACTOR_VERSION}:{content_hash}"
+    return store_document(user, "pdf", source, lambda: {"pages": pages})
+
+
+def store_transcript_document(user, video_id: str, transcript: Transcript) -> str:
+    return store_document(
+        user, "youtube", video_id, lambda: {"video_id": video_id, **transcript.to_columns()}
+    )
+
+
+def load_transcript_document(user, document_id) -> Transcript:
+    kind, payload = load_document(user, document_id)
+    if kind != "youtube":
+        raise ValidationError("This document is not a YouTube transcript.")
+    return Transcript.from_columns(payload)
+
+
+def _pdf_range_text(pages: list[str], page_start: int | None, page_end: int | None) -> str:
+    start = page_start or 1
+    end = page_end or len(pages)
+    if start > end or start > len(pages):
+        raise ValidationError(f"Page range must fall within 1–{len(pages)}.")
+    return PAGE_SEPARATOR.join(pages[start - 1 : end]).strip()
+
+
+def _transcript_range_text(
+    transcript: Transcript, start_seconds: int | None, end_seconds: int | None
+) -> str:
+    start = start_seconds or 0
+    end = end_seconds if end_seconds is not None else float("inf")
+    if start >= end:
+        raise ValidationError("end_seconds must be after start_seconds.")
+    return transcript.text_between(start, end)
+
+
+def resolve_generation_input(user, data: dict) -> tuple[str, str]:
+    """
+    Returns (input_type, text) for validated GenerateSerializer data. For a
+    document reference the input type comes from the stored document, so
+    credit costs can't be dodged by relabelling it.
+    """
+    if "text" in data:
+        return data["input_type"], data["text"]
+
+    kind, payload = load_document(user, data["document_id"])
+    if kind == "pdf":
+        text = _pdf_range_text(payload["pages"], data.get("page_start"), data.get("page_end"))
+    else:
+        text = _transcript_range_text(
+            Transcript.from_columns(payload), data.get("start_seconds"), data.get("end_seconds")
+        )
+    if len(text) < DOCUMENT_MIN_TEXT_CHARS:
+        raise ValidationError("The selected range has too little text to generate flashcards.")
+    if len(text) > GENERATION_MAX_INPUT_CHARS:
+        raise ValidationError(
+            f"The selected range exceeds {GENERATION_MAX_INPUT_CHARS:,} characters. "
+            "Please narrow it."
+        )
+    return kind, text
@@ -0,0 +1,294 @@
+"""
+Local stand-in for the parts of the Anthropic API the app uses: Messages
+(plain and streamed), token counting and Message Batches. Responses are
+deterministic flashcards derived from the submitted text, so generation
+flows can be exercised end to end without an API key or spend. Output is
+cut at max_tokens (at CHARS_PER_TOKEN characters per token) with
+stop_reason "max_tokens", and an assistant prefill continues from where it
+ends, so continuations behave like the real API. Start it with
+`manage.py run_fake_anthropic` and set ANTHROPIC_BASE_URL to its address;
+the test suite drives it through the real client the same way.
+"""
+
+import json
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_SENTENCE = re.compile(r"[^.!?\n]{20,}[.!?]")
+_BATCH_PATH = re.compile(r"^/v1/messages/batches/(?P<id>[\w-]+)(?P<results>/results)?$")
+CHARS_PER_TOKEN = 4
+STREAM_DELTA_CHARS = 40
+
+
+def _fake_cards(params: dict) -> list[dict]:
+    content = params["messages"][0]["content"]
+    if not isinstance(content, str):
+        content = " ".join(block.get("text", "") for block in content)
+    sentences = [match.group().strip() for match in _SENTENCE.finditer(content)][:15]
+    return [
+        {"front": f"What does the text say about \"{sentence[:60]}\"?", "back": sentence}
+        for sentence in sentences
+    ] or [{"front": "What is this text about?", "back": content[:200]}]
+
+
+def _input_tokens(params: dict) -> int:
+    return len(json.dumps(params)) // CHARS_PER_TOKEN
+
+
+def _fake_output(params: dict) -> tuple[str, str]:
+    """Returns the response text and stop reason for a Messages request."""
+    text = json.dumps(_fake_cards(params))
+    last = params["messages"][-1]
+    if last["role"] == "assistant" and text.startswith(last["content"]):
+        text = text[len(last["content"]) :]
+    limit = params.get("max_tokens", 4096) * CHARS_PER_TOKEN
+    if len(text) > limit:
+        return text[:limit], "max_tokens"
+    return text, "end_turn"
+
+
+def _fake_message(params: dict) -> dict:
+    text, stop_reason = _fake_output(params)
+    return {
+        "id": f"msg_fake_{uuid.uuid4().hex[:24]}",
+        "type": "message",
+        "role": "assistant",
+        "model": params.get("model", "fake"),
+        "content": [{"type": "text", "text": text}],
+        "stop_reason": stop_reason,
+        "stop_sequence": None,
+        "usage": {
+            "input_tokens": _input_tokens(params),
+            "output_tokens": len(text) // CHARS_PER_TOKEN,
+            "cache_creation_input_tokens": 0,
+            "cache_read_input_tokens": 0,
+        },
+    }
+
+
+def _fake_stream_events(params: dict) -> list[tuple[str, dict]]:
+    message = _fake_message(params)
+    text = message["content"][0]["text"]
+    usage = message["usage"]
+    events = [
+        (
+            "message_start",
+            {
+                "type": "message_start",
+                "message": {
+                    **message,
+                    "content": [],
+                    "stop_reason": None,
+                    "usage": {**usage, "output_tokens": 0},
+                },
+            },
+        ),
+        (
+            "content_block_start",
+            {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}},
+        ),
+    ]
+    events.extend(
+        (
+            "content_block_delta",
+            {
+                "type": "content_block_delta",
+                "index": 0,
+                "delta": {"type": "text_delta", "text": text[i : i + STREAM_DELTA_CHARS]},
+            },
+        )
+        for i in range(0, len(text), STREAM_DELTA_CHARS)
+    )
+    events.extend(
+        [
+            ("content_block_stop", {"type": "content_block_stop", "index": 0}),
+            (
+                "message_delta",
+                {
+                    "type": "message_delta",
+                    "delta": {"stop_reason": message["stop_reason"], "stop_sequence": None},
+                    "usage": {"output_tokens": usage["output_tokens"]},
+                },
+            ),
+            ("message_stop", {"type": "message_stop"}),
+        ]
+    )
+    return events
+
+
+def _timestamp(value: datetime | None) -> str | None:
+    return value.isoformat().replace("+00:00", "Z") if value else None
+
+
+class FakeAnthropicState:
+    def __init__(self, batch_delay_seconds: float):
+        self.batch_delay_seconds = batch_delay_seconds
+        self.batches: dict[str, dict] = {}
+        self.stalled_streams = 0
+        self.stall_seconds = 0.0
+        self.lock = threading.Lock()
+
+    def stall_streams(self, count: int, seconds: float) -> None:
+        """
+        Makes the next `count` streamed responses pause for `seconds` after
+        message_start, the way a stuck request sits waiting for its first
+        token.
+        """
+        with self.lock:
+            self.stalled_streams = count
+            self.stall_seconds = seconds
+
+    def take_stall(self) -> float:
+        with self.lock:
+            if not self.stalled_streams:
+                return 0.0
+            self.stalled_streams -= 1
+            return self.stall_seconds
+
+    def create_batch(self, requests: list[dict]) -> dict:
+        batch_id = f"msgbatch_fake_{uuid.uuid4().hex[:24]}"
+        with self.lock:
+            self.batches[batch_id] = {
+                "requests": requests,
+                "created_at": datetime.now(timezone.utc),
+                "created_monotonic": time.monotonic(),
+            }
+        return batch_id
+
+    def batch_payload(self, batch_id: str, base_url: str) -> dict | None:
+        with self.lock:
+            batch = self.batches.get(batch_id)
+        if batch is None:
+            return None
+
+        ended = time.monotonic() - batch["created_monotonic"] >= self.batch_delay_seconds
+        count = len(batch["requests"])
+        created_at = batch["created_at"]
+        return {
+            "id": batch_id,
+            "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": {
+                "processing": 0 if ended else count,
+                "succeeded": count if ended else 0,
+                "errored": 0,
+                "canceled": 0,
+                "expired": 0,
+            },
+            "created_at": _timestamp(created_at),
+            "expires_at": _timestamp(created_at + timedelta(hours=24)),
+            "ended_at": _timestamp(datetime.now(timezone.utc)) if ended else None,
+            "archived_at": None,
+            "cancel_initiated_at": None,
+            "results_url": f"{base_url}/v1/messages/batches/{batch_id}/results" if ended else None,
+        }
+
+    def batch_results(self, batch_id: str) -> list[dict]:
+        with self.lock:
+            requests = self.batches[batch_id]["requests"]
+        return [
+            {
+                "custom_id": request["custom_id"],
+                "result": {"type": "succeeded", "message": _fake_message(request["params"])},
+            }
+            for request in requests
+        ]
+
+
+class FakeAnthropicHandler(BaseHTTPRequestHandler):
+    state: FakeAnthropicState
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _send_json(self, status: int, payload) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_events(self, events: list[tuple[str, dict]], stall_seconds: float = 0.0) -> None:
+        chunks = [
+            f"event: {name}\ndata: {json.dumps(data)}\n\n".encode("utf-8") for name, data in events
+        ]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(sum(map(len, chunks))))
+        self.end_headers()
+        if not stall_seconds:
+            self.wfile.write(b"".join(chunks))
+            return
+
+        self.wfile.write(chunks[0])
+        self.wfile.flush()
+        time.sleep(stall_seconds)
+        try:
+            self.wfile.write(b"".join(chunks[1:]))
+        except OSError:
+            pass  # The client gave up on the stalled response.
+
+    def _not_found(self) -> None:
+        self._send_json(404, {"type": "error", "error": {"type": "not_found_error", "message": "Not found."}})
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_POST(self):
+        path = self.path.split("?")[0]
+        if path == "/v1/messages":
+            params = self._read_json()
+            if params.get("stream"):
+                self._send_events(_fake_stream_events(params), self.state.take_stall())
+            else:
+                self._send_json(200, _fake_message(params))
+        elif path == "/v1/messages/count_tokens":
+            self._send_json(200, {"input_tokens": _input_tokens(self._read_json())})
+        elif path == "/v1/messages/batches":
+            batch_id = self.state.create_batch(self._read_json()["requests"])
+            self._send_json(200, self.state.batch_payload(batch_id, self.base_url))
+        else:
+            self._not_found()
+
+    def do_GET(self):
+        match = _BATCH_PATH.match(self.path.split("?")[0])
+        if match is None:
+            self._not_found()
+            return
+
+        payload = self.state.batch_payload(match["id"], self.base_url)
+        if payload is None:
+            self._not_found()
+        elif not match["results"]:
+            self._send_json(200, payload)
+        elif payload["processing_status"] != "ended":
+            self._not_found()
+        else:
+            body = "\n".join(json.dumps(line) for line in self.state.batch_results(match["id"]))
+            body = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-jsonl")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+
+def make_server(host: str = "127.0.0.1", port: int = 0, batch_delay_seconds: float = 2.0):
+    """Builds (but does not start) a fake server; port 0 picks a free port."""
+    handler = type(
+        "BoundFakeAnthropicHandler",
+        (FakeAnthropicHandler,),
+        {"state": FakeAnthropicState(batch_delay_seconds)},
+    )
+    return ThreadingHTTPServer((host, port), handler)
@@ -0,0 +1,144 @@
+"""
+Local stand-in for the Supadata transcript endpoints the app uses. Any
+video gets a deterministic transcript of `video_minutes` minutes, served
+either directly or through an asynchronous job that completes after
+`job_delay_seconds`; `error_rate` answers that share of requests with a 503
+to exercise the client's retries, and setting `errors_remaining` on the
+state answers exactly that many next requests with one. The state also
+counts requests and the client connections they arrived on. Start it with
+`manage.py run_fake_supadata` and set SUPADATA_BASE_URL to its address.
+"""
+
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+_JOB_PATH = re.compile(r"^/v1/transcript/(?P<id>[\w-]+)$")
+_VIDEO_ID = re.compile(r"(?:v=|youtu\.be/|/shorts/|/embed/)(?P<id>[\w-]{11})")
+_CHUNK_SECONDS = 4
+WORDS = (
+    "today we look at how cells turn nutrients into energy and why the "
+    "gradient across the membrane matters for transport diffusion and signalling"
+).split()
+
+
+def _fake_content(video_id: str, video_minutes: float) -> list[dict]:
+    rng = random.Random(video_id)
+    return [
+        {
+            "text": " ".join(rng.choices(WORDS, k=10)),
+            "offset": start * 1000,
+            "duration": _CHUNK_SECONDS * 1000,
+            "lang": "en",
+        }
+        for start in range(0, int(video_minutes * 60), _CHUNK_SECONDS)
+    ]
+
+
+class FakeSupadataState:
+    def __init__(self, video_minutes: float, job_delay_seconds: float, error_rate: float):
+        self.video_minutes = video_minutes
+        self.job_delay_seconds = job_delay_seconds
+        self.error_rate = error_rate
+        self.errors_remaining = 0
+        self.requests = 0
+        self.connections: set[tuple] = set()
+        self.jobs: dict[str, tuple[str, float]] = {}
+        self.lock = threading.Lock()
+
+    def record_request(self, client_address: tuple) -> bool:
+        """Counts a request and returns whether to answer it with an error."""
+        with self.lock:
+            self.requests += 1
+            self.connections.add(client_address)
+            if self.errors_remaining > 0:
+                self.errors_remaining -= 1
+                return True
+        return random.random() < self.error_rate
+
+    def create_job(self, video_id: str) -> str:
+        job_id = str(uuid.uuid4())
+        with self.lock:
+            self.jobs[job_id] = (video_id, time.monotonic())
+        return job_id
+
+    def job_payload(self, job_id: str) -> dict | None:
+        with self.lock:
+            job = self.jobs.get(job_id)
+        if job is None:
+            return None
+
+        video_id, created = job
+        if time.monotonic() - created < self.job_delay_seconds:
+            return {"status": "active"}
+        return {
+            "status": "completed",
+            "content": _fake_content(video_id, self.video_minutes),
+            "lang": "en",
+            "availableLangs": ["en"],
+        }
+
+
+class FakeSupadataHandler(BaseHTTPRequestHandler):
+    # Keep-alive, like the real API, so connection reuse is observable.
+    protocol_version = "HTTP/1.1"
+    state: FakeSupadataState
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _not_found(self, message: str = "Not found.") -> None:
+        self._send_json(404, {"error": "not-found", "message": message})
+
+    def do_GET(self):
+        if self.state.record_request(self.client_address):
+            self._send_json(503, {"error": "internal-error", "message": "Try again."})
+            return
+
+        parsed = urlparse(self.path)
+        if parsed.path == "/v1/youtube/transcript":
+            match = _VIDEO_ID.search(parse_qs(parsed.query).get("url", [""])[0])
+            if match is None:
+                self._send_json(400, {"error": "invalid-request", "message": "Invalid URL."})
+            elif self.state.job_delay_seconds > 0:
+                self._send_json(202, {"jobId": self.state.create_job(match["id"])})
+            else:
+                content = _fake_content(match["id"], self.state.video_minutes)
+                self._send_json(200, {"content": content, "lang": "en", "availableLangs": ["en"]})
+            return
+
+        match = _JOB_PATH.match(parsed.path)
+        payload = self.state.job_payload(match["id"]) if match else None
+        if payload is None:
+            self._not_found()
+        else:
+            self._send_json(200, payload)
+
+
+def make_server(
+    host: str = "127.0.0.1",
+    port: int = 0,
+    video_minutes: float = 10,
+    job_delay_seconds: float = 0,
+    error_rate: float = 0,
+):
+    """Builds (but does not start) a fake server; port 0 picks a free port."""
+    handler = type(
+        "BoundFakeSupadataHandler",
+        (FakeSupadataHandler,),
+        {"state": FakeSupadataState(video_minutes, job_delay_seconds, error_rate)},
+    )
+    return ThreadingHTTPServer((host, port), handler)
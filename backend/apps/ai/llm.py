@@ -0,0 +1,653 @@
+"""
+Process-wide gateway for every Anthropic call made by the app.
+
+Owns a single keep-alive client, caps in-flight calls with a semaphore,
+retries rate-limit/overload responses with jittered backoff, trips a
+circuit breaker when the provider keeps failing, and records latency and
+token metrics for each call.
+"""
+
+import json
+import logging
+import random
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from statistics import quantiles
+
+import anthropic
+import httpx
+from django.conf import settings
+from django_redis import get_redis_connection
+from rest_framework.exceptions import APIException
+
+from apps.ai.metrics import latency_percentiles
+
+logger = logging.getLogger(__name__)
+
+LLM_MAX_CONCURRENCY = 8
+LLM_QUEUE_TIMEOUT_SECONDS = 30
+LLM_MAX_CONNECTIONS = 20
+LLM_MAX_KEEPALIVE_CONNECTIONS = 10
+LLM_KEEPALIVE_EXPIRY_SECONDS = 60
+LLM_CONNECT_TIMEOUT_SECONDS = 10
+LLM_READ_TIMEOUT_SECONDS = 300
+LLM_MAX_RETRIES = 3
+LLM_RETRY_BASE_DELAY_SECONDS = 1
+LLM_RETRY_MAX_DELAY_SECONDS = 20
+LLM_RETRYABLE_STATUS_CODES = {429, 529}
+LLM_CIRCUIT_FAILURE_THRESHOLD = 5
+LLM_CIRCUIT_RESET_SECONDS = 30
+LLM_METRICS_WINDOW = 500
+LLM_HEDGE_PERCENTILE = 95
+LLM_HEDGE_MIN_SAMPLES = 20
+LLM_HEDGE_MIN_DELAY_SECONDS = 5
+LLM_HEDGE_BUDGET_RATIO = 0.05
+LLM_HEDGE_BUDGET_BURST = 5
+LLM_HISTORY_KEY_PREFIX = "ai:llm-history"
+LLM_HISTORY_SIZE = 200
+
+
+class LLMUnavailableError(APIException):
+    status_code = 503
+    default_detail = "AI generation is temporarily unavailable. Please try again shortly."
+
+
+class HedgeCancelled(Exception):
+    """Raised inside the losing request of a hedged pair to abort its stream."""
+
+
+class CircuitBreaker:
+    """
+    Classic closed/open/half-open breaker. After `failure_threshold`
+    consecutive provider failures calls are rejected immediately for
+    `reset_seconds`; the first call after that is let through as a probe
+    and its outcome decides whether the circuit closes again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_seconds:
+                    raise LLMUnavailableError()
+                self.state = self.HALF_OPEN
+            if self._probe_in_flight:
+                raise LLMUnavailableError()
+            self._probe_in_flight = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning("LLM circuit opened after %d failures", self._failures)
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def release(self) -> None:
+        # A probe that ended without a provider verdict (e.g. a 400) must
+        # not leave the breaker waiting for it forever.
+        with self._lock:
+            self._probe_in_flight = False
+
+
+class LLMMetrics:
+    """In-process counters plus a rolling window of recent call timings."""
+
+    def __init__(self, window: int):
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self._queue_waits = deque(maxlen=window)
+        self._first_token = deque(maxlen=window)
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cache_read_input_tokens = 0
+        self.cache_creation_input_tokens = 0
+        self.cache_read_calls = 0
+        self.hedged_calls = 0
+        self.hedge_wins = 0
+
+    def record_hedge(self, won: bool) -> None:
+        with self._lock:
+            self.hedged_calls += 1
+            if won:
+                self.hedge_wins += 1
+
+    def latency_percentile(self, percentile: int) -> float | None:
+        with self._lock:
+            samples = list(self._latencies)
+        if len(samples) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        return quantiles(samples, n=100, method="inclusive")[percentile - 1]
+
+    def record(
+        self,
+        *,
+        operation: str,
+        model: str,
+        outcome: str,
+        queue_seconds: float,
+        latency_seconds: float,
+        attempts: int,
+        usage=None,
+        first_token_seconds: float | None = None,
+    ) -> None:
+        input_tokens = getattr(usage, "input_tokens", 0) or 0
+        output_tokens = getattr(usage, "output_tokens", 0) or 0
+        cache_read = getattr(usage, "cache_read_input_tokens", 0) or 0
+        cache_creation = getattr(usage, "cache_creation_input_tokens", 0) or 0
+
+        with self._lock:
+            self.calls += 1
+            self.retries += attempts - 1
+            if outcome not in ("ok", "cancelled"):
+                self.errors += 1
+            self.input_tokens += input_tokens
+            self.output_tokens += output_tokens
+            self.cache_read_input_tokens += cache_read
+            self.cache_creation_input_tokens += cache_creation
+            if cache_read:
+                self.cache_read_calls += 1
+            self._queue_waits.append(queue_seconds)
+            if outcome == "ok":
+                self._latencies.append(latency_seconds)
+            if first_token_seconds is not None:
+                self._first_token.append(first_token_seconds)
+
+        if outcome == "ok" and output_tokens:
+            _record_history(
+                model, input_tokens + cache_read + cache_creation, output_tokens, latency_seconds
+            )
+
+        logger.info(
+            "llm %s model=%s outcome=%s queue=%.3fs latency=%.3fs ttft=%s attempts=%d "
+            "input_tokens=%d output_tokens=%d cache_read_tokens=%d cache_creation_tokens=%d",
+            operation,
+            model,
+            outcome,
+            queue_seconds,
+            latency_seconds,
+            f"{first_token_seconds:.3f}s" if first_token_seconds is not None else "-",
+            attempts,
+            input_tokens,
+            output_tokens,
+            cache_read,
+            cache_creation,
+        )
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "errors": self.errors,
+                "retries": self.retries,
+                "input_tokens": self.input_tokens,
+                "output_tokens": self.output_tokens,
+                "cache_read_input_tokens": self.cache_read_input_tokens,
+                "cache_creation_input_tokens": self.cache_creation_input_tokens,
+                "prompt_cache_hit_rate": (
+                    round(self.cache_read_calls / self.calls, 4) if self.calls else 0.0
+                ),
+                "latency_seconds": latency_percentiles(self._latencies),
+                "queue_seconds": latency_percentiles(self._queue_waits),
+                "first_token_seconds": latency_percentiles(self._first_token),
+                "hedged_calls": self.hedged_calls,
+                "hedge_wins": self.hedge_wins,
+                "circuit": breaker.state,
+            }
+
+
+breaker = CircuitBreaker(LLM_CIRCUIT_FAILURE_THRESHOLD, LLM_CIRCUIT_RESET_SECONDS)
+metrics = LLMMetrics(LLM_METRICS_WINDOW)
+
+_client = None
+_client_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+_queue_timeout: float | None = LLM_QUEUE_TIMEOUT_SECONDS
+
+
+def get_client() -> anthropic.Anthropic:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = anthropic.Anthropic(
+                    api_key=settings.ANTHROPIC_API_KEY,
+                    base_url=settings.ANTHROPIC_BASE_URL,
+                    # Retries are handled here so they share the breaker
+                    # and the concurrency slot.
+                    max_retries=0,
+                    http_client=anthropic.DefaultHttpxClient(
+                        limits=httpx.Limits(
+                            max_connections=LLM_MAX_CONNECTIONS,
+                            max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+                            keepalive_expiry=LLM_KEEPALIVE_EXPIRY_SECONDS,
+                        ),
+                        timeout=httpx.Timeout(
+                            LLM_READ_TIMEOUT_SECONDS, connect=LLM_CONNECT_TIMEOUT_SECONDS
+                        ),
+                    ),
+                )
+    return _client
+
+
+def wait_for_slots_indefinitely() -> None:
+    """
+    Makes calls in this process queue for a concurrency slot for as long as
+    it takes, instead of failing as busy after LLM_QUEUE_TIMEOUT_SECONDS.
+    Meant for background workers: nobody is waiting on a response there,
+    and a chunk given up as busy would be lost from its job.
+    """
+    global _queue_timeout
+    _queue_timeout = None
+
+
+@contextmanager
+def _concurrency_slot():
+    queued_at = time.monotonic()
+    if not _slots.acquire(timeout=_queue_timeout):
+        raise LLMUnavailableError("AI generation is busy. Please try again shortly.")
+    try:
+        yield time.monotonic() - queued_at
+    finally:
+        _slots.release()
+
+
+def _is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, anthropic.APIStatusError):
+        return exc.status_code in LLM_RETRYABLE_STATUS_CODES
+    return isinstance(exc, anthropic.APIConnectionError)
+
+
+def _is_provider_failure(exc: Exception) -> bool:
+    if isinstance(exc, anthropic.APIStatusError):
+        return exc.status_code in LLM_RETRYABLE_STATUS_CODES or exc.status_code >= 500
+    return isinstance(exc, anthropic.APIConnectionError)
+
+
+def _retry_delay(attempt: int, exc: Exception) -> float:
+    response = getattr(exc, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), LLM_RETRY_MAX_DELAY_SECONDS)
+        except ValueError:
+            pass
+    # Full jitter keeps retrying workers from stampeding together.
+    ceiling = min(LLM_RETRY_MAX_DELAY_SECONDS, LLM_RETRY_BASE_DELAY_SECONDS * 2**attempt)
+    return random.uniform(0, ceiling)
+
+
+def _with_retries(call):
+    """Runs `call` until it succeeds or fails terminally; returns (result, attempts)."""
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        try:
+            return call(), attempt + 1
+        except Exception as exc:
+            if not _is_retryable(exc) or attempt == LLM_MAX_RETRIES:
+                exc.llm_attempts = attempt + 1
+                raise
+            delay = _retry_delay(attempt, exc)
+            logger.warning("LLM call failed (%s), retrying in %.2fs", exc, delay)
+            time.sleep(delay)
+
+
+def _record_failure(exc: Exception) -> None:
+    if _is_provider_failure(exc):
+        breaker.record_failure()
+    else:
+        breaker.release()
+
+
+def create_message(**params):
+    """Gateway equivalent of client.messages.create()."""
+    with _concurrency_slot() as queue_seconds:
+        # Only consult the breaker once a slot is held: a half-open probe
+        # taken before a queue timeout would never be released.
+        breaker.before_call()
+        started = time.monotonic()
+        try:
+            message, attempts = _with_retries(lambda: get_client().messages.create(**params))
+        except Exception as exc:
+            _record_failure(exc)
+            metrics.record(
+                operation="create",
+                model=params.get("model", ""),
+                outcome=type(exc).__name__,
+                queue_seconds=queue_seconds,
+                latency_seconds=time.monotonic() - started,
+                attempts=getattr(exc, "llm_attempts", 1),
+            )
+            raise
+
+        breaker.record_success()
+        metrics.record(
+            operation="create",
+            model=params.get("model", ""),
+            outcome="ok",
+            queue_seconds=queue_seconds,
+            latency_seconds=time.monotonic() - started,
+            attempts=attempts,
+            usage=message.usage,
+        )
+        return message
+
+
+def _history_key(model: str) -> str:
+    return f"{LLM_HISTORY_KEY_PREFIX}:{model}"
+
+
+def _record_history(model: str, input_tokens: int, output_tokens: int, latency_seconds: float) -> None:
+    # Shared across processes (unlike `metrics`) so estimates reflect the
+    # whole fleet. Losing a sample is harmless, so Redis errors are swallowed.
+    try:
+        redis = get_redis_connection("default")
+        key = _history_key(model)
+        pipeline = redis.pipeline()
+        pipeline.lpush(key, json.dumps([input_tokens, output_tokens, round(latency_seconds, 3)]))
+        pipeline.ltrim(key, 0, LLM_HISTORY_SIZE - 1)
+        pipeline.execute()
+    except Exception:
+        logger.warning("Could not record LLM latency history", exc_info=True)
+
+
+def get_history(model: str) -> list[tuple[int, int, float]]:
+    """Recent (input_tokens, output_tokens, latency_seconds) samples for `model`, newest first."""
+    try:
+        raw = get_redis_connection("default").lrange(_history_key(model), 0, -1)
+    except Exception:
+        logger.warning("Could not read LLM latency history", exc_info=True)
+        return []
+    return [tuple(json.loads(sample)) for sample in raw]
+
+
+def _control_call(operation: str, call):
+    """
+    Batch management calls share the breaker and retry policy but not the
+    concurrency slots, which are reserved for calls that run generation.
+    """
+    breaker.before_call()
+    started = time.monotonic()
+    try:
+        result, attempts = _with_retries(call)
+    except Exception as exc:
+        _record_failure(exc)
+        logger.warning("llm %s failed after %.3fs: %s", operation, time.monotonic() - started, exc)
+        raise
+    breaker.record_success()
+    logger.info("llm %s latency=%.3fs attempts=%d", operation, time.monotonic() - started, attempts)
+    return result
+
+
+def create_batch(requests: list[dict]):
+    """Submits Message Batches API requests ({custom_id, params} dicts)."""
+    return _control_call(
+        "batch_create", lambda: get_client().messages.batches.create(requests=requests)
+    )
+
+
+def count_tokens(**params) -> int:
+    return _control_call(
+        "count_tokens", lambda: get_client().messages.count_tokens(**params)
+    ).input_tokens
+
+
+def retrieve_batch(batch_id: str):
+    return _control_call(
+        "batch_retrieve", lambda: get_client().messages.batches.retrieve(batch_id)
+    )
+
+
+def batch_results(batch_id: str) -> list:
+    return _control_call(
+        "batch_results", lambda: list(get_client().messages.batches.results(batch_id))
+    )
+
+
+class _TimedStream:
+    """Wraps a MessageStream to note when the first text delta arrives."""
+
+    def __init__(self, stream, started: float):
+        self._stream = stream
+        self._started = started
+        self.first_token_seconds = None
+
+    @property
+    def text_stream(self):
+        for text in self._stream.text_stream:
+            if self.first_token_seconds is None:
+                self.first_token_seconds = time.monotonic() - self._started
+            yield text
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+def stream_message(**params):
+    """
+    Gateway equivalent of client.messages.stream(). Only opening the stream
+    is retried; once events are flowing a failure is surfaced to the caller.
+    The concurrency slot is held until the stream is closed.
+    """
+    return _stream_message(params)
+
+
+@contextmanager
+def _stream_message(params: dict, on_slot=None):
+    # on_slot is called once a concurrency slot is held, when the call's
+    # latency (as recorded in metrics) starts counting.
+    with _concurrency_slot() as queue_seconds:
+        breaker.before_call()
+        started = time.monotonic()
+        if on_slot is not None:
+            on_slot()
+
+        def open_stream():
+            manager = get_client().messages.stream(**params)
+            return manager, manager.__enter__()
+
+        try:
+            (manager, stream), attempts = _with_retries(open_stream)
+        except Exception as exc:
+            _record_failure(exc)
+            metrics.record(
+                operation="stream",
+                model=params.get("model", ""),
+                outcome=type(exc).__name__,
+                queue_seconds=queue_seconds,
+                latency_seconds=time.monotonic() - started,
+                attempts=getattr(exc, "llm_attempts", 1),
+            )
+            raise
+
+        timed = _TimedStream(stream, started)
+        outcome = "ok"
+        try:
+            yield timed
+        except BaseException as exc:
+            outcome = "cancelled" if isinstance(exc, HedgeCancelled) else type(exc).__name__
+            if isinstance(exc, Exception):
+                _record_failure(exc)
+            else:
+                breaker.release()
+            manager.__exit__(type(exc), exc, exc.__traceback__)
+            raise
+        else:
+            breaker.record_success()
+            manager.__exit__(None, None, None)
+        finally:
+            try:
+                usage = stream.current_message_snapshot.usage
+            except AssertionError:
+                # No message_start event arrived before the stream ended.
+                usage = None
+            metrics.record(
+                operation="stream",
+                model=params.get("model", ""),
+                outcome=outcome,
+                queue_seconds=queue_seconds,
+                latency_seconds=time.monotonic() - started,
+                attempts=attempts,
+                usage=usage,
+                first_token_seconds=timed.first_token_seconds,
+            )
+
+
+class HedgeBudget:
+    """
+    Token bucket that caps hedges at `ratio` of calls: every call earns
+    `ratio` of a token, every hedge spends one, and at most `burst` tokens
+    can be saved up.
+    """
+
+    def __init__(self, ratio: float, burst: float):
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = 0.0
+        self._lock = threading.Lock()
+
+    def earn(self) -> None:
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+hedge_budget = HedgeBudget(LLM_HEDGE_BUDGET_RATIO, LLM_HEDGE_BUDGET_BURST)
+_hedge_pool = ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENCY * 2, thread_name_prefix="llm-hedge")
+
+
+class _HedgedCall:
+    """
+    One request of a hedged pair, run on _hedge_pool. Streaming under the
+    hood is what makes it cancellable: shutting the stream's socket stops
+    generation (and frees the concurrency slot) at once, even while the
+    request is stalled waiting for its next event, instead of paying for
+    a discarded result.
+    """
+
+    def __init__(self, params: dict):
+        self.params = params
+        # Set once the call holds a concurrency slot, or has finished.
+        self.started = threading.Event()
+        self._cancelled = False
+        self._stream = None
+        self._lock = threading.Lock()
+
+    def run(self):
+        with _stream_message(self.params, on_slot=self.started.set) as stream:
+            with self._lock:
+                self._stream = stream
+                if self._cancelled:
+                    raise HedgeCancelled()
+            try:
+                for _ in stream.text_stream:
+                    if self._cancelled:
+                        raise HedgeCancelled()
+            except HedgeCancelled:
+                raise
+            except Exception:
+                if self._cancelled:
+                    raise HedgeCancelled() from None
+                raise
+            # A socket shut down by cancel() can also read as a clean end.
+            if self._cancelled:
+                raise HedgeCancelled()
+            return stream.get_final_message()
+
+    def cancel(self) -> None:
+        with self._lock:
+            self._cancelled = True
+            stream = self._stream
+        if stream is None:
+            return
+        # Closing the response from this thread wouldn't wake the blocked
+        # read in the call's own; shutting the socket down does, and the
+        # call then closes its stream itself.
+        network_stream = stream.response.extensions.get("network_stream")
+        sock = network_stream.get_extra_info("socket") if network_stream else None
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def submit(self):
+        future = _hedge_pool.submit(self.run)
+        future.add_done_callback(lambda _: self.started.set())
+        return future
+
+
+def hedged_create_message(**params):
+    """
+    create_message() with an optional hedge. When enabled and the call has
+    not finished by the recent LLM_HEDGE_PERCENTILE latency, an identical
+    second request is fired and whichever finishes first wins; the other is
+    cancelled. Hedges are capped by hedge_budget so tail-latency protection
+    never costs more than LLM_HEDGE_BUDGET_RATIO extra calls.
+    """
+    hedge_after = metrics.latency_percentile(LLM_HEDGE_PERCENTILE)
+    if not settings.LLM_HEDGING_ENABLED or hedge_after is None:
+        return create_message(**params)
+
+    hedge_budget.earn()
+    primary = _HedgedCall(params)
+    primary_future = primary.submit()
+    # Time spent queueing for a slot isn't part of the latency the hedge
+    # delay was measured from, so the clock starts once the primary has one.
+    primary.started.wait()
+    done, _ = wait([primary_future], timeout=max(hedge_after, LLM_HEDGE_MIN_DELAY_SECONDS))
+    if done or not hedge_budget.try_spend():
+        return primary_future.result()
+
+    logger.info("Hedging LLM call after %.2fs", hedge_after)
+    hedge = _HedgedCall(params)
+    hedge_future = hedge.submit()
+    calls = {primary_future: primary, hedge_future: hedge}
+
+    pending = {primary_future, hedge_future}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                for loser in pending:
+                    calls[loser].cancel()
+                metrics.record_hedge(won=future is hedge_future)
+                return future.result()
+
+    # Both requests failed; surface the primary's error.
+    metrics.record_hedge(won=False)
+    return primary_future.result()
@@ -0,0 +1,79 @@
+import random
+import re
+import timeit
+
+from django.core.management.base import BaseCommand
+
+from apps.ai.normalization import normalize_pdf_page, normalize_transcript
+
+WORDS = (
+    "cell membrane protein enzyme substrate reaction energy gradient transport "
+    "diffusion osmosis equilibrium pressure volume temperature molecule atom "
+    "bond electron orbital charge field potential current resistance signal"
+).split()
+NOISE = ["  ", "\t", "\n", "\n\n\n\n", "\x0c", "\x01", "-\n"]
+
+
+def _legacy_pdf_page(raw: str) -> str:
+    cleaned = re.sub(r"\n{3,}", "\n\n", raw).strip()
+    cleaned = re.sub(r"[ \t]{2,}", " ", cleaned)
+    return re.sub(r"[\x00-\x08\x0B\x0E-\x1F\x7F]", "", cleaned)
+
+
+def _legacy_transcript(text: str) -> str:
+    text = re.sub(r"\s+", " ", text).strip()
+    return re.sub(r"[\x00-\x08\x0B\x0E-\x1F\x7F]", "", text)
+
+
+def _synthetic_text(rng: random.Random, chars: int) -> str:
+    parts = []
+    size = 0
+    while size < chars:
+        part = rng.choice(WORDS) + (rng.choice(NOISE) if rng.random() < 0.15 else " ")
+        parts.append(part)
+        size += len(part)
+    return "".join(parts)
+
+
+class Command(BaseCommand):
+    help = "Micro-benchmarks the text normalization pipelines against the old re.sub chains."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pages", type=int, default=200, help="Synthetic PDF page count.")
+        parser.add_argument("--page-chars", type=int, default=4000, help="Characters per page.")
+        parser.add_argument(
+            "--transcript-hours", type=float, default=5, help="Synthetic transcript length."
+        )
+        parser.add_argument("--repeat", type=int, default=5, help="Runs per case; the best is reported.")
+
+    def _report(self, label, legacy, current, repeat):
+        legacy_seconds = min(timeit.repeat(legacy, number=1, repeat=repeat))
+        current_seconds = min(timeit.repeat(current, number=1, repeat=repeat))
+        self.stdout.write(
+            f"{label:<12} legacy {legacy_seconds * 1000:8.1f} ms   "
+            f"pipeline {current_seconds * 1000:8.1f} ms   "
+            f"({legacy_seconds / current_seconds:.2f}x)"
+        )
+
+    def handle(self, *args, pages, page_chars, transcript_hours, repeat, **options):
+        rng = random.Random(0)
+        pdf_pages = [_synthetic_text(rng, page_chars) for _ in range(pages)]
+        # Roughly 15 characters of captions per second of speech.
+        transcript = _synthetic_text(rng, int(transcript_hours * 3600 * 15))
+        self.stdout.write(
+            f"{pages} pages x {page_chars} chars, "
+            f"{transcript_hours:g}h transcript ({len(transcript):,} chars)"
+        )
+
+        self._report(
+            "pdf pages",
+            lambda: [_legacy_pdf_page(page) for page in pdf_pages],
+            lambda: [normalize_pdf_page(page) for page in pdf_pages],
+            repeat,
+        )
+        self._report(
+            "transcript",
+            lambda: _legacy_transcript(transcript),
+            lambda: normalize_transcript(transcript),
+            repeat,
+        )
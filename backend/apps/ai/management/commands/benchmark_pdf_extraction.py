@@ -0,0 +1,184 @@
+import multiprocessing
+import os
+import random
+import resource
+import time
+import tracemalloc
+from contextlib import ExitStack
+from io import BytesIO
+from tempfile import NamedTemporaryFile
+
+from django.core.management.base import BaseCommand, CommandError
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import DictionaryObject, NameObject, StreamObject
+
+from apps.ai.pdf import PDF_EXTRACTION_PROCESSES, extract_pages, resident_memory_bytes
+from apps.ai.services import PDF_MAX_PAGES
+
+PAGE_WIDTH = 612
+PAGE_HEIGHT = 792
+MARGIN = 48
+LINE_HEIGHT = 11
+FONT_SIZE = 9
+WORDS = (
+    "cell membrane protein enzyme substrate reaction energy gradient transport "
+    "diffusion osmosis equilibrium pressure volume temperature molecule atom "
+    "bond electron orbital charge field potential current resistance signal"
+).split()
+
+
+def build_multicolumn_pdf(pages: int, columns: int, seed: int = 0) -> bytes:
+    """Builds a text-only PDF with `columns` columns of pseudo-random prose per page."""
+    rng = random.Random(seed)
+    writer = PdfWriter()
+    font = writer._add_object(
+        DictionaryObject(
+            {
+                NameObject("/Type"): NameObject("/Font"),
+                NameObject("/Subtype"): NameObject("/Type1"),
+                NameObject("/BaseFont"): NameObject("/Helvetica"),
+            }
+        )
+    )
+    column_width = (PAGE_WIDTH - 2 * MARGIN) / columns
+    chars_per_line = int(column_width / (FONT_SIZE * 0.5))
+    lines_per_column = int((PAGE_HEIGHT - 2 * MARGIN) / LINE_HEIGHT)
+
+    for _ in range(pages):
+        page = writer.add_blank_page(PAGE_WIDTH, PAGE_HEIGHT)
+        page[NameObject("/Resources")] = DictionaryObject(
+            {NameObject("/Font"): DictionaryObject({NameObject("/F1"): font})}
+        )
+        operators = []
+        for column in range(columns):
+            x = MARGIN + column * column_width
+            operators.append(f"BT /F1 {FONT_SIZE} Tf {LINE_HEIGHT} TL {x:.1f} {PAGE_HEIGHT - MARGIN} Td")
+            for _ in range(lines_per_column):
+                line = ""
+                while len(line) < chars_per_line - 12:
+                    line += rng.choice(WORDS) + " "
+                operators.append(f"({line.strip()}) Tj T*")
+            operators.append("ET")
+        content = StreamObject()
+        content.set_data("\n".join(operators).encode("latin-1"))
+        page[NameObject("/Contents")] = writer._add_object(content)
+
+    buffer = BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def _buffered_extraction(path: str) -> None:
+    # What extraction did before uploads were memory-mapped: the whole file
+    # in a heap buffer and pypdf's object cache kept for the document.
+    with open(path, "rb") as f:
+        reader = PdfReader(BytesIO(f.read()))
+    for page in reader.pages[:PDF_MAX_PAGES]:
+        page.extract_text()
+
+
+def _mapped_extraction(path: str) -> None:
+    extract_pages(path, PDF_MAX_PAGES, processes=1)
+
+
+def _measure_peak_growth(target, path: str, conn) -> None:
+    baseline = resident_memory_bytes()
+    tracemalloc.start()
+    target(path)
+    _, heap_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # ru_maxrss is in KiB on Linux.
+    conn.send((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 - baseline, heap_peak))
+    conn.close()
+
+
+def peak_memory_growth(target, path: str) -> tuple[int, int]:
+    """
+    Runs `target(path)` in a fresh process and returns its peak RSS growth
+    and peak Python heap in bytes. Mapped file pages count towards RSS but
+    are reclaimable page cache, so the heap figure is the one that limits
+    how many extractions fit on a node.
+    """
+    # fork: the child starts from this process's state, so the baseline
+    # taken in the child excludes Django and the interpreter itself.
+    context = multiprocessing.get_context("fork")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_measure_peak_growth, args=(target, path, sender))
+    process.start()
+    sender.close()
+    growth = receiver.recv()
+    process.join()
+    return growth
+
+
+class Command(BaseCommand):
+    help = "Benchmarks PDF text extraction: inline vs process pool, or peak memory with --memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", help="PDF to benchmark. Defaults to a synthetic document.")
+        parser.add_argument("--pages", type=int, default=PDF_MAX_PAGES, help="Synthetic page count.")
+        parser.add_argument("--columns", type=int, default=2, help="Synthetic columns per page.")
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=max(2, PDF_EXTRACTION_PROCESSES),
+            help="Pool size for the parallel run.",
+        )
+        parser.add_argument("--repeat", type=int, default=3, help="Runs per mode; the best is reported.")
+        parser.add_argument(
+            "--memory",
+            action="store_true",
+            help="Compare peak RSS of buffered and memory-mapped extraction instead of timing.",
+        )
+
+    def _time(self, path, processes, repeat):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = extract_pages(path, PDF_MAX_PAGES, processes)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
+
+    def _benchmark_speed(self, path, processes, repeat):
+        inline_seconds, inline_result = self._time(path, 1, repeat)
+        parallel_seconds, parallel_result = self._time(path, processes, repeat)
+        if inline_result != parallel_result:
+            raise CommandError("Parallel extraction output differs from inline extraction.")
+
+        total_pages, extracted = inline_result
+        self.stdout.write(f"Extracted {len(extracted)} of {total_pages} pages")
+        self.stdout.write(f"inline:               {inline_seconds:.3f}s")
+        self.stdout.write(
+            f"parallel ({processes} procs): {parallel_seconds:.3f}s "
+            f"({inline_seconds / parallel_seconds:.2f}x)"
+        )
+
+    def _benchmark_memory(self, path):
+        for label, target in (("buffered", _buffered_extraction), ("mapped", _mapped_extraction)):
+            rss, heap = peak_memory_growth(target, path)
+            self.stdout.write(
+                f"{label + ':':<10} peak RSS +{rss / 1024 / 1024:.1f} MiB, "
+                f"peak heap {heap / 1024 / 1024:.1f} MiB"
+            )
+
+    def handle(self, *args, path, pages, columns, processes, repeat, memory, **options):
+        with ExitStack() as stack:
+            if path:
+                if not os.path.isfile(path):
+                    raise CommandError(f"No such file: {path}")
+                self.stdout.write(f"{path}: {os.path.getsize(path) / 1024:.0f} KiB")
+            else:
+                data = build_multicolumn_pdf(pages, columns)
+                spooled = stack.enter_context(NamedTemporaryFile(suffix=".pdf"))
+                spooled.write(data)
+                spooled.flush()
+                path = spooled.name
+                self.stdout.write(
+                    f"Synthetic PDF: {pages} pages, {columns} columns, {len(data) / 1024:.0f} KiB"
+                )
+
+            if memory:
+                self._benchmark_memory(path)
+            else:
+                self._benchmark_speed(path, processes, repeat)
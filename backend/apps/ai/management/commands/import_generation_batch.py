@@ -0,0 +1,71 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.http import Http404
+
+from apps.ai.services import (
+    compact_generation_input,
+    enqueue_batch_generation_job,
+    submit_generation_batch,
+)
+from apps.decks.services import create_deck, get_user_deck
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Queues a back-office bulk import for batch generation. Each line of the "
+        "JSONL file is {\"text\": ..., \"input_type\": ..., \"deck_title\" | \"deck_id\": ...}. "
+        "Credits are not charged."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="JSONL file with one document per line.")
+        parser.add_argument("--user", required=True, help="Email of the user who owns the decks.")
+        parser.add_argument(
+            "--submit",
+            action="store_true",
+            help="Submit the queued jobs right away instead of waiting for process_generation_batches.",
+        )
+
+    def handle(self, *args, path, user, submit, **options):
+        try:
+            owner = User.objects.get(email=user)
+        except User.DoesNotExist:
+            raise CommandError(f"No user with email {user}.")
+
+        queued = 0
+        with open(path, encoding="utf-8") as handle:
+            for line_number, line in enumerate(handle, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    item = json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise CommandError(f"Line {line_number}: invalid JSON ({e}).")
+
+                text = (item.get("text") or "").strip()
+                if not text:
+                    raise CommandError(f"Line {line_number}: missing text.")
+                input_type = item.get("input_type", "text")
+
+                if item.get("deck_id"):
+                    try:
+                        deck = get_user_deck(owner, item["deck_id"])
+                    except Http404:
+                        raise CommandError(f"Line {line_number}: deck {item['deck_id']} not found.")
+                elif item.get("deck_title"):
+                    deck = create_deck(owner, {"title": item["deck_title"][:200]})
+                else:
+                    raise CommandError(f"Line {line_number}: provide deck_id or deck_title.")
+
+                text, _ = compact_generation_input(text, input_type)
+                enqueue_batch_generation_job(owner, input_type, text, deck)
+                queued += 1
+
+        self.stdout.write(f"Queued {queued} batch generation job(s).")
+        if submit:
+            while batch_id := submit_generation_batch():
+                self.stdout.write(f"Submitted batch {batch_id}.")
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.ai.services import poll_due_transcript_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Polls pending Supadata transcript jobs and caches the transcripts of "
+        "finished ones for the clients waiting on them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep running instead of doing a single polling pass.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="Seconds between passes when --loop is set.",
+        )
+
+    def handle(self, *args, loop, interval, **options):
+        while True:
+            polled = poll_due_transcript_jobs()
+            if polled:
+                self.stdout.write(f"Polled {polled} transcript job(s).")
+
+            if not loop:
+                break
+            time.sleep(interval)
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.ai.services import (
+    collect_generation_batches,
+    requeue_stale_batch_claims,
+    submit_generation_batch,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Submits pending batch generation jobs to the Message Batches API and "
+        "ingests the results of finished batches into their decks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep running instead of doing a single submit/collect pass.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=60.0,
+            help="Seconds between passes when --loop is set.",
+        )
+
+    def handle(self, *args, loop, interval, **options):
+        while True:
+            requeue_stale_batch_claims()
+            while batch_id := submit_generation_batch():
+                self.stdout.write(f"Submitted batch {batch_id}.")
+
+            collected = collect_generation_batches()
+            if collected:
+                self.stdout.write(f"Ingested {collected} finished batch(es).")
+
+            if not loop:
+                break
+            time.sleep(interval)
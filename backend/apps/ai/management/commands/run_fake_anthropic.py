@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from apps.ai.fake_anthropic import make_server
+
+
+class Command(BaseCommand):
+    help = "Runs a local fake of the Anthropic Messages, token counting and Message Batches APIs."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument(
+            "--batch-delay",
+            type=float,
+            default=2.0,
+            help="Seconds before a submitted batch reports processing_status=ended.",
+        )
+
+    def handle(self, *args, host, port, batch_delay, **options):
+        server = make_server(host, port, batch_delay)
+        self.stdout.write(
+            f"Fake Anthropic API on http://{host}:{port} — set ANTHROPIC_BASE_URL to use it."
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from apps.ai.fake_supadata import make_server
+
+
+class Command(BaseCommand):
+    help = "Runs a local fake of the Supadata YouTube transcript and job endpoints."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8766)
+        parser.add_argument(
+            "--video-minutes",
+            type=float,
+            default=10,
+            help="Length of the transcript returned for every video.",
+        )
+        parser.add_argument(
+            "--job-delay",
+            type=float,
+            default=0,
+            help="Answer with an asynchronous job that completes after this many seconds (0 answers directly).",
+        )
+        parser.add_argument(
+            "--error-rate",
+            type=float,
+            default=0,
+            help="Share of requests answered with a 503.",
+        )
+
+    def handle(self, *args, host, port, video_minutes, job_delay, error_rate, **options):
+        server = make_server(host, port, video_minutes, job_delay, error_rate)
+        self.stdout.write(
+            f"Fake Supadata API on http://{host}:{port} — set SUPADATA_BASE_URL to use it."
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
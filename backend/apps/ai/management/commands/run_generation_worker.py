@@ -0,0 +1,75 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.ai import llm
+from apps.ai.services import (
+    GENERATION_WORKER_CONCURRENCY,
+    claim_generation_jobs,
+    requeue_stale_generation_jobs,
+    run_generation_job,
+)
+
+STALE_CHECK_INTERVAL_SECONDS = 60
+
+
+def _run_job(job):
+    try:
+        run_generation_job(job)
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs queued flashcard generation jobs (POST /api/generate/ with "
+        "background=true, and POST /api/generate/video/)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=GENERATION_WORKER_CONCURRENCY,
+            help="Maximum number of jobs generating at the same time.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait between queue polls when idle.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Drain the current queue and exit instead of polling forever.",
+        )
+
+    def handle(self, *args, concurrency, poll_interval, once, **options):
+        llm.wait_for_slots_indefinitely()
+        self.stdout.write(f"Generation worker started (concurrency={concurrency}).")
+        in_flight = set()
+        last_stale_check = 0.0
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            while True:
+                if time.monotonic() - last_stale_check > STALE_CHECK_INTERVAL_SECONDS:
+                    requeued = requeue_stale_generation_jobs()
+                    if requeued:
+                        self.stdout.write(f"Requeued {requeued} stale job(s).")
+                    last_stale_check = time.monotonic()
+
+                for job in claim_generation_jobs(concurrency - len(in_flight)):
+                    in_flight.add(pool.submit(_run_job, job))
+
+                if not in_flight:
+                    if once:
+                        break
+                    time.sleep(poll_interval)
+                    continue
+
+                done, in_flight = wait(in_flight, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
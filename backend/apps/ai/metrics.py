@@ -0,0 +1,18 @@
+"""
+Helpers shared by the in-process call metrics of the LLM gateway and the
+Supadata client.
+
+This module has no Django imports, like normalization.py.
+"""
+
+from statistics import quantiles
+
+
+def latency_percentiles(samples) -> dict:
+    """p50, p95 and p99 of `samples`, rounded to milliseconds (None if empty)."""
+    samples = list(samples)
+    if len(samples) < 2:
+        value = round(samples[0], 3) if samples else None
+        return {"p50": value, "p95": value, "p99": value}
+    cuts = quantiles(samples, n=100, method="inclusive")
+    return {"p50": round(cuts[49], 3), "p95": round(cuts[94], 3), "p99": round(cuts[98], 3)}
@@ -0,0 +1,26 @@
+# Generated by Django 6.0.2 on 2026-10-17 11:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai", "0001_initial"),
+        ("decks", "0002_flashcard_simhash"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="generationjob",
+            name="deck",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="generation_jobs",
+                to="decks.deck",
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.2 on 2026-10-17 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai", "0002_generationjob_deck"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="generationjob",
+            name="batch_id",
+            field=models.CharField(blank=True, db_index=True, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name="generationjob",
+            name="via_batch",
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 6.0.2 on 2026-10-17 15:20
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai", "0003_generationjob_batch"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TranscriptJob",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("video_id", models.CharField(db_index=True, max_length=20)),
+                ("url", models.URLField(max_length=500)),
+                ("supadata_job_id", models.CharField(max_length=100)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("completed", "Completed"),
+                            ("failed", "Failed"),
+                        ],
+                        default="pending",
+                        max_length=10,
+                    ),
+                ),
+                ("error", models.TextField(blank=True, default="")),
+                ("next_poll_at", models.DateTimeField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "ordering": ["-created_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["status", "next_poll_at"],
+                        name="ai_transcri_status_e80b91_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.2 on 2026-10-17 19:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai", "0004_transcriptjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="generationjob",
+            name="credits_charged",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="generationjob",
+            name="segments",
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 6.0.2 on 2026-10-17 19:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai", "0005_generationjob_segments_credits"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="transcriptjob",
+            name="users",
+            field=models.ManyToManyField(
+                related_name="transcript_jobs", to=settings.AUTH_USER_MODEL
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-17 20:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai", "0006_transcriptjob_users"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="generationjob",
+            name="failed_chunks",
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -1,3 +1,88 @@
+import uuid
+
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+
+class GenerationJob(models.Model):
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_COMPLETED = "completed"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = (
+        (STATUS_PENDING, "Pending"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_COMPLETED, "Completed"),
+        (STATUS_FAILED, "Failed"),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="generation_jobs"
+    )
+    deck = models.ForeignKey(
+        "decks.Deck",
+        on_delete=models.SET_NULL,
+        related_name="generation_jobs",
+        blank=True,
+        null=True,
+    )
+    input_type = models.CharField(max_length=10)
+    text = models.TextField()
+    # Whole-video jobs carry the plan_video_segments() output instead of text.
+    segments = models.JSONField(blank=True, null=True)
+    credits_charged = models.IntegerField(default=0)
+    # Chunks whose generation failed in a completed job. Their share of the
+    # credits is refunded and taken off credits_charged.
+    failed_chunks = models.IntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    via_batch = models.BooleanField(default=False)
+    batch_id = models.CharField(max_length=100, blank=True, null=True, db_index=True)
+    result = models.JSONField(blank=True, null=True)
+    error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [models.Index(fields=["status", "created_at"])]
+
+    def __str__(self):
+        return f"{self.id} — {self.status}"
+
+
+class TranscriptJob(models.Model):
+    """
+    A Supadata transcript job still running after the request that started
+    it returned. Jobs are per video, not per user: anyone extracting the
+    same video while it is pending waits on the same job, and is added to
+    `users` so they can see it.
+    """
+
+    STATUS_PENDING = "pending"
+    STATUS_COMPLETED = "completed"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = (
+        (STATUS_PENDING, "Pending"),
+        (STATUS_COMPLETED, "Completed"),
+        (STATUS_FAILED, "Failed"),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    video_id = models.CharField(max_length=20, db_index=True)
+    url = models.URLField(max_length=500)
+    supadata_job_id = models.CharField(max_length=100)
+    users = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name="transcript_jobs")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    error = models.TextField(blank=True, default="")
+    next_poll_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [models.Index(fields=["status", "next_poll_at"])]
+
+    def __str__(self):
+        return f"{self.video_id} — {self.status}"
@@ -0,0 +1,85 @@
+"""
+Text normalization for extracted documents.
+
+A Normalizer is a fixed list of stages (str -> str callables) built once at
+import time and applied to every page or transcript. Patterns are compiled
+once and written to start with a literal where possible, so the regex
+engine can skip ahead to candidate positions instead of trying a match at
+every character; `manage.py benchmark_normalization` compares the
+pipelines against the re.sub chains they replaced.
+
+This module has no Django imports so PDF extraction pool workers can use
+it.
+"""
+
+import re
+import unicodedata
+from collections.abc import Callable
+
+# C0 controls except tab, newline, form feed and carriage return, plus DEL.
+_CONTROL_CHARS = dict.fromkeys([*range(0x00, 0x09), 0x0B, *range(0x0E, 0x20), 0x7F])
+
+
+class Substitution:
+    def __init__(self, pattern: str, replacement: str):
+        self._pattern = re.compile(pattern)
+        self._replacement = replacement
+
+    def __call__(self, text: str) -> str:
+        return self._pattern.sub(self._replacement, text)
+
+
+def strip_control_chars(text: str) -> str:
+    # str.translate deletes in one C-level pass, ~3x faster than re.sub.
+    return text.translate(_CONTROL_CHARS)
+
+
+def to_nfc(text: str) -> str:
+    # Most extracted text is already NFC; checking is much cheaper than
+    # normalizing.
+    if unicodedata.is_normalized("NFC", text):
+        return text
+    return unicodedata.normalize("NFC", text)
+
+
+def collapse_whitespace(text: str) -> str:
+    """Collapses all whitespace runs to single spaces and strips the ends."""
+    return " ".join(text.split())
+
+
+def strip(text: str) -> str:
+    return text.strip()
+
+
+# Words broken across a line end by a hyphen, joined only when a letter
+# precedes the hyphen and the next line continues in lowercase, so
+# "Jean-\nPaul" and list dashes are left alone.
+dehyphenate = Substitution(r"-\n(?<=[^\W\d_]-\n)(?=[a-z])", "")
+collapse_blank_lines = Substitution(r"\n\n\n+", "\n\n")
+collapse_spaces = Substitution(r"[ \t][ \t]+", " ")
+
+
+class Normalizer:
+    def __init__(self, *stages: Callable[[str], str]):
+        self.stages = stages
+
+    def __call__(self, text: str) -> str:
+        for stage in self.stages:
+            text = stage(text)
+        return text
+
+
+normalize_pdf_page = Normalizer(
+    strip_control_chars,
+    to_nfc,
+    dehyphenate,
+    collapse_blank_lines,
+    collapse_spaces,
+    strip,
+)
+
+normalize_transcript = Normalizer(
+    strip_control_chars,
+    to_nfc,
+    collapse_whitespace,
+)
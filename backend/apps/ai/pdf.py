@@ -0,0 +1,291 @@
+"""
+PDF page text extraction.
+
+pypdf's text extraction is pure Python and CPU-bound, so large documents
+are split into contiguous page ranges and extracted on a process pool
+instead of holding the request thread under the GIL. Each document has a
+pool to itself for the duration of its extraction, so one that times out
+can be killed without touching anyone else's; idle pools are kept for
+reuse by later requests. This module deliberately avoids Django imports:
+pool workers only need pypdf.
+"""
+
+import atexit
+import gc
+import logging
+import mmap
+import multiprocessing
+import os
+import re
+import threading
+import time
+
+from pypdf import PdfReader
+
+from apps.ai.normalization import normalize_pdf_page
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever extraction or cleaning output changes, so cached
+# extractions made by the old code are no longer served.
+PDF_EXTRACTOR_VERSION = 2
+PDF_PARALLEL_MIN_PAGES = 16
+PDF_EXTRACTION_PROCESSES = min(4, os.cpu_count() or 1)
+PDF_EXTRACTION_TIMEOUT_SECONDS = 60
+# Several ranges per process so one slow (image- or table-heavy) stretch of
+# pages doesn't leave the other workers idle.
+PDF_RANGES_PER_PROCESS = 4
+PDF_EXTRACTION_RSS_BUDGET_MB = 256
+# Workers are replaced after this many ranges, which bounds how long one
+# keeps an already-extracted document mapped and how far its heap grows.
+PDF_POOL_MAX_TASKS_PER_CHILD = 64
+PDF_MAX_IDLE_POOLS = 2
+PDF_SCAN_SAMPLE_PAGES = 8
+PDF_SCANNED_MIN_SHARE = 0.8
+
+_BEGIN_TEXT = re.compile(rb"(?:^|\s)BT(?:\s|$)")
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+_worker_reader: tuple[tuple, PdfReader] | None = None
+_idle_pools: list[tuple[int, object]] = []
+_idle_pools_lock = threading.Lock()
+
+
+class PDFExtractionTimeout(Exception):
+    pass
+
+
+class PDFHasNoTextLayer(Exception):
+    pass
+
+
+class PDFMemoryBudgetExceeded(Exception):
+    pass
+
+
+def _xobjects(resources):
+    xobjects = resources.get("/XObject")
+    if not xobjects:
+        return
+    for xobject in xobjects.get_object().values():
+        yield xobject.get_object()
+
+
+def _form_resources(form, inherited):
+    # Forms without their own /Resources use those of the page drawing them.
+    resources = form.get("/Resources")
+    return resources.get_object() if resources else inherited
+
+
+def _has_image(resources) -> bool:
+    for xobject in _xobjects(resources):
+        if xobject.get("/Subtype") == "/Image":
+            return True
+        # Scanners often wrap the page image in a form XObject.
+        if xobject.get("/Subtype") == "/Form" and _has_image(_form_resources(xobject, resources)):
+            return True
+    return False
+
+
+def _has_text(resources, content: bytes) -> bool:
+    if resources.get("/Font") and _BEGIN_TEXT.search(content):
+        return True
+    # Text is often drawn from form XObjects (stamped headers, imposed or
+    # re-exported pages), which carry their own fonts and BT operators.
+    for xobject in _xobjects(resources):
+        if xobject.get("/Subtype") == "/Form" and _has_text(
+            _form_resources(xobject, resources), xobject.get_data()
+        ):
+            return True
+    return False
+
+
+def _page_kind(page) -> str:
+    """Classifies a page as "text", "image" or "blank" without extracting it."""
+    resources = page.get("/Resources")
+    resources = resources.get_object() if resources else {}
+    contents = page.get_contents()
+    if _has_text(resources, contents.get_data() if contents is not None else b""):
+        return "text"
+    if _has_image(resources):
+        return "image"
+    return "blank"
+
+
+def looks_scanned(reader: PdfReader) -> bool:
+    """
+    Samples up to PDF_SCAN_SAMPLE_PAGES pages spread across the document and
+    reports whether nearly all non-blank ones are images with no text
+    layer. Only content streams and resources are inspected, which costs
+    a fraction of running extract_text over every page. OCR'd scans carry
+    an invisible text layer and are not reported.
+    """
+    total = len(reader.pages)
+    step = max(1, total / PDF_SCAN_SAMPLE_PAGES)
+    indices = sorted({int(i * step) for i in range(min(total, PDF_SCAN_SAMPLE_PAGES))})
+    kinds = [_page_kind(reader.pages[i]) for i in indices]
+    images = kinds.count("image")
+    content = images + kinds.count("text")
+    return images > 0 and images >= content * PDF_SCANNED_MIN_SHARE
+
+
+def resident_memory_bytes() -> int | None:
+    """Current RSS of this process, or None where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def open_pdf(path: str) -> PdfReader:
+    """
+    Opens the PDF at `path` through a read-only memory map, so the file's
+    bytes live in the page cache instead of a per-request heap buffer.
+    """
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return PdfReader(mapped)
+
+
+def _extract_range(
+    reader: PdfReader, start: int, stop: int, deadline: float | None = None
+) -> list[str]:
+    """
+    Extracts pages one at a time. When RSS has grown by more than
+    PDF_EXTRACTION_RSS_BUDGET_MB, pypdf's object cache is dropped (objects
+    are re-read from the mapped file on demand); if that doesn't bring the
+    process back under budget the document is rejected. RSS is per
+    process, so in a threaded worker the budget is approximate. Past
+    `deadline` (a time.monotonic() value) PDFExtractionTimeout is raised
+    before the next page.
+    """
+    budget = PDF_EXTRACTION_RSS_BUDGET_MB * 1024 * 1024
+    baseline = resident_memory_bytes()
+    pages = []
+    for i in range(start, stop):
+        if deadline is not None and time.monotonic() > deadline:
+            raise PDFExtractionTimeout("PDF extraction timed out")
+        pages.append(normalize_pdf_page(reader.pages[i].extract_text() or ""))
+        if baseline is None or resident_memory_bytes() - baseline <= budget:
+            continue
+        reader.resolved_objects.clear()
+        gc.collect()
+        if resident_memory_bytes() - baseline > budget:
+            raise PDFMemoryBudgetExceeded(
+                f"PDF extraction exceeded {PDF_EXTRACTION_RSS_BUDGET_MB}MB"
+            )
+    return pages
+
+
+def _extract_range_in_worker(task: tuple[str, int, int]) -> list[str]:
+    # Each worker maps and parses a document once, then serves all the
+    # ranges of it that it is handed. Upload paths are temporary files,
+    # so the key also pins the file itself in case a name is reused.
+    global _worker_reader
+    path, start, stop = task
+    stat = os.stat(path)
+    key = (path, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    if _worker_reader is None or _worker_reader[0] != key:
+        _worker_reader = None  # Unmap the previous document first.
+        _worker_reader = (key, open_pdf(path))
+    return _extract_range(_worker_reader[1], start, stop)
+
+
+def _page_ranges(page_count: int, parts: int) -> list[tuple[int, int]]:
+    size = -(-page_count // parts)
+    return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
+
+def _checkout_pool(processes: int):
+    """Takes an idle pool of `processes` workers, or starts a new one."""
+    with _idle_pools_lock:
+        for i, (size, pool) in enumerate(_idle_pools):
+            if size == processes:
+                del _idle_pools[i]
+                return pool
+    # forkserver rather than fork: the web worker may be multi-threaded,
+    # and forking it could copy locks held by other threads.
+    context = multiprocessing.get_context("forkserver")
+    return context.Pool(processes, maxtasksperchild=PDF_POOL_MAX_TASKS_PER_CHILD)
+
+
+def _checkin_pool(processes: int, pool) -> None:
+    with _idle_pools_lock:
+        if len(_idle_pools) < PDF_MAX_IDLE_POOLS:
+            _idle_pools.append((processes, pool))
+            return
+    _close_pool(pool)
+
+
+def _close_pool(pool) -> None:
+    pool.terminate()
+    pool.join()
+
+
+@atexit.register
+def _shutdown_pools() -> None:
+    with _idle_pools_lock:
+        pools = [pool for _, pool in _idle_pools]
+        _idle_pools.clear()
+    for pool in pools:
+        _close_pool(pool)
+
+
+def extract_pages_parallel(
+    path: str,
+    page_count: int,
+    processes: int = PDF_EXTRACTION_PROCESSES,
+    timeout: float = PDF_EXTRACTION_TIMEOUT_SECONDS,
+) -> list[str]:
+    """
+    Extracts the first `page_count` pages of the PDF at `path` on a pool of
+    `processes` workers held for this document alone. Raises
+    PDFExtractionTimeout if the whole document takes longer than `timeout`
+    seconds. The pool goes back to the idle list only if it finished;
+    after a timeout or a failed range its workers may still be busy with
+    the document, so it is killed instead.
+    """
+    pool = _checkout_pool(processes)
+    tasks = [
+        (path, start, stop)
+        for start, stop in _page_ranges(page_count, processes * PDF_RANGES_PER_PROCESS)
+    ]
+    finished = False
+    try:
+        parts = pool.map_async(_extract_range_in_worker, tasks, chunksize=1).get(timeout)
+        finished = True
+    except multiprocessing.TimeoutError:
+        raise PDFExtractionTimeout(f"PDF extraction exceeded {timeout}s") from None
+    finally:
+        if finished:
+            _checkin_pool(processes, pool)
+        else:
+            _close_pool(pool)
+    return [page for part in parts for page in part]
+
+
+def extract_pages(
+    path: str, max_pages: int, processes: int = PDF_EXTRACTION_PROCESSES
+) -> tuple[int, list[str]]:
+    """
+    Returns the total page count of the PDF at `path` and the cleaned text
+    of its first `max_pages` pages, or raises PDFHasNoTextLayer for scanned
+    documents. Small documents (or a single-process configuration) are
+    extracted inline, where handing ranges to the pool would cost more
+    than it saves; the output is identical either way. Both paths give up
+    after PDF_EXTRACTION_TIMEOUT_SECONDS.
+    """
+    reader = open_pdf(path)
+    if looks_scanned(reader):
+        raise PDFHasNoTextLayer()
+    total_pages = len(reader.pages)
+    page_count = min(total_pages, max_pages)
+    if processes > 1 and page_count >= PDF_PARALLEL_MIN_PAGES:
+        try:
+            return total_pages, extract_pages_parallel(path, page_count, processes)
+        except OSError:
+            logger.warning("Could not start PDF extraction pool, extracting inline", exc_info=True)
+    deadline = time.monotonic() + PDF_EXTRACTION_TIMEOUT_SECONDS
+    return total_pages, _extract_range(reader, 0, page_count, deadline)
@@ -1,9 +1,86 @@
 from rest_framework import serializers
 
+from apps.ai.models import GenerationJob, TranscriptJob
+from apps.ai.services import GENERATION_BATCH_MAX_ITEMS, GENERATION_MAX_INPUT_CHARS
+
 
 class GenerateSerializer(serializers.Serializer):
     input_type = serializers.ChoiceField(
         choices=("text", "pdf", "youtube"),
         default="text",
     )
-    text = serializers.CharField(min_length=50, max_length=50000)
+    text = serializers.CharField(
+        min_length=50, max_length=GENERATION_MAX_INPUT_CHARS, required=False
+    )
+    # Instead of text: a document from /extract/pdf/ or /extract/youtube/
+    # and an optional page or time range within it.
+    document_id = serializers.UUIDField(required=False)
+    page_start = serializers.IntegerField(min_value=1, required=False)
+    page_end = serializers.IntegerField(min_value=1, required=False)
+    start_seconds = serializers.IntegerField(min_value=0, required=False)
+    end_seconds = serializers.IntegerField(min_value=0, required=False)
+    background = serializers.BooleanField(default=False)
+    deck_id = serializers.UUIDField(required=False)
+
+    def validate(self, data):
+        if ("text" in data) == ("document_id" in data):
+            raise serializers.ValidationError("Provide either text or document_id.")
+        if "text" in data and any(
+            field in data for field in ("page_start", "page_end", "start_seconds", "end_seconds")
+        ):
+            raise serializers.ValidationError("Ranges can only be used with document_id.")
+        return data
+
+
+class GenerateVideoSerializer(serializers.Serializer):
+    # A transcript document from /extract/youtube/, generated as a whole.
+    document_id = serializers.UUIDField()
+    deck_id = serializers.UUIDField(required=False)
+
+
+class GenerationJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = GenerationJob
+        fields = [
+            "id",
+            "status",
+            "input_type",
+            "deck",
+            "result",
+            "failed_chunks",
+            "error",
+            "created_at",
+            "started_at",
+            "finished_at",
+        ]
+        read_only_fields = fields
+
+
+class GenerateBatchItemSerializer(serializers.Serializer):
+    input_type = serializers.ChoiceField(
+        choices=("text", "pdf", "youtube"),
+        default="text",
+    )
+    text = serializers.CharField(min_length=50, max_length=GENERATION_MAX_INPUT_CHARS)
+    deck_id = serializers.UUIDField(required=False)
+    deck_title = serializers.CharField(required=False, max_length=200)
+
+    def validate(self, attrs):
+        if not attrs.get("deck_id") and not attrs.get("deck_title"):
+            raise serializers.ValidationError("Provide either deck_id or deck_title.")
+        return attrs
+
+
+class GenerateBatchSerializer(serializers.Serializer):
+    items = serializers.ListField(
+        child=GenerateBatchItemSerializer(),
+        min_length=1,
+        max_length=GENERATION_BATCH_MAX_ITEMS,
+    )
+
+
+class TranscriptJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TranscriptJob
+        fields = ["id", "video_id", "status", "error", "created_at", "finished_at"]
+        read_only_fields = fields
@@ -1,18 +1,55 @@
+import hashlib
 import json
+import logging
+import math
 import re
-from datetime import date
+from bisect import bisect_left
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from operator import itemgetter
+from tempfile import NamedTemporaryFile
+from statistics import StatisticsError, linear_regression, median
 from time import sleep
-from types import SimpleNamespace
 from urllib.parse import parse_qs, urlparse
 
-import anthropic
 import requests
 from django.conf import settings
-from pypdf import PdfReader
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
 from rest_framework.exceptions import APIException, PermissionDenied, ValidationError
 from youtube_transcript_api._errors import NoTranscriptFound, TranscriptsDisabled
 
+from apps.ai import llm, supadata
+from apps.ai.compaction import (
+    collapse_repeated_sentences,
+    strip_page_furniture,
+    strip_reference_section,
+    trim_caption_overlap,
+)
+from apps.ai.models import GenerationJob, TranscriptJob
+from apps.ai.pdf import (
+    PDF_EXTRACTOR_VERSION,
+    PDFExtractionTimeout,
+    PDFHasNoTextLayer,
+    PDFMemoryBudgetExceeded,
+    extract_pages,
+)
 from apps.ai.prompts import FLASHCARD_SYSTEM_PROMPT
+from apps.ai.transcript import Transcript
+from apps.users.models import UserProfile
+from apps.decks.services import (
+    MAX_CARDS_PER_DECK,
+    add_flashcards_to_deck,
+    drop_near_duplicates,
+)
+
+logger = logging.getLogger(__name__)
 
 PDF_MAX_PAGES = 200
 PDF_MAX_FILE_SIZE_MB = 20
@@ -20,13 +57,49 @@ YOUTUBE_MAX_DURATION_SECONDS = 18000
 YOUTUBE_MAX_SEGMENT_CHARS = 50000
 YOUTUBE_DEFAULT_SEGMENT_CHARS = 40000
 MAX_TOKENS = 4096
-SUPADATA_TRANSCRIPT_URL = "https://api.supadata.ai/v1/youtube/transcript"
-SUPADATA_JOB_URL = "https://api.supadata.ai/v1/transcript"
-SUPADATA_POLL_MAX_ATTEMPTS = 60
+MAX_CONTINUATIONS = 2
+CHARS_PER_TOKEN = 4
+GENERATION_CHUNK_TOKENS = 10000
+GENERATION_CHUNK_CHARS = GENERATION_CHUNK_TOKENS * CHARS_PER_TOKEN
+GENERATION_MAX_INPUT_CHARS = 750000
+GENERATION_MAX_WORKERS = 4
+# A request whose chunks fail beyond this share is failed and refunded
+# rather than answered with the cards of the few chunks that worked.
+GENERATION_MAX_FAILED_CHUNK_SHARE = 0.5
+PAGE_SEPARATOR = "\n\n---\n\n"
+# Each job generates GENERATION_MAX_WORKERS chunks at a time, so this many
+# jobs fill the worker process's LLM concurrency slots without queueing.
+GENERATION_WORKER_CONCURRENCY = max(1, llm.LLM_MAX_CONCURRENCY // GENERATION_MAX_WORKERS)
+GENERATION_JOB_STALE_SECONDS = 15 * 60
+GENERATION_BATCH_MAX_ITEMS = 50
+GENERATION_BATCH_MAX_REQUESTS = 10000
+# The Message Batches API rejects submissions over 256 MB; stay well under.
+GENERATION_BATCH_MAX_BYTES = 200 * 1024 * 1024
 SUPADATA_POLL_INTERVAL_SECONDS = 1
-SUPADATA_REQUEST_TIMEOUT_SECONDS = 30
+SUPADATA_INLINE_POLL_ATTEMPTS = 3
+SUPADATA_JOB_TIMEOUT_SECONDS = 10 * 60
+TRANSCRIPT_POLL_BATCH_SIZE = 500
+TRANSCRIPTS_DISABLED_MESSAGE = "This video has transcripts disabled."
+NO_TRANSCRIPT_MESSAGE = "No transcript found. The video may not have captions available."
+GENERATION_CACHE_TTL_SECONDS = 60 * 60 * 24 * 7
+GENERATION_CACHE_KEY_PREFIX = "ai:generation"
+TRANSCRIPT_CACHE_TTL_SECONDS = 60 * 60 * 24 * 7
+TRANSCRIPT_CACHE_KEY_PREFIX = "ai:transcript:v2"
+TRANSCRIPT_MINUTES_KEY_PREFIX = "ai:transcript-minutes:v1"
+PDF_EXTRACTION_CACHE_TTL_SECONDS = 60 * 60 * 24 * 7
+PDF_EXTRACTION_CACHE_KEY_PREFIX = "ai:pdf-extraction"
+GENERATION_CACHE_HITS_KEY = "ai:generation-stats:hits"
+GENERATION_CACHE_MISSES_KEY = "ai:generation-stats:misses"
+
+ESTIMATE_MIN_HISTORY_SAMPLES = 10
+ESTIMATE_DEFAULT_OUTPUT_RATIO = 0.3
+ESTIMATE_DEFAULT_CALL_SECONDS = 2.0
+ESTIMATE_DEFAULT_SECONDS_PER_OUTPUT_TOKEN = 0.02
 
 CREDIT_COSTS = {"text": 1, "pdf": 1, "youtube": 3}
+# Credits are billed per this many characters of input, the size a single
+# generation request was capped at before inputs were chunked.
+CREDIT_UNIT_CHARS = 50000
 MONTHLY_LIMITS = {"free": 10, "pro": 200}
 
 
@@ -35,6 +108,26 @@ class FlashcardGenerationError(APIException):
     default_detail = "Failed to generate flashcards. Please try again."
 
 
+class PDFTooSlowError(APIException):
+    status_code = 422
+    default_detail = "This PDF took too long to process. Try a smaller file."
+
+
+class PDFTooLargeError(APIException):
+    status_code = 422
+    default_detail = "This PDF needs too much memory to process. Try a smaller file."
+
+
+class ScannedPDFError(APIException):
+    status_code = 422
+    default_detail = {
+        "detail": "This PDF appears to be scanned or image-only, so there is no text to "
+        "generate flashcards from. Try a PDF with selectable text.",
+        "code": "scanned_pdf",
+    }
+    default_code = "scanned_pdf"
+
+
 def reset_credits_if_needed(profile) -> None:
     today = date.today()
     if (
@@ -46,39 +139,195 @@ def reset_credits_if_needed(profile) -> None:
         profile.save()
 
 
-def check_and_deduct_credits(profile, input_type: str) -> None:
+def credit_units(text: str) -> int:
+    """
+    Billable units for `text`. Independent of GENERATION_CHUNK_CHARS, so
+    how inputs are chunked for the model never changes what they cost.
+    """
+    return max(1, math.ceil(len(text) / CREDIT_UNIT_CHARS))
+
+
+def check_and_deduct_credits(profile, input_type: str, units: int = 1) -> int:
+    """Deducts the cost of `units` of `input_type` and returns it."""
     reset_credits_if_needed(profile)
-    cost = CREDIT_COSTS[input_type]
+    cost = CREDIT_COSTS[input_type] * units
     limit = MONTHLY_LIMITS[profile.tier]
     if profile.monthly_credits_used + cost > limit:
         raise PermissionDenied("Monthly credit limit reached.")
     profile.monthly_credits_used += cost
     profile.save()
+    return cost
 
 
-def parse_flashcards_json(raw: str) -> list[dict]:
-    # Try direct parse first
-    try:
-        return json.loads(raw)
-    except json.JSONDecodeError:
-        pass
+def refund_credits(user_id, charged_at, amount: int) -> None:
+    """
+    Gives back `amount` credits charged at `charged_at`, unless the monthly
+    allowance has reset since they were charged.
+    """
+    if amount <= 0:
+        return
+    month_start = charged_at.date().replace(day=1)
+    next_month = (month_start + timedelta(days=32)).replace(day=1)
+    UserProfile.objects.filter(
+        user_id=user_id, last_reset__gte=month_start, last_reset__lt=next_month
+    ).update(monthly_credits_used=Greatest(F("monthly_credits_used") - amount, 0))
+
+
+def refund_generation_credits(job: GenerationJob) -> None:
+    """Gives back everything charged for a failed job."""
+    refund_credits(job.user_id, job.created_at, job.credits_charged)
+
+
+def failed_chunks_refund(credits: int, chunks: list[str], failed: list[str]) -> int:
+    """The part of `credits` that paid for the `failed` chunks of `chunks`, rounded down."""
+    if not failed:
+        return 0
+    return credits * sum(map(len, failed)) // sum(map(len, chunks))
+
+
+def _normalize_generation_input(text: str) -> str:
+    return " ".join(text.split())
+
+
+def generation_cache_key(text: str) -> str:
+    """
+    Content-addressed key for a generation request. Anything that changes
+    the model output (model, system prompt, token budget) is part of the
+    hash, so bumping any of them naturally invalidates old entries.
+    """
+    digest = hashlib.sha256()
+    for part in (
+        settings.CLAUDE_MODEL,
+        FLASHCARD_SYSTEM_PROMPT,
+        str(MAX_TOKENS),
+        _normalize_generation_input(text),
+    ):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return f"{GENERATION_CACHE_KEY_PREFIX}:{digest.hexdigest()}"
+
 
-    # Strip markdown code fences (```json ... ``` or ``` ... ```)
-    stripped = re.sub(r"```(?:json)?\s*\n?", "", raw).strip()
+def _increment_cache_stat(key: str) -> None:
     try:
-        return json.loads(stripped)
-    except json.JSONDecodeError:
-        pass
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def get_cached_flashcards(text: str) -> list[dict] | None:
+    cards = cache.get(generation_cache_key(text))
+    _increment_cache_stat(
+        GENERATION_CACHE_HITS_KEY if cards is not None else GENERATION_CACHE_MISSES_KEY
+    )
+    return cards
+
+
+def cache_flashcards(text: str, cards: list[dict]) -> None:
+    if not cards:
+        return
+    cache.set(generation_cache_key(text), cards, GENERATION_CACHE_TTL_SECONDS)
+
+
+def get_generation_cache_stats() -> dict:
+    hits = cache.get(GENERATION_CACHE_HITS_KEY) or 0
+    misses = cache.get(GENERATION_CACHE_MISSES_KEY) or 0
+    lookups = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        "ttl_seconds": GENERATION_CACHE_TTL_SECONDS,
+    }
+
+
+class FlashcardStreamParser:
+    """
+    Incrementally pulls complete flashcard objects out of a JSON array as it
+    streams in. Only structural characters are inspected, so any prose or
+    markdown fences around the array are ignored. Each feed() returns the
+    cards whose closing brace arrived in that chunk.
+    """
 
-    # Extract first JSON array from the text
-    match = re.search(r"\[.*]", raw, re.DOTALL)
-    if match:
+    _STRUCTURAL = re.compile(r'[{}"\\]')
+
+    def __init__(self):
+        self._current: list[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, text: str) -> list[dict]:
+        cards = []
+        position = 0
+        if self._escaped and text:
+            # The escaped character is the first one of this chunk.
+            self._escaped = False
+            if self._depth:
+                self._current.append(text[0])
+            position = 1
+
+        while True:
+            match = self._STRUCTURAL.search(text, position)
+            if match is None:
+                if self._depth:
+                    self._current.append(text[position:])
+                break
+
+            index = match.start()
+            char = match.group()
+            if self._depth:
+                self._current.append(text[position : index + 1])
+            position = index + 1
+
+            if self._in_string:
+                if char == "\\":
+                    if position < len(text):
+                        if self._depth:
+                            self._current.append(text[position])
+                        position += 1
+                    else:
+                        self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = self._depth > 0
+            elif char == "{":
+                if self._depth == 0:
+                    self._current = ["{"]
+                self._depth += 1
+            elif char == "}" and self._depth:
+                self._depth -= 1
+                if self._depth == 0:
+                    card = self._load_card("".join(self._current))
+                    if card is not None:
+                        cards.append(card)
+                    self._current = []
+
+        return cards
+
+    @staticmethod
+    def _load_card(raw: str) -> dict | None:
         try:
-            return json.loads(match.group())
+            card = json.loads(raw)
         except json.JSONDecodeError:
-            pass
+            return None
+        if not isinstance(card, dict):
+            return None
+        if not isinstance(card.get("front"), str) or not isinstance(card.get("back"), str):
+            return None
+        return {"front": card["front"], "back": card["back"]}
 
-    raise FlashcardGenerationError("Could not parse flashcards from AI response.")
+
+def parse_flashcards_json(raw: str) -> list[dict]:
+    """
+    Single pass over the model output. Every complete {front, back} object
+    is recovered, so a response cut off mid-array still yields the cards
+    that made it through.
+    """
+    cards = FlashcardStreamParser().feed(raw)
+    if not cards:
+        raise FlashcardGenerationError("Could not parse flashcards from AI response.")
+    return cards
 
 
 def suggest_content_start(pages: list[str]) -> int:
@@ -88,28 +337,65 @@ def suggest_content_start(pages: list[str]) -> int:
     return 1
 
 
+@contextmanager
+def _uploaded_file_path(file):
+    # FILE_UPLOAD_HANDLERS spools every upload to disk; anything else (an
+    # in-memory upload) is written out so the parser can map it.
+    if hasattr(file, "temporary_file_path"):
+        yield file.temporary_file_path()
+        return
+    with NamedTemporaryFile(suffix=".pdf") as spooled:
+        for chunk in file.chunks():
+            spooled.write(chunk)
+        spooled.flush()
+        yield spooled.name
+
+
 def extract_pdf_text(file) -> dict:
-    reader = PdfReader(file)
-    total_pages = len(reader.pages)
-    pages_to_extract = min(total_pages, PDF_MAX_PAGES)
-
-    pages = []
-    for i in range(pages_to_extract):
-        raw = reader.pages[i].extract_text() or ""
-        cleaned = re.sub(r"\n{3,}", "\n\n", raw).strip()
-        cleaned = re.sub(r"[ \t]{2,}", " ", cleaned)
-        cleaned = re.sub(r"[\x00-\x08\x0B\x0E-\x1F\x7F]", "", cleaned)
-        pages.append(cleaned)
+    try:
+        with _uploaded_file_path(file) as path:
+            total_pages, pages = extract_pages(path, PDF_MAX_PAGES)
+    except PDFExtractionTimeout:
+        raise PDFTooSlowError()
+    except PDFMemoryBudgetExceeded:
+        raise PDFTooLargeError()
+    except PDFHasNoTextLayer:
+        raise ScannedPDFError()
 
     return {
         "total_pages": total_pages,
-        "extracted_pages": pages_to_extract,
+        "extracted_pages": len(pages),
         "pages": pages,
         "truncated": total_pages > PDF_MAX_PAGES,
         "suggested_start_page": suggest_content_start(pages),
     }
 
 
+def pdf_content_hash(file) -> str:
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def _pdf_extraction_cache_key(content_hash: str) -> str:
+    # PDF_MAX_PAGES shapes the result too (pages, truncated), so it is part
+    # of the key alongside the extractor version.
+    return (
+        f"{PDF_EXTRACTION_CACHE_KEY_PREFIX}:v{PDF_EXTRACTOR_VERSION}:"
+        f"{PDF_MAX_PAGES}:{content_hash}"
+    )
+
+
+def get_cached_pdf_extraction(content_hash: str) -> dict | None:
+    return cache.get(_pdf_extraction_cache_key(content_hash))
+
+
+def cache_pdf_extraction(content_hash: str, result: dict) -> None:
+    cache.set(_pdf_extraction_cache_key(content_hash), result, PDF_EXTRACTION_CACHE_TTL_SECONDS)
+
+
 def extract_video_id(url: str) -> str | None:
     parsed = urlparse(url)
     if parsed.hostname in ("www.youtube.com", "youtube.com", "m.youtube.com"):
@@ -122,27 +408,27 @@ def extract_video_id(url: str) -> str | None:
     return None
 
 
-def aggregate_chunks_by_minute(transcript) -> list[dict]:
+def aggregate_chunks_by_minute(transcript: Transcript) -> list[dict]:
     """
     Aggregates transcript chunks into minute-level buckets for the frontend
     time range selector. Returns one entry per minute instead of hundreds
     of sentence-level chunks, keeping the response payload lean.
     """
-    buckets: dict[int, dict] = {}
-    for chunk in transcript:
-        minute = int(chunk.start // 60)
-        if minute not in buckets:
-            buckets[minute] = {"texts": [], "start": minute * 60}
-        buckets[minute]["texts"].append(chunk.text)
-
-    return [
-        {
-            "minute": minute,
-            "start": data["start"],
-            "preview": " ".join(data["texts"])[:200],
-        }
-        for minute, data in sorted(buckets.items())
-    ]
+    minutes = []
+    first = 0
+    while first < len(transcript):
+        minute = int(transcript.starts[first] // 60)
+        stop = bisect_left(transcript.starts, (minute + 1) * 60, first)
+        offset = transcript.offsets[first]
+        minutes.append(
+            {
+                "minute": minute,
+                "start": minute * 60,
+                "preview": transcript.text[offset : min(offset + 200, transcript.offsets[stop] - 1)],
+            }
+        )
+        first = stop
+    return minutes
 
 
 def _get_supadata_error_message(payload: object, fallback: str) -> str:
@@ -207,74 +493,221 @@ def _extract_supadata_result(payload: dict) -> dict:
     return payload
 
 
-def _normalize_supadata_chunks(payload: dict) -> list[SimpleNamespace]:
+def _normalize_supadata_chunks(payload: dict) -> Transcript:
     result = _extract_supadata_result(payload)
     chunks = result.get("content")
     if not isinstance(chunks, list):
         raise ValidationError("Unexpected transcript response format.")
 
-    transcript = [
-        SimpleNamespace(
-            text=chunk.get("text", ""),
-            start=(chunk.get("offset", 0) or 0) / 1000,
-            duration=(chunk.get("duration", 0) or 0) / 1000,
-        )
-        for chunk in chunks
-    ]
-    if not transcript:
+    texts = trim_caption_overlap([chunk.get("text", "") or "" for chunk in chunks])
+    transcript = Transcript.from_chunks(
+        ((chunk.get("offset", 0) or 0) / 1000, (chunk.get("duration", 0) or 0) / 1000, text)
+        for chunk, text in zip(chunks, texts)
+    )
+    if not len(transcript):
         raise NoTranscriptFound("No transcript found.")
     return transcript
 
 
-def _poll_supadata_job(job_id: str) -> dict:
-    headers = {"x-api-key": settings.SUPADATA_API_KEY}
+def _check_supadata_job(job_id: str) -> dict | None:
+    """Polls a Supadata job once: the payload when completed, None while pending."""
+    response = supadata.get_client().get_job(job_id)
+    _raise_supadata_http_error(response)
+    payload = response.json()
+    status = payload.get("status")
 
-    for attempt in range(SUPADATA_POLL_MAX_ATTEMPTS):
-        response = requests.get(
-            f"{SUPADATA_JOB_URL}/{job_id}",
-            headers=headers,
-            timeout=SUPADATA_REQUEST_TIMEOUT_SECONDS,
-        )
-        _raise_supadata_http_error(response)
-        payload = response.json()
-        status = payload.get("status")
+    if status == "completed":
+        return payload
+    if status == "failed":
+        _raise_supadata_job_error(payload.get("error"))
+    return None
 
-        if status == "completed":
-            return payload
-        if status == "failed":
-            _raise_supadata_job_error(payload.get("error"))
 
-        if attempt < SUPADATA_POLL_MAX_ATTEMPTS - 1:
+def _poll_supadata_job(job_id: str, attempts: int) -> dict | None:
+    for attempt in range(attempts):
+        payload = _check_supadata_job(job_id)
+        if payload is not None:
+            return payload
+        if attempt < attempts - 1:
             sleep(SUPADATA_POLL_INTERVAL_SECONDS)
-
-    raise ValidationError("Transcript extraction timed out. Please try again.")
+    return None
 
 
-def _fetch_supadata_transcript(url: str) -> list[SimpleNamespace]:
-    headers = {"x-api-key": settings.SUPADATA_API_KEY}
-    response = requests.get(
-        SUPADATA_TRANSCRIPT_URL,
-        params={"url": url, "text": "false"},
-        headers=headers,
-        timeout=SUPADATA_REQUEST_TIMEOUT_SECONDS,
-    )
+def _start_supadata_transcript(url: str) -> tuple[Transcript | None, str | None]:
+    """
+    Requests a transcript: (chunks, None) when Supadata answers directly,
+    (None, job id) when it queued an asynchronous job instead.
+    """
+    response = supadata.get_client().get_transcript(url)
 
     if response.status_code == 202:
         payload = response.json()
         job_id = payload.get("id") or payload.get("jobId")
         if not job_id:
             raise ValidationError("Transcript job did not return an id.")
-        return _normalize_supadata_chunks(_poll_supadata_job(job_id))
+        return None, job_id
 
     _raise_supadata_http_error(response)
-    return _normalize_supadata_chunks(response.json())
+    return _normalize_supadata_chunks(response.json()), None
+
+
+def _transcript_cache_key(video_id: str) -> str:
+    return f"{TRANSCRIPT_CACHE_KEY_PREFIX}:{video_id}"
+
+
+def get_cached_transcript(video_id: str) -> Transcript | None:
+    data = cache.get(_transcript_cache_key(video_id))
+    return Transcript.from_bytes(data) if data is not None else None
+
+
+def cache_transcript(video_id: str, transcript: Transcript) -> None:
+    cache.set(_transcript_cache_key(video_id), transcript.to_bytes(), TRANSCRIPT_CACHE_TTL_SECONDS)
+    cache.delete(_transcript_minutes_key(video_id))
+
+
+def _transcript_minutes_key(video_id: str) -> str:
+    return f"{TRANSCRIPT_MINUTES_KEY_PREFIX}:{video_id}"
 
 
-def extract_youtube_transcript(
-    url: str, start_seconds: int = 0, end_seconds: int | None = None
+def get_transcript_minutes(video_id: str) -> dict | None:
+    """
+    Returns {"etag", "minutes"} for a video whose transcript is cached, or
+    None when it has not been extracted (or has expired). The minute
+    buckets are built once per transcript and cached alongside it; the
+    etag changes only when the transcript does.
+    """
+    key = _transcript_minutes_key(video_id)
+    entry = cache.get(key)
+    if entry is not None:
+        return entry
+
+    transcript = get_cached_transcript(video_id)
+    if transcript is None:
+        return None
+    minutes = aggregate_chunks_by_minute(transcript)
+    digest = hashlib.sha256(json.dumps(minutes, separators=(",", ":")).encode("utf-8"))
+    entry = {"etag": digest.hexdigest()[:32], "minutes": minutes}
+    cache.set(key, entry, TRANSCRIPT_CACHE_TTL_SECONDS)
+    return entry
+
+
+def window_minutes(minutes: list[dict], start_minute: int | None, end_minute: int | None) -> list[dict]:
+    """The buckets with start_minute <= minute < end_minute (either bound optional)."""
+    first = bisect_left(minutes, start_minute, key=itemgetter("minute")) if start_minute else 0
+    stop = (
+        bisect_left(minutes, end_minute, lo=first, key=itemgetter("minute"))
+        if end_minute is not None
+        else len(minutes)
+    )
+    return minutes[first:stop]
+
+
+def request_youtube_transcript(
+    user, video_id: str, url: str
+) -> tuple[Transcript | None, TranscriptJob | None]:
+    """
+    Fetches the transcript for `url` into the shared transcript cache.
+    Returns (transcript, None) when it is ready within
+    SUPADATA_INLINE_POLL_ATTEMPTS polls, otherwise (None, job) for a
+    TranscriptJob that poll_transcript_job finishes in the background. A
+    video that already has a pending job reuses it; either way `user` is
+    added to the job's users. Lets TranscriptsDisabled and
+    NoTranscriptFound bubble up to the view.
+    """
+    job = TranscriptJob.objects.filter(
+        video_id=video_id, status=TranscriptJob.STATUS_PENDING
+    ).first()
+    if job is not None:
+        job.users.add(user)
+        return None, job
+
+    transcript, supadata_job_id = _start_supadata_transcript(url)
+    if transcript is None:
+        payload = _poll_supadata_job(supadata_job_id, SUPADATA_INLINE_POLL_ATTEMPTS)
+        if payload is None:
+            job = TranscriptJob.objects.create(
+                video_id=video_id,
+                url=url,
+                supadata_job_id=supadata_job_id,
+                next_poll_at=timezone.now() + timedelta(seconds=SUPADATA_POLL_INTERVAL_SECONDS),
+            )
+            job.users.add(user)
+            return None, job
+        transcript = _normalize_supadata_chunks(payload)
+
+    cache_transcript(video_id, transcript)
+    return transcript, None
+
+
+def _finish_transcript_job(job: TranscriptJob, status: str, error: str = "") -> None:
+    job.status = status
+    job.error = error
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "error", "finished_at"])
+
+
+def poll_transcript_job(job: TranscriptJob) -> None:
+    """
+    Checks a pending job's Supadata job once. A finished transcript goes
+    into the transcript cache, where the client's repeated extract request
+    picks it up.
+    """
+    try:
+        payload = _check_supadata_job(job.supadata_job_id)
+        transcript = _normalize_supadata_chunks(payload) if payload is not None else None
+    except TranscriptsDisabled:
+        _finish_transcript_job(job, TranscriptJob.STATUS_FAILED, TRANSCRIPTS_DISABLED_MESSAGE)
+        return
+    except NoTranscriptFound:
+        _finish_transcript_job(job, TranscriptJob.STATUS_FAILED, NO_TRANSCRIPT_MESSAGE)
+        return
+    except ValidationError as e:
+        _finish_transcript_job(job, TranscriptJob.STATUS_FAILED, str(e.detail[0]))
+        return
+    except requests.RequestException:
+        # Transient; try again on the next poll unless the job is too old.
+        logger.warning("Polling transcript job %s failed", job.id, exc_info=True)
+        transcript = None
+
+    if transcript is not None:
+        cache_transcript(job.video_id, transcript)
+        _finish_transcript_job(job, TranscriptJob.STATUS_COMPLETED)
+        return
+
+    if timezone.now() - job.created_at > timedelta(seconds=SUPADATA_JOB_TIMEOUT_SECONDS):
+        _finish_transcript_job(
+            job, TranscriptJob.STATUS_FAILED, "Transcript extraction timed out. Please try again."
+        )
+        return
+    job.next_poll_at = timezone.now() + timedelta(seconds=SUPADATA_POLL_INTERVAL_SECONDS)
+    job.save(update_fields=["next_poll_at"])
+
+
+def poll_due_transcript_jobs(limit: int = TRANSCRIPT_POLL_BATCH_SIZE) -> int:
+    """
+    Polls every pending transcript job that is due, one request each, so a
+    single process keeps hundreds of jobs moving without sleeping on any of
+    them. Returns the number of jobs polled.
+    """
+    jobs = list(
+        TranscriptJob.objects.filter(
+            status=TranscriptJob.STATUS_PENDING, next_poll_at__lte=timezone.now()
+        ).order_by("next_poll_at")[:limit]
+    )
+    for job in jobs:
+        poll_transcript_job(job)
+    return len(jobs)
+
+
+def process_youtube_transcript(
+    video_id: str,
+    transcript: Transcript,
+    start_seconds: int = 0,
+    end_seconds: int | None = None,
+    include_minutes: bool = False,
 ) -> dict:
     """
-    Fetches and processes a YouTube transcript for a given URL.
+    Builds the extraction response for a fetched transcript.
 
     Segmentation is based on character count, not duration. The full
     transcript is always fetched and cleaned first. If it fits within
@@ -282,71 +715,54 @@ def extract_youtube_transcript(
     (needs_segmentation=False). Otherwise the frontend shows a time
     range selector and only the selected segment's text is returned.
 
-    For segmented videos the default end_seconds is calculated by
-    walking the transcript chunks until cumulative text length first
-    exceeds YOUTUBE_DEFAULT_SEGMENT_CHARS, giving the frontend a
-    conservative initial range that fits well within the hard limit.
-
-    Raises ValidationError for invalid URLs, videos over 5 hours,
-    or segments exceeding YOUTUBE_MAX_SEGMENT_CHARS.
-    Lets TranscriptsDisabled and NoTranscriptFound bubble up to the view.
-    """
-    video_id = extract_video_id(url)
-    if not video_id:
-        raise ValidationError("Invalid YouTube URL.")
+    For segmented videos the default end_seconds is the start of the
+    chunk where the text passes YOUTUBE_DEFAULT_SEGMENT_CHARS, giving the
+    frontend a conservative initial range that fits well within the hard
+    limit.
 
-    transcript = _fetch_supadata_transcript(url)
+    The per-minute previews for the range selector are only included when
+    `include_minutes` is set; clients otherwise load them once from
+    get_transcript_minutes instead of on every range change.
 
-    last = transcript[-1]
-    total_duration_seconds = last.start + last.duration
+    Raises ValidationError for videos over 5 hours or segments
+    exceeding YOUTUBE_MAX_SEGMENT_CHARS.
+    """
+    total_duration_seconds = transcript.duration_seconds
 
     if total_duration_seconds > YOUTUBE_MAX_DURATION_SECONDS:
         raise ValidationError(
             "This video is over 5 hours long. Please use a shorter video."
         )
 
-    # Build the full cleaned transcript to decide segmentation by char count
-    full_text = " ".join(chunk.text for chunk in transcript)
-    full_text = re.sub(r"\s+", " ", full_text).strip()
-    full_text = re.sub(r"[\x00-\x08\x0B\x0E-\x1F\x7F]", "", full_text)
+    full_text = transcript.text
 
     needs_segmentation = len(full_text) > YOUTUBE_MAX_SEGMENT_CHARS
-    minutes = aggregate_chunks_by_minute(transcript)
 
     if not needs_segmentation:
-        return {
+        result = {
             "video_id": video_id,
             "total_duration_seconds": round(total_duration_seconds),
             "needs_segmentation": False,
             "start_seconds": 0,
             "end_seconds": round(total_duration_seconds),
-            "minutes": minutes,
             "text": full_text,
             "char_count": len(full_text),
         }
+        if include_minutes:
+            result["minutes"] = aggregate_chunks_by_minute(transcript)
+        return result
 
     # Segmented path — calculate where the char limit falls in the timeline
     # so the frontend can default the end time to a value that fits.
     default_end = round(total_duration_seconds)
-    cumulative_len = 0
-    for chunk in transcript:
-        cumulative_len += len(chunk.text) + 1  # +1 for joining space
-        if cumulative_len > YOUTUBE_DEFAULT_SEGMENT_CHARS:
-            default_end = round(chunk.start)
-            break
+    limit_chunk = transcript.chunk_at_char(YOUTUBE_DEFAULT_SEGMENT_CHARS)
+    if limit_chunk < len(transcript):
+        default_end = round(transcript.starts[limit_chunk])
 
     effective_start = start_seconds
     effective_end = end_seconds if end_seconds is not None else default_end
 
-    selected = [
-        chunk
-        for chunk in transcript
-        if chunk.start >= effective_start and chunk.start < effective_end
-    ]
-
-    text = " ".join(chunk.text for chunk in selected)
-    text = re.sub(r"\s+", " ", text).strip()
-    text = re.sub(r"[\x00-\x08\x0B\x0E-\x1F\x7F]", "", text)
+    text = transcript.text_between(effective_start, effective_end)
 
     if len(text) > YOUTUBE_MAX_SEGMENT_CHARS:
         raise ValidationError(
@@ -354,26 +770,686 @@ def extract_youtube_transcript(
             "Please narrow your time range."
         )
 
-    return {
+    result = {
         "video_id": video_id,
         "total_duration_seconds": round(total_duration_seconds),
         "needs_segmentation": True,
         "start_seconds": effective_start,
         "end_seconds": round(effective_end),
-        "minutes": minutes,
         "text": text,
         "char_count": len(text),
     }
+    if include_minutes:
+        result["minutes"] = aggregate_chunks_by_minute(transcript)
+    return result
+
+
+def _build_generation_request(text: str, partial_output: str = "") -> dict:
+    messages = [{"role": "user", "content": f"Create comprehensive flashcards from this content:\n\n{text}"}]
+    if partial_output:
+        # Prefilling the assistant turn with what was already generated makes
+        # the model pick up exactly where the truncated response stopped.
+        # The API rejects prefills that end in whitespace.
+        messages.append({"role": "assistant", "content": partial_output.rstrip()})
+
+    return {
+        "model": settings.CLAUDE_MODEL,
+        "max_tokens": MAX_TOKENS,
+        # The system prompt is identical on every call, so mark it cacheable.
+        # Below the model's minimum cacheable length the block is simply
+        # processed as normal and the cache usage fields stay at zero.
+        "system": [
+            {
+                "type": "text",
+                "text": FLASHCARD_SYSTEM_PROMPT,
+                "cache_control": {"type": "ephemeral"},
+            }
+        ],
+        "messages": messages,
+    }
+
+
+def _message_text(message) -> str:
+    return "".join(block.text for block in message.content if block.type == "text")
 
 
 def generate_flashcards(text: str) -> list[dict]:
-    client = anthropic.Anthropic(api_key=settings.ANTHROPIC_API_KEY)
-    message = client.messages.create(
-        model=settings.CLAUDE_MODEL,
-        max_tokens=MAX_TOKENS,
-        system=FLASHCARD_SYSTEM_PROMPT,
-        messages=[{"role": "user", "content": f"Create comprehensive flashcards from this content:\n\n{text}"}],
+    """
+    Generates cards for `text`. When the response stops at max_tokens the
+    cards recovered so far are kept and up to MAX_CONTINUATIONS follow-up
+    requests continue the same array instead of discarding the output.
+    """
+    parser = FlashcardStreamParser()
+    cards = []
+    output = ""
+
+    for _ in range(MAX_CONTINUATIONS + 1):
+        message = llm.hedged_create_message(**_build_generation_request(text, output))
+        raw = _message_text(message)
+        output += raw
+        cards.extend(parser.feed(raw))
+        if message.stop_reason != "max_tokens":
+            break
+        logger.info("Generation hit max_tokens after %d cards, continuing", len(cards))
+
+    if not cards:
+        raise FlashcardGenerationError("Could not parse flashcards from AI response.")
+    return cards
+
+
+def compact_generation_input(text: str, input_type: str) -> tuple[str, int]:
+    """
+    Strips content that costs input tokens without adding study value
+    before the text is chunked and sent to the model. Returns the compacted
+    text and the approximate number of input tokens saved.
+    """
+    if input_type == "youtube":
+        compacted = collapse_repeated_sentences(text)
+    else:
+        pages = strip_page_furniture(text.split(PAGE_SEPARATOR))
+        compacted = strip_reference_section(PAGE_SEPARATOR.join(page for page in pages if page))
+
+    compacted = compacted.strip()
+    if not compacted:
+        # Never compact a request down to nothing; let the model see it.
+        return text, 0
+
+    tokens_saved = max(0, len(text) - len(compacted)) // CHARS_PER_TOKEN
+    if tokens_saved:
+        logger.info(
+            "Input compaction saved ~%d tokens (%d -> %d chars)",
+            tokens_saved,
+            len(text),
+            len(compacted),
+        )
+    return compacted, tokens_saved
+
+
+def _split_oversized(block: str, max_chars: int) -> list[str]:
+    if len(block) <= max_chars:
+        return [block]
+
+    pieces = []
+    current = ""
+    for sentence in re.split(r"(?<=[.!?])\s+", block):
+        while len(sentence) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_text_into_chunks(text: str, max_chars: int = GENERATION_CHUNK_CHARS) -> list[str]:
+    """
+    Splits generation input into chunks of at most max_chars, aligned to
+    page boundaries (the frontend joins PDF pages with PAGE_SEPARATOR) and
+    then paragraphs. A single paragraph larger than a chunk is split on
+    sentence boundaries, and only as a last resort mid-sentence.
+    """
+    text = text.strip()
+    if len(text) <= max_chars:
+        return [text]
+
+    blocks = []
+    for page in text.split(PAGE_SEPARATOR):
+        for paragraph in page.split("\n\n"):
+            paragraph = paragraph.strip()
+            if paragraph:
+                blocks.extend(_split_oversized(paragraph, max_chars))
+        if blocks and blocks[-1] != PAGE_SEPARATOR:
+            blocks.append(PAGE_SEPARATOR)
+
+    chunks = []
+    current = ""
+    for block in blocks:
+        if block == PAGE_SEPARATOR:
+            if current and not current.endswith(PAGE_SEPARATOR):
+                current += PAGE_SEPARATOR
+            continue
+        joiner = "" if not current or current.endswith(PAGE_SEPARATOR) else "\n\n"
+        if current and len(current) + len(joiner) + len(block) > max_chars:
+            chunks.append(current.removesuffix(PAGE_SEPARATOR))
+            current = block
+        else:
+            current += joiner + block
+    if current:
+        chunks.append(current.removesuffix(PAGE_SEPARATOR))
+    return chunks
+
+
+def flashcard_front_key(card: dict) -> str:
+    return re.sub(r"\W+", " ", card["front"].casefold()).strip()
+
+
+def merge_flashcards(card_sets: list[list[dict]]) -> list[dict]:
+    merged = []
+    seen = set()
+    for cards in card_sets:
+        for card in cards:
+            key = flashcard_front_key(card)
+            if key in seen:
+                continue
+            seen.add(key)
+            merged.append(card)
+    return merged
+
+
+def _generate_chunk(chunk: str) -> list[dict]:
+    cards = get_cached_flashcards(chunk)
+    if cards is None:
+        cards = generate_flashcards(chunk)
+        cache_flashcards(chunk, cards)
+    return cards
+
+
+def generate_flashcards_for_chunks(chunks: list[str]) -> tuple[list[dict], list[str]]:
+    """
+    Map-reduce generation: each chunk is generated (or served from the
+    generation cache) on a bounded thread pool, then the card sets are
+    merged in chunk order with duplicate fronts dropped. Returns the cards
+    and the chunks that failed; see _failed_chunks for when that fails the
+    whole request instead.
+    """
+    if len(chunks) == 1:
+        return _generate_chunk(chunks[0]), []
+
+    card_sets = _generate_card_sets(chunks)
+    failed = _failed_chunks(chunks, card_sets)
+    return merge_flashcards([cards for cards in card_sets if cards is not None]), failed
+
+
+def _generate_card_sets(chunks: list[str]) -> list[list[dict] | None]:
+    """Generates all chunks on one bounded thread pool; None marks a failed chunk."""
+    card_sets = []
+    with ThreadPoolExecutor(max_workers=min(GENERATION_MAX_WORKERS, len(chunks))) as pool:
+        futures = [pool.submit(_generate_chunk, chunk) for chunk in chunks]
+        for index, future in enumerate(futures):
+            try:
+                card_sets.append(future.result())
+            except Exception:
+                logger.exception("Generation failed for chunk %d of %d", index + 1, len(chunks))
+                card_sets.append(None)
+    return card_sets
+
+
+def _failed_chunks(chunks: list[str], card_sets: list[list[dict] | None]) -> list[str]:
+    """
+    Returns the chunks whose generation failed, which only lose their own
+    cards. Raises FlashcardGenerationError once they are more than
+    GENERATION_MAX_FAILED_CHUNK_SHARE of all chunks.
+    """
+    failed = [chunk for chunk, cards in zip(chunks, card_sets) if cards is None]
+    if len(failed) > len(chunks) * GENERATION_MAX_FAILED_CHUNK_SHARE:
+        raise FlashcardGenerationError()
+    return failed
+
+
+def plan_video_segments(transcript: Transcript) -> tuple[list[dict], int]:
+    """
+    Partitions a whole transcript into consecutive segments of at most
+    YOUTUBE_DEFAULT_SEGMENT_CHARS on chunk boundaries, each compacted and
+    split into generation chunks exactly like a single-range request.
+    Returns the segments and the approximate input tokens compaction saved.
+    """
+    segments = []
+    tokens_saved = 0
+    for first, stop in transcript.partition(YOUTUBE_DEFAULT_SEGMENT_CHARS):
+        text, saved = compact_generation_input(transcript.range_text(first, stop), "youtube")
+        tokens_saved += saved
+        end = transcript.starts[stop] if stop < len(transcript) else transcript.duration_seconds
+        segments.append(
+            {
+                "start_seconds": round(transcript.starts[first]),
+                "end_seconds": round(end),
+                "chunks": split_text_into_chunks(text),
+                "credit_units": credit_units(text),
+            }
+        )
+    return segments, tokens_saved
+
+
+def generate_flashcards_for_video(segments: list[dict], deck=None) -> tuple[dict, list[str]]:
+    """
+    Generates every segment from plan_video_segments concurrently, with the
+    chunks of all segments sharing one pool, and assembles a single card
+    set in time order. Each card carries its segment's start_seconds and
+    end_seconds. Duplicate fronts across the whole video are dropped, as
+    are near-duplicates of cards already in `deck`. Like
+    generate_flashcards_for_chunks, returns the failed chunks alongside.
+    """
+    chunks = [chunk for segment in segments for chunk in segment["chunks"]]
+    card_sets = _generate_card_sets(chunks)
+    failed = _failed_chunks(chunks, card_sets)
+
+    segment_cards = []
+    position = 0
+    for segment in segments:
+        segment_sets = card_sets[position : position + len(segment["chunks"])]
+        position += len(segment["chunks"])
+        timestamps = {
+            "start_seconds": segment["start_seconds"],
+            "end_seconds": segment["end_seconds"],
+        }
+        segment_cards.append(
+            [
+                {**card, **timestamps}
+                for cards in segment_sets
+                if cards is not None
+                for card in cards
+            ]
+        )
+
+    cards = merge_flashcards(segment_cards)
+    if deck is not None:
+        cards = drop_near_duplicates(deck, cards)
+
+    counts = Counter(card["start_seconds"] for card in cards)
+    summary = [
+        {
+            "start_seconds": segment["start_seconds"],
+            "end_seconds": segment["end_seconds"],
+            "card_count": counts[segment["start_seconds"]],
+        }
+        for segment in segments
+    ]
+    return {"segments": summary, "cards": cards}, failed
+
+
+def _count_generation_tokens(chunk: str) -> tuple[int, bool]:
+    request = _build_generation_request(chunk)
+    try:
+        tokens = llm.count_tokens(
+            model=request["model"], system=request["system"], messages=request["messages"]
+        )
+    except Exception:
+        logger.warning("Token counting failed, falling back to a character estimate", exc_info=True)
+        return (len(FLASHCARD_SYSTEM_PROMPT) + len(chunk)) // CHARS_PER_TOKEN, False
+    return tokens, True
+
+
+def _latency_model(model: str) -> tuple[float, float, float, int]:
+    """
+    Fits (output/input ratio, seconds per call, seconds per output token)
+    to the recent call history for `model`, falling back to defaults
+    until enough samples have been recorded.
+    """
+    history = llm.get_history(model)
+    ratio = ESTIMATE_DEFAULT_OUTPUT_RATIO
+    per_call = ESTIMATE_DEFAULT_CALL_SECONDS
+    per_token = ESTIMATE_DEFAULT_SECONDS_PER_OUTPUT_TOKEN
+    if len(history) < ESTIMATE_MIN_HISTORY_SAMPLES:
+        return ratio, per_call, per_token, len(history)
+
+    ratio = median(output / max(1, input_) for input_, output, _ in history)
+    try:
+        slope, intercept = linear_regression(
+            [output for _, output, _ in history], [latency for _, _, latency in history]
+        )
+    except StatisticsError:
+        # Every sample has the same output size; only the mean is known.
+        slope, intercept = 0.0, median(latency for _, _, latency in history)
+    if slope > 0:
+        per_token = slope
+    per_call = max(0.0, intercept)
+    return ratio, per_call, per_token, len(history)
+
+
+def estimate_generation(profile, input_type: str, text: str) -> dict:
+    """
+    Preflight estimate for generating `text` without calling the
+    generation model: exact input tokens from the token counting endpoint
+    (or a character estimate if it is unavailable), expected output size
+    and latency from the recent call history, and the credit cost.
+    """
+    chunks = split_text_into_chunks(text)
+    uncached = [chunk for chunk in chunks if cache.get(generation_cache_key(chunk)) is None]
+    with ThreadPoolExecutor(max_workers=min(GENERATION_MAX_WORKERS, len(chunks))) as pool:
+        counts = list(pool.map(_count_generation_tokens, chunks))
+    input_tokens = sum(tokens for tokens, _ in counts)
+
+    ratio, per_call, per_token, samples = _latency_model(settings.CLAUDE_MODEL)
+    max_output = MAX_TOKENS * (MAX_CONTINUATIONS + 1)
+    chunk_latencies = []
+    output_tokens = 0
+    for chunk, (tokens, _) in zip(chunks, counts):
+        if chunk not in uncached:
+            continue
+        chunk_output = min(max_output, round(tokens * ratio))
+        calls = max(1, math.ceil(chunk_output / MAX_TOKENS))
+        output_tokens += chunk_output
+        chunk_latencies.append(calls * per_call + chunk_output * per_token)
+
+    # Chunks run GENERATION_MAX_WORKERS at a time; each wave takes about
+    # as long as its slowest chunk.
+    waves = math.ceil(len(chunk_latencies) / GENERATION_MAX_WORKERS)
+    latency = waves * max(chunk_latencies, default=0.0)
+
+    reset_credits_if_needed(profile)
+    credit_cost = CREDIT_COSTS[input_type] * credit_units(text)
+    credits_remaining = max(0, MONTHLY_LIMITS[profile.tier] - profile.monthly_credits_used)
+    return {
+        "input_tokens": input_tokens,
+        "input_tokens_exact": all(exact for _, exact in counts),
+        "chunks": len(chunks),
+        "cached_chunks": len(chunks) - len(uncached),
+        "estimated_output_tokens": output_tokens,
+        "estimated_latency_seconds": round(latency, 1),
+        "latency_samples": samples,
+        "credit_cost": credit_cost,
+        "credits_remaining": credits_remaining,
+        "within_credit_limit": credit_cost <= credits_remaining,
+    }
+
+
+def enqueue_generation_job(
+    user, input_type: str, text: str, deck=None, credits_charged: int = 0
+) -> GenerationJob:
+    return GenerationJob.objects.create(
+        user=user, input_type=input_type, text=text, deck=deck, credits_charged=credits_charged
+    )
+
+
+def enqueue_video_generation_job(
+    user, segments: list[dict], deck=None, credits_charged: int = 0
+) -> GenerationJob:
+    """Queues generate_flashcards_for_video over plan_video_segments() output."""
+    return GenerationJob.objects.create(
+        user=user,
+        input_type="youtube",
+        text="",
+        segments=segments,
+        deck=deck,
+        credits_charged=credits_charged,
     )
 
-    raw = message.content[0].text
-    return parse_flashcards_json(raw)
+
+def claim_generation_jobs(limit: int) -> list[GenerationJob]:
+    """
+    Atomically moves up to `limit` of the oldest pending jobs to running.
+    SKIP LOCKED lets several worker processes poll the same table without
+    handing the same job out twice.
+    """
+    if limit <= 0:
+        return []
+
+    with transaction.atomic():
+        jobs = list(
+            GenerationJob.objects.select_for_update(skip_locked=True)
+            .filter(status=GenerationJob.STATUS_PENDING, via_batch=False)
+            .order_by("created_at")[:limit]
+        )
+        started_at = timezone.now()
+        for job in jobs:
+            job.status = GenerationJob.STATUS_RUNNING
+            job.started_at = started_at
+            job.save(update_fields=["status", "started_at"])
+    return jobs
+
+
+def requeue_stale_generation_jobs() -> int:
+    """
+    Returns jobs left running by a worker that died mid-generation to the
+    pending queue.
+    """
+    cutoff = timezone.now() - timedelta(seconds=GENERATION_JOB_STALE_SECONDS)
+    return GenerationJob.objects.filter(
+        status=GenerationJob.STATUS_RUNNING, via_batch=False, started_at__lt=cutoff
+    ).update(status=GenerationJob.STATUS_PENDING, started_at=None)
+
+
+_JOB_OUTCOME_FIELDS = ["status", "result", "error", "failed_chunks", "credits_charged", "finished_at"]
+
+
+def run_generation_job(job: GenerationJob) -> None:
+    """
+    Runs a claimed job. A failed job is refunded in full; a completed one
+    is refunded the share of its credits that paid for failed chunks, and
+    credits_charged is reduced to what was kept.
+    """
+    try:
+        if job.segments is not None:
+            chunks = [chunk for segment in job.segments for chunk in segment["chunks"]]
+            result, failed = generate_flashcards_for_video(job.segments, deck=job.deck)
+        else:
+            chunks = split_text_into_chunks(job.text)
+            result, failed = generate_flashcards_for_chunks(chunks)
+            if job.deck is not None:
+                result = drop_near_duplicates(job.deck, result)
+    except APIException as e:
+        job.status = GenerationJob.STATUS_FAILED
+        job.error = str(e.detail)
+    except Exception:
+        logger.exception("Generation job %s failed", job.id)
+        job.status = GenerationJob.STATUS_FAILED
+        job.error = FlashcardGenerationError.default_detail
+    else:
+        job.status = GenerationJob.STATUS_COMPLETED
+        job.result = result
+        job.failed_chunks = len(failed)
+        refund = failed_chunks_refund(job.credits_charged, chunks, failed)
+        refund_credits(job.user_id, job.created_at, refund)
+        job.credits_charged -= refund
+
+    if job.status == GenerationJob.STATUS_FAILED:
+        refund_generation_credits(job)
+    job.finished_at = timezone.now()
+    job.save(update_fields=_JOB_OUTCOME_FIELDS)
+
+
+def enqueue_batch_generation_job(
+    user, input_type: str, text: str, deck, credits_charged: int = 0
+) -> GenerationJob:
+    return GenerationJob.objects.create(
+        user=user,
+        input_type=input_type,
+        text=text,
+        deck=deck,
+        via_batch=True,
+        credits_charged=credits_charged,
+    )
+
+
+def _batch_custom_id(job: GenerationJob, chunk_index: int) -> str:
+    return f"{job.id.hex}-{chunk_index}"
+
+
+def _batch_requests(job: GenerationJob) -> tuple[list[dict], int]:
+    batch_requests = [
+        {"custom_id": _batch_custom_id(job, index), "params": _build_generation_request(chunk)}
+        for index, chunk in enumerate(split_text_into_chunks(job.text))
+    ]
+    size = sum(len(json.dumps(request).encode("utf-8")) for request in batch_requests)
+    return batch_requests, size
+
+
+def _claim_batch_jobs(max_requests: int, max_bytes: int) -> tuple[list[GenerationJob], list[dict]]:
+    """
+    Marks pending batch jobs running, up to `max_requests` requests and
+    `max_bytes` of request bodies, and returns them with their requests. A
+    job too large to fit an empty batch is failed rather than retried.
+    """
+    with transaction.atomic():
+        pending = (
+            GenerationJob.objects.select_for_update(skip_locked=True)
+            .filter(status=GenerationJob.STATUS_PENDING, via_batch=True)
+            .order_by("created_at")
+        )
+        jobs = []
+        batch_requests = []
+        batch_bytes = 0
+        too_large = []
+        for job in pending.iterator():
+            job_requests, job_bytes = _batch_requests(job)
+            if len(job_requests) > max_requests or job_bytes > max_bytes:
+                too_large.append(job)
+                continue
+            if (
+                len(batch_requests) + len(job_requests) > max_requests
+                or batch_bytes + job_bytes > max_bytes
+            ):
+                break
+            jobs.append(job)
+            batch_requests.extend(job_requests)
+            batch_bytes += job_bytes
+
+        now = timezone.now()
+        if too_large:
+            logger.warning("Failing %d batch jobs too large for one batch", len(too_large))
+            for job in too_large:
+                job.status = GenerationJob.STATUS_FAILED
+                job.error = "This document is too large for batch generation."
+                job.finished_at = now
+                job.save(update_fields=["status", "error", "finished_at"])
+                refund_generation_credits(job)
+        # Running without a batch_id marks a claim whose submission is in
+        # flight; the row locks are released before the API call.
+        GenerationJob.objects.filter(pk__in=[job.pk for job in jobs]).update(
+            status=GenerationJob.STATUS_RUNNING, started_at=now
+        )
+    return jobs, batch_requests
+
+
+def requeue_stale_batch_claims() -> int:
+    """
+    Returns batch jobs whose submission never recorded a batch_id (the
+    submitting process died mid-call) to the pending queue.
+    """
+    cutoff = timezone.now() - timedelta(seconds=GENERATION_JOB_STALE_SECONDS)
+    return GenerationJob.objects.filter(
+        status=GenerationJob.STATUS_RUNNING, via_batch=True, batch_id=None, started_at__lt=cutoff
+    ).update(status=GenerationJob.STATUS_PENDING, started_at=None)
+
+
+def submit_generation_batch(
+    max_requests: int = GENERATION_BATCH_MAX_REQUESTS,
+    max_bytes: int = GENERATION_BATCH_MAX_BYTES,
+) -> str | None:
+    """
+    Packs pending batch jobs into one Message Batches API submission, one
+    request per chunk. The jobs are claimed and committed before the
+    provider is called, so no row locks are held across the request; a
+    failed submission returns them to pending for the next run.
+    """
+    jobs, batch_requests = _claim_batch_jobs(max_requests, max_bytes)
+    if not batch_requests:
+        return None
+
+    job_ids = [job.pk for job in jobs]
+    try:
+        batch = llm.create_batch(batch_requests)
+    except Exception:
+        GenerationJob.objects.filter(pk__in=job_ids).update(
+            status=GenerationJob.STATUS_PENDING, started_at=None
+        )
+        raise
+    GenerationJob.objects.filter(pk__in=job_ids).update(batch_id=batch.id)
+
+    logger.info(
+        "Submitted batch %s with %d requests for %d jobs", batch.id, len(batch_requests), len(jobs)
+    )
+    return batch.id
+
+
+def _ingest_into_deck(deck, cards: list[dict]) -> list[dict]:
+    cards = drop_near_duplicates(deck, cards)
+    existing_count = deck.flashcards.count()
+    cards = cards[: max(0, MAX_CARDS_PER_DECK - existing_count)]
+    add_flashcards_to_deck(deck, cards, start_order=existing_count)
+    return cards
+
+
+def _ingest_generation_batch(batch_id: str) -> None:
+    outputs = {}
+    for entry in llm.batch_results(batch_id):
+        cards = None
+        if entry.result.type == "succeeded":
+            try:
+                cards = parse_flashcards_json(_message_text(entry.result.message))
+            except FlashcardGenerationError:
+                logger.warning("Unparseable batch result %s in %s", entry.custom_id, batch_id)
+        else:
+            logger.warning("Batch request %s in %s %s", entry.custom_id, batch_id, entry.result.type)
+        outputs[entry.custom_id] = cards
+
+    jobs = GenerationJob.objects.filter(
+        batch_id=batch_id, status=GenerationJob.STATUS_RUNNING
+    ).select_related("deck")
+    for job in jobs:
+        chunks = split_text_into_chunks(job.text)
+        card_sets = []
+        for index, chunk in enumerate(chunks):
+            cards = outputs.get(_batch_custom_id(job, index)) or None
+            if cards:
+                cache_flashcards(chunk, cards)
+            card_sets.append(cards)
+
+        try:
+            failed = _failed_chunks(chunks, card_sets)
+        except FlashcardGenerationError:
+            job.status = GenerationJob.STATUS_FAILED
+            job.error = FlashcardGenerationError.default_detail
+            refund_generation_credits(job)
+        else:
+            cards = merge_flashcards([cards for cards in card_sets if cards is not None])
+            if job.deck is not None:
+                cards = _ingest_into_deck(job.deck, cards)
+            job.status = GenerationJob.STATUS_COMPLETED
+            job.result = cards
+            job.failed_chunks = len(failed)
+            refund = failed_chunks_refund(job.credits_charged, chunks, failed)
+            refund_credits(job.user_id, job.created_at, refund)
+            job.credits_charged -= refund
+        job.finished_at = timezone.now()
+        job.save(update_fields=_JOB_OUTCOME_FIELDS)
+
+
+def collect_generation_batches() -> int:
+    """Ingests every submitted batch that has finished processing."""
+    batch_ids = (
+        GenerationJob.objects.filter(status=GenerationJob.STATUS_RUNNING, via_batch=True)
+        .exclude(batch_id=None)
+        .order_by()
+        .values_list("batch_id", flat=True)
+        .distinct()
+    )
+    collected = 0
+    for batch_id in list(batch_ids):
+        if llm.retrieve_batch(batch_id).processing_status != "ended":
+            continue
+        _ingest_generation_batch(batch_id)
+        collected += 1
+    return collected
+
+
+def stream_flashcards(text: str) -> Iterator[dict]:
+    """
+    Streaming counterpart of generate_flashcards. Yields each card as soon
+    as its JSON object closes in the model output instead of waiting for
+    the full response, continuing past max_tokens the same way.
+    """
+    parser = FlashcardStreamParser()
+    produced = 0
+    output = ""
+
+    for _ in range(MAX_CONTINUATIONS + 1):
+        with llm.stream_message(**_build_generation_request(text, output)) as stream:
+            for delta in stream.text_stream:
+                output += delta
+                for card in parser.feed(delta):
+                    produced += 1
+                    yield card
+            stop_reason = stream.get_final_message().stop_reason
+        if stop_reason != "max_tokens":
+            break
+
+    if not produced:
+        raise FlashcardGenerationError("Could not parse flashcards from AI response.")
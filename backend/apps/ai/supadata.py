@@ -0,0 +1,141 @@
+"""
+Process-wide HTTP client for the Supadata transcript API.
+
+Owns one keep-alive requests.Session, so transcript requests and job polls
+reuse pooled connections instead of paying a TCP and TLS handshake each,
+retries 429 and 5xx responses with exponential backoff (honouring
+Retry-After), and records latency metrics for each call. Responses are
+returned as-is; mapping Supadata errors is left to the caller.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from apps.ai.metrics import latency_percentiles
+
+logger = logging.getLogger(__name__)
+
+SUPADATA_TRANSCRIPT_PATH = "/v1/youtube/transcript"
+SUPADATA_JOB_PATH = "/v1/transcript"
+SUPADATA_POOL_MAXSIZE = 20
+SUPADATA_CONNECT_TIMEOUT_SECONDS = 5
+SUPADATA_READ_TIMEOUT_SECONDS = 30
+SUPADATA_MAX_RETRIES = 3
+SUPADATA_RETRY_BACKOFF_SECONDS = 0.5
+SUPADATA_RETRY_MAX_BACKOFF_SECONDS = 10
+SUPADATA_RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+SUPADATA_METRICS_WINDOW = 500
+
+
+class SupadataMetrics:
+    """In-process call counters plus a rolling window of latencies per operation."""
+
+    def __init__(self, window: int):
+        self._lock = threading.Lock()
+        self._window = window
+        self._latencies: dict[str, deque] = {}
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+
+    def record(self, *, operation: str, status: int | None, latency_seconds: float, retries: int) -> None:
+        with self._lock:
+            self.calls += 1
+            self.retries += retries
+            if status is None or status >= 500 or status == 429:
+                self.errors += 1
+            self._latencies.setdefault(operation, deque(maxlen=self._window)).append(
+                latency_seconds
+            )
+
+        logger.info(
+            "supadata %s status=%s latency=%.3fs retries=%d",
+            operation,
+            status if status is not None else "-",
+            latency_seconds,
+            retries,
+        )
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "errors": self.errors,
+                "retries": self.retries,
+                "latency_seconds": {
+                    operation: latency_percentiles(samples)
+                    for operation, samples in self._latencies.items()
+                },
+            }
+
+
+metrics = SupadataMetrics(SUPADATA_METRICS_WINDOW)
+
+
+class SupadataClient:
+    def __init__(self, base_url: str, api_key: str):
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+        self.session.headers["x-api-key"] = api_key
+        retry = Retry(
+            total=SUPADATA_MAX_RETRIES,
+            status_forcelist=SUPADATA_RETRYABLE_STATUS_CODES,
+            allowed_methods={"GET"},
+            backoff_factor=SUPADATA_RETRY_BACKOFF_SECONDS,
+            backoff_max=SUPADATA_RETRY_MAX_BACKOFF_SECONDS,
+            backoff_jitter=SUPADATA_RETRY_BACKOFF_SECONDS,
+            respect_retry_after_header=True,
+            # Hand the last 429/5xx back instead of raising, so callers map
+            # it like any other Supadata error response.
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_maxsize=SUPADATA_POOL_MAXSIZE, max_retries=retry)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _get(self, operation: str, path: str, **kwargs) -> requests.Response:
+        started = time.monotonic()
+        response = None
+        try:
+            response = self.session.get(
+                f"{self.base_url}{path}",
+                timeout=(SUPADATA_CONNECT_TIMEOUT_SECONDS, SUPADATA_READ_TIMEOUT_SECONDS),
+                **kwargs,
+            )
+            return response
+        finally:
+            retries = getattr(getattr(response, "raw", None), "retries", None)
+            metrics.record(
+                operation=operation,
+                status=response.status_code if response is not None else None,
+                latency_seconds=time.monotonic() - started,
+                retries=len(retries.history) if retries is not None else 0,
+            )
+
+    def get_transcript(self, url: str) -> requests.Response:
+        return self._get(
+            "transcript", SUPADATA_TRANSCRIPT_PATH, params={"url": url, "text": "false"}
+        )
+
+    def get_job(self, job_id: str) -> requests.Response:
+        return self._get("job", f"{SUPADATA_JOB_PATH}/{job_id}")
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> SupadataClient:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = SupadataClient(settings.SUPADATA_BASE_URL, settings.SUPADATA_API_KEY)
+    return _client
@@ -1,3 +1,1587 @@
-from django.test import TestCase
+import gzip
+import json
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from tempfile import TemporaryDirectory
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from pypdf import PageObject, PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+from apps.ai import (
+    fake_anthropic,
+    fake_supadata,
+    llm,
+    normalization,
+    pdf,
+    services,
+    supadata,
+    views,
+)
+from apps.ai.compaction import (
+    collapse_repeated_sentences,
+    strip_page_furniture,
+    strip_reference_section,
+    trim_caption_overlap,
+)
+from apps.ai.documents import (
+    load_transcript_document,
+    resolve_generation_input,
+    store_pdf_document,
+    store_transcript_document,
+)
+from apps.ai.metrics import latency_percentiles
+from apps.ai.models import GenerationJob, TranscriptJob
+from apps.ai.normalization import normalize_pdf_page, normalize_transcript
+from apps.ai.pdf import _page_kind
+from apps.ai.services import (
+    CREDIT_UNIT_CHARS,
+    GENERATION_CHUNK_CHARS,
+    GENERATION_JOB_STALE_SECONDS,
+    MAX_CONTINUATIONS,
+    PAGE_SEPARATOR,
+    FlashcardGenerationError,
+    FlashcardStreamParser,
+    collect_generation_batches,
+    claim_generation_jobs,
+    credit_units,
+    enqueue_batch_generation_job,
+    enqueue_generation_job,
+    failed_chunks_refund,
+    generate_flashcards,
+    get_cached_transcript,
+    merge_flashcards,
+    request_youtube_transcript,
+    requeue_stale_generation_jobs,
+    run_generation_job,
+    split_text_into_chunks,
+    submit_generation_batch,
+    window_minutes,
+)
+from apps.ai.transcript import Transcript
+from apps.users.models import User
+from distill.responses import StreamingJSONResponse
+
+LOCMEM_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+SAMPLE_TEXT = " ".join(
+    f"Fact number {i} is that the mitochondrion makes ATP through oxidative phosphorylation."
+    for i in range(12)
+)
+
+
+def _serve(server):
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
+
+
+def _stop(server):
+    server.shutdown()
+    server.server_close()
+
+
+class CreditUnitsTests(SimpleTestCase):
+    def test_input_up_to_one_unit_costs_one(self):
+        self.assertEqual(credit_units("a" * 50), 1)
+        self.assertEqual(credit_units("a" * CREDIT_UNIT_CHARS), 1)
+
+    def test_billing_ignores_generation_chunking(self):
+        text = "a" * 45000
+        self.assertEqual(len(split_text_into_chunks(text)), 2)
+        self.assertEqual(credit_units(text), 1)
+
+    def test_each_started_unit_is_billed(self):
+        self.assertEqual(credit_units("a" * (CREDIT_UNIT_CHARS + 1)), 2)
+
+
+class SplitTextIntoChunksTests(SimpleTestCase):
+    def test_short_text_is_one_chunk(self):
+        self.assertEqual(split_text_into_chunks("  short text  "), ["short text"])
+
+    def test_chunks_respect_limit_and_keep_all_paragraphs(self):
+        paragraphs = [f"Paragraph {i}. " + "word " * 50 for i in range(40)]
+        chunks = split_text_into_chunks("\n\n".join(paragraphs), max_chars=1000)
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(len(chunk) <= 1000 for chunk in chunks))
+        joined = "\n\n".join(chunks)
+        for i in range(40):
+            self.assertIn(f"Paragraph {i}.", joined)
+
+    def test_pages_are_not_merged_into_paragraphs(self):
+        text = PAGE_SEPARATOR.join(["a" * 600, "b" * 600])
+        self.assertEqual(split_text_into_chunks(text, max_chars=1000), ["a" * 600, "b" * 600])
+
+    def test_oversized_sentence_is_split_mid_sentence_as_last_resort(self):
+        chunks = split_text_into_chunks("x" * 2500, max_chars=1000)
+        self.assertEqual([len(chunk) for chunk in chunks], [1000, 1000, 500])
+
+    def test_default_limit(self):
+        chunks = split_text_into_chunks("word. " * (GENERATION_CHUNK_CHARS // 3))
+        self.assertTrue(all(len(chunk) <= GENERATION_CHUNK_CHARS for chunk in chunks))
+
+
+class MergeFlashcardsTests(SimpleTestCase):
+    def test_keeps_chunk_order_and_drops_duplicate_fronts(self):
+        merged = merge_flashcards(
+            [
+                [{"front": "What is ATP?", "back": "1"}, {"front": "Define osmosis", "back": "2"}],
+                [{"front": "what is atp", "back": "3"}, {"front": "Define diffusion", "back": "4"}],
+            ]
+        )
+        self.assertEqual([card["back"] for card in merged], ["1", "2", "4"])
+
+
+def _stream(data: bytes, **entries) -> DecodedStreamObject:
+    stream = DecodedStreamObject()
+    stream.set_data(data)
+    stream.update({NameObject(key): value for key, value in entries.items()})
+    return stream
+
+
+def _resources(fonts=None, xobjects=None) -> DictionaryObject:
+    resources = DictionaryObject()
+    if fonts:
+        resources[NameObject("/Font")] = DictionaryObject(
+            {NameObject("/F1"): DictionaryObject({NameObject("/Subtype"): NameObject("/Type1")})}
+        )
+    if xobjects:
+        resources[NameObject("/XObject")] = DictionaryObject(
+            {NameObject(f"/X{i}"): xobject for i, xobject in enumerate(xobjects)}
+        )
+    return resources
+
+
+def _image() -> DecodedStreamObject:
+    return _stream(b"\x00", **{"/Subtype": NameObject("/Image")})
+
+
+def _form(data: bytes, resources=None) -> DecodedStreamObject:
+    entries = {"/Subtype": NameObject("/Form")}
+    if resources is not None:
+        entries["/Resources"] = resources
+    return _stream(data, **entries)
+
+
+def _page(content: bytes, resources: DictionaryObject) -> PageObject:
+    page = PageObject.create_blank_page(width=100, height=100)
+    page[NameObject("/Resources")] = resources
+    page[NameObject("/Contents")] = _stream(content)
+    return page
+
+
+class NormalizationStageTests(SimpleTestCase):
+    def test_strip_control_chars_keeps_layout_whitespace(self):
+        self.assertEqual(
+            normalization.strip_control_chars("a\x00b\x07c\x7f\td\ne\x0cf\rg\x0bh"),
+            "abc\td\ne\x0cf\rgh",
+        )
+
+    def test_to_nfc_composes_combining_marks(self):
+        decomposed = "Cafe\u0301 u\u0308ber"
+        self.assertEqual(normalization.to_nfc(decomposed), "Caf\u00e9 \u00fcber")
+        composed = "Caf\u00e9"
+        self.assertIs(normalization.to_nfc(composed), composed)
+
+    def test_dehyphenate_joins_only_words_broken_across_lines(self):
+        cases = {
+            "photo-\nsynthesis": "photosynthesis",
+            "Jean-\nPaul": "Jean-\nPaul",
+            "step 3-\nnext": "step 3-\nnext",
+            "items:\n-\nfirst": "items:\n-\nfirst",
+            "well-known": "well-known",
+            "mito-\nchon-\ndria": "mitochondria",
+        }
+        for text, expected in cases.items():
+            with self.subTest(text=text):
+                self.assertEqual(normalization.dehyphenate(text), expected)
+
+    def test_collapse_blank_lines_keeps_paragraph_breaks(self):
+        self.assertEqual(
+            normalization.collapse_blank_lines("a\n\nb\n\n\n\n\nc\nd"), "a\n\nb\n\nc\nd"
+        )
+
+    def test_collapse_spaces_leaves_single_spaces_and_newlines(self):
+        self.assertEqual(normalization.collapse_spaces("a  b\t\tc \td e\n  f"), "a b c d e\n f")
+
+    def test_collapse_whitespace(self):
+        self.assertEqual(normalization.collapse_whitespace("  a \n\t b\u00a0\u00a0c  "), "a b c")
+
+    def test_pdf_page_pipeline(self):
+        text = "  Oxidative phos-\nphorylation\x00  makes\t\tATP.\n\n\n\nCafe\u0301  au lait.  "
+        self.assertEqual(
+            normalize_pdf_page(text), "Oxidative phosphorylation makes ATP.\n\nCaf\u00e9 au lait."
+        )
+
+    def test_transcript_pipeline(self):
+        text = "\x00so  the\nmitochondria\u00a0is  the powerhouse\u0301 "
+        self.assertEqual(normalize_transcript(text), "so the mitochondria is the powerhous\u00e9")
+        self.assertEqual(normalize_transcript(" \x07\n "), "")
+
+
+class PageKindTests(SimpleTestCase):
+    def test_page_level_text(self):
+        page = _page(b"BT /F1 12 Tf (hi) Tj ET", _resources(fonts=True))
+        self.assertEqual(_page_kind(page), "text")
+
+    def test_bare_image(self):
+        page = _page(b"q /X0 Do Q", _resources(xobjects=[_image()]))
+        self.assertEqual(_page_kind(page), "image")
+
+    def test_image_wrapped_in_form(self):
+        form = _form(b"q /X0 Do Q", _resources(xobjects=[_image()]))
+        page = _page(b"/X0 Do", _resources(xobjects=[form]))
+        self.assertEqual(_page_kind(page), "image")
+
+    def test_text_drawn_from_form_next_to_image(self):
+        form = _form(b"BT /F1 12 Tf (hi) Tj ET", _resources(fonts=True))
+        page = _page(b"/X0 Do /X1 Do", _resources(xobjects=[_image(), form]))
+        self.assertEqual(_page_kind(page), "text")
+
+    def test_text_in_nested_form_over_scan(self):
+        inner = _form(b"BT /F1 12 Tf (hi) Tj ET", _resources(fonts=True))
+        outer = _form(b"/X0 Do /X1 Do", _resources(xobjects=[_image(), inner]))
+        page = _page(b"/X0 Do", _resources(xobjects=[outer]))
+        self.assertEqual(_page_kind(page), "text")
+
+    def test_form_without_resources_uses_page_fonts(self):
+        form = _form(b"BT /F1 12 Tf (hi) Tj ET")
+        resources = _resources(fonts=True, xobjects=[_image(), form])
+        page = _page(b"/X0 Do /X1 Do", resources)
+        self.assertEqual(_page_kind(page), "text")
+
+    def test_empty_page_is_blank(self):
+        self.assertEqual(_page_kind(_page(b"", _resources())), "blank")
+
+
+class LatencyPercentilesTests(SimpleTestCase):
+    def test_fewer_than_two_samples(self):
+        self.assertEqual(latency_percentiles([]), {"p50": None, "p95": None, "p99": None})
+        self.assertEqual(latency_percentiles([0.12345]), {"p50": 0.123, "p95": 0.123, "p99": 0.123})
+
+    def test_percentiles_of_a_window(self):
+        samples = deque((i / 100 for i in range(1, 101)), maxlen=100)
+        self.assertEqual(latency_percentiles(samples), {"p50": 0.505, "p95": 0.951, "p99": 0.99})
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def _half_open_breaker(self):
+        breaker = llm.CircuitBreaker(failure_threshold=1, reset_seconds=60)
+        breaker.record_failure()
+        breaker._opened_at -= 60
+        return breaker
+
+    def test_only_one_probe_when_half_open(self):
+        breaker = self._half_open_breaker()
+        breaker.before_call()
+        with self.assertRaises(llm.LLMUnavailableError):
+            breaker.before_call()
+        breaker.record_success()
+        breaker.before_call()
+
+    def test_queue_timeout_does_not_strand_the_probe(self):
+        breaker = self._half_open_breaker()
+        with (
+            mock.patch.object(llm, "breaker", breaker),
+            mock.patch.object(llm, "_slots", threading.BoundedSemaphore(1)) as slots,
+            mock.patch.object(llm, "_queue_timeout", 0.01),
+        ):
+            slots.acquire()
+            for call in (llm.create_message, lambda: llm.stream_message().__enter__()):
+                with self.assertRaisesMessage(llm.LLMUnavailableError, "busy"):
+                    call()
+            slots.release()
+        # The probe is still available to the next caller.
+        breaker.before_call()
+
+
+class FakeAnthropicMixin:
+    """Points the LLM gateway's client at a fake Anthropic server."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = fake_anthropic.make_server(batch_delay_seconds=0)
+        cls.settings_override = override_settings(
+            ANTHROPIC_BASE_URL=_serve(cls.server), CACHES=LOCMEM_CACHES
+        )
+        cls.settings_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        _stop(cls.server)
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        # The latency history lives in Redis, which LocMemCache can't provide.
+        for patcher in (
+            mock.patch.object(llm, "_client", None),
+            mock.patch.object(llm, "_record_history"),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+class FakeAnthropicTests(FakeAnthropicMixin, SimpleTestCase):
+    def _params(self, **overrides):
+        return {**services._build_generation_request(SAMPLE_TEXT), **overrides}
+
+    def test_create_and_stream_return_the_same_cards(self):
+        message = llm.create_message(**self._params())
+        with llm.stream_message(**self._params()) as stream:
+            streamed = "".join(stream.text_stream)
+            final = stream.get_final_message()
+        self.assertEqual(streamed, services._message_text(message))
+        self.assertEqual(final.stop_reason, "end_turn")
+        self.assertEqual(len(services.parse_flashcards_json(streamed)), 12)
+
+    def test_max_tokens_truncates_the_output(self):
+        message = llm.create_message(**self._params(max_tokens=50))
+        self.assertEqual(message.stop_reason, "max_tokens")
+        self.assertEqual(len(services._message_text(message)), 50 * fake_anthropic.CHARS_PER_TOKEN)
+
+    def test_count_tokens(self):
+        params = self._params()
+        del params["max_tokens"]
+        self.assertGreater(llm.count_tokens(**params), 0)
+
+
+@override_settings(LLM_HEDGING_ENABLED=True)
+class HedgingTests(FakeAnthropicMixin, SimpleTestCase):
+    HEDGE_AFTER = 0.2
+
+    def setUp(self):
+        super().setUp()
+        for patcher in (
+            mock.patch.object(llm.metrics, "latency_percentile", return_value=self.HEDGE_AFTER),
+            mock.patch.object(llm, "LLM_HEDGE_MIN_DELAY_SECONDS", self.HEDGE_AFTER),
+            # Every call earns a whole token, so a late primary is always hedged.
+            mock.patch.object(llm, "hedge_budget", llm.HedgeBudget(1, 1)),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.hedged_calls = llm.metrics.hedged_calls
+        self.hedge_wins = llm.metrics.hedge_wins
+
+    def _hedges(self):
+        return llm.metrics.hedged_calls - self.hedged_calls
+
+    def _hold_slots(self, count):
+        for _ in range(count):
+            self.assertTrue(llm._slots.acquire(timeout=1))
+
+    def _release_slots(self, count):
+        for _ in range(count):
+            llm._slots.release()
+
+    def test_stalled_primary_is_cut_off_when_the_hedge_wins(self):
+        self.server.RequestHandlerClass.state.stall_streams(1, seconds=5)
+        started = time.monotonic()
+        message = llm.hedged_create_message(**services._build_generation_request(SAMPLE_TEXT))
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(len(services.parse_flashcards_json(services._message_text(message))), 12)
+        self.assertEqual(self._hedges(), 1)
+        self.assertEqual(llm.metrics.hedge_wins - self.hedge_wins, 1)
+        # The primary gave its slot back without waiting out its stall.
+        self._hold_slots(llm.LLM_MAX_CONCURRENCY)
+        self._release_slots(llm.LLM_MAX_CONCURRENCY)
+        self.assertLess(time.monotonic() - started, 2)
+
+    def test_hedge_delay_starts_once_the_primary_holds_a_slot(self):
+        self._hold_slots(llm.LLM_MAX_CONCURRENCY)
+        result = {}
+        thread = threading.Thread(
+            target=lambda: result.update(
+                message=llm.hedged_create_message(**services._build_generation_request(SAMPLE_TEXT))
+            )
+        )
+        thread.start()
+        # Queue for longer than the hedge delay before any slot frees up.
+        time.sleep(self.HEDGE_AFTER * 3)
+        self._release_slots(llm.LLM_MAX_CONCURRENCY)
+        thread.join(5)
+        self.assertIn("message", result)
+        self.assertEqual(self._hedges(), 0)
+
+
+class BatchGenerationTests(FakeAnthropicMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(email="batch@example.com")
+
+    def _enqueue(self, text=SAMPLE_TEXT):
+        return enqueue_batch_generation_job(self.user, "text", text, deck=None)
+
+    def test_submit_and_collect(self):
+        job = self._enqueue()
+        batch_id = submit_generation_batch()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.batch_id), (GenerationJob.STATUS_RUNNING, batch_id))
+        self.assertIsNone(submit_generation_batch())
+
+        self.assertEqual(collect_generation_batches(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, GenerationJob.STATUS_COMPLETED)
+        self.assertEqual(len(job.result), 12)
+
+    def test_batches_are_capped_by_bytes(self):
+        first, second = self._enqueue(), self._enqueue()
+        _, size = services._batch_requests(first)
+        submit_generation_batch(max_bytes=size + size // 2)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertIsNotNone(first.batch_id)
+        self.assertEqual(second.status, GenerationJob.STATUS_PENDING)
+
+    def test_job_larger_than_a_batch_fails(self):
+        job = self._enqueue()
+        self.assertIsNone(submit_generation_batch(max_bytes=100))
+        job.refresh_from_db()
+        self.assertEqual(job.status, GenerationJob.STATUS_FAILED)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_failed_submission_returns_jobs_to_pending(self):
+        job = self._enqueue()
+        with mock.patch.object(llm, "create_batch", side_effect=llm.LLMUnavailableError()):
+            with self.assertRaises(llm.LLMUnavailableError):
+                submit_generation_batch()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.batch_id), (GenerationJob.STATUS_PENDING, None))
+
+
+class TrimCaptionOverlapTests(SimpleTestCase):
+    def test_removes_words_repeated_from_previous_chunk(self):
+        self.assertEqual(
+            trim_caption_overlap(["so the cell membrane", "cell membrane controls transport"]),
+            ["so the cell membrane", "controls transport"],
+        )
+
+    def test_single_shared_word_is_kept(self):
+        self.assertEqual(trim_caption_overlap(["the cell", "cell walls"]), ["the cell", "cell walls"])
+
+    def test_exact_repeats_are_emptied_not_dropped(self):
+        texts = ["the cell membrane", "the cell membrane", "the cell membrane", "controls transport"]
+        trimmed = trim_caption_overlap(texts)
+        self.assertEqual(len(trimmed), len(texts))
+        self.assertEqual(trimmed, ["the cell membrane", "", "", "controls transport"])
+
+    def test_timestamps_stay_aligned_with_their_text(self):
+        payload = {
+            "content": [
+                {"text": "welcome back everyone", "offset": 0, "duration": 2000},
+                {"text": "welcome back everyone", "offset": 2000, "duration": 2000},
+                {"text": "back everyone today we cover ATP", "offset": 4000, "duration": 2000},
+                {"text": "synthase and the gradient", "offset": 6000, "duration": 2000},
+            ]
+        }
+        transcript = services._normalize_supadata_chunks(payload)
+        self.assertEqual(list(transcript.starts), [0.0, 4.0, 6.0])
+        self.assertEqual(transcript.text_between(4, 6), "today we cover ATP")
+        self.assertEqual(transcript.text_between(6, 8), "synthase and the gradient")
+
+
+class CompactionStageTests(SimpleTestCase):
+    def test_strip_page_furniture_drops_running_headers_and_page_numbers(self):
+        bodies = ["Cells divide.", "DNA replicates.", "Proteins fold.", "Enzymes catalyse."]
+        pages = [f"Cell Biology Notes\n{body}\n{n}" for n, body in enumerate(bodies, 1)]
+        self.assertEqual(strip_page_furniture(pages), bodies)
+
+    def test_strip_page_furniture_keeps_lines_on_few_pages(self):
+        pages = ["Intro\nBody one.", "Body two.", "Body three.", "Body four."]
+        self.assertEqual(strip_page_furniture(pages), pages)
+
+    def test_strip_reference_section_only_near_the_end(self):
+        body = "Body sentence. " * 50
+        self.assertEqual(strip_reference_section(f"{body}\nReferences\n1. Smith"), body.rstrip())
+        early = f"References\n{body}"
+        self.assertEqual(strip_reference_section(early), early)
+
+    def test_collapse_repeated_sentences(self):
+        self.assertEqual(
+            collapse_repeated_sentences("ATP is energy. ATP is  energy. Cells use it. ATP is energy."),
+            "ATP is energy. Cells use it. ATP is energy.",
+        )
+
+
+class GenerateVideoTests(FakeAnthropicMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(email="video@example.com")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        sentences = SAMPLE_TEXT.split(". ")
+        transcript = Transcript.from_chunks(
+            (i * 30.0, 30.0, sentence + ".") for i, sentence in enumerate(sentences)
+        )
+        self.document_id = store_transcript_document(self.user, "dQw4w9WgXcQ", transcript)
+
+    def _credits_used(self):
+        self.user.profile.refresh_from_db()
+        return self.user.profile.monthly_credits_used
+
+    def _post(self):
+        return self.client.post(
+            reverse("generate_video"), {"document_id": self.document_id}, format="json"
+        )
+
+    def test_queues_a_job_that_the_worker_completes(self):
+        response = self._post()
+        self.assertEqual(response.status_code, 202)
+        job = GenerationJob.objects.get(pk=response.data["id"])
+        self.assertEqual(job.status, GenerationJob.STATUS_PENDING)
+        self.assertEqual(job.credits_charged, self._credits_used())
+
+        run_generation_job(job)
+        job.refresh_from_db()
+        self.assertEqual(job.status, GenerationJob.STATUS_COMPLETED)
+        self.assertEqual(len(job.result["segments"]), 1)
+        self.assertTrue(job.result["cards"])
+        self.assertTrue(all("start_seconds" in card for card in job.result["cards"]))
+
+    def test_failed_job_refunds_its_credits(self):
+        job = GenerationJob.objects.get(pk=self._post().data["id"])
+        self.assertGreater(self._credits_used(), 0)
+
+        with mock.patch.object(services, "_generate_card_sets", return_value=[None]):
+            run_generation_job(job)
+        job.refresh_from_db()
+        self.assertEqual(job.status, GenerationJob.STATUS_FAILED)
+        self.assertEqual(self._credits_used(), 0)
+
+
+CARDS = [
+    {"front": "What does ATP synthase make?", "back": "ATP, from ADP and phosphate."},
+    {"front": 'Why is it called the "powerhouse"?', "back": "It makes most of the cell's {energy}."},
+    {"front": "Which gradient drives it?", "back": "The proton gradient \\ across the membrane."},
+]
+
+
+class FlashcardStreamParserTests(SimpleTestCase):
+    def test_cards_split_at_every_boundary(self):
+        raw = "```json\n" + json.dumps(CARDS) + "\n```"
+        parser = FlashcardStreamParser()
+        cards = [card for char in raw for card in parser.feed(char)]
+        self.assertEqual(cards, CARDS)
+
+    def test_escapes_and_braces_inside_strings(self):
+        raw = json.dumps(CARDS)
+        for split in range(len(raw)):
+            parser = FlashcardStreamParser()
+            self.assertEqual(parser.feed(raw[:split]) + parser.feed(raw[split:]), CARDS)
+
+    def test_truncated_output_keeps_complete_cards(self):
+        raw = json.dumps(CARDS)
+        cut = raw.index(CARDS[2]["back"][:10])
+        parser = FlashcardStreamParser()
+        self.assertEqual(parser.feed(raw[:cut]), CARDS[:2])
+        # The continuation picks up mid-string and completes the last card.
+        self.assertEqual(parser.feed(raw[cut:]), CARDS[2:])
+
+    def test_invalid_objects_are_skipped(self):
+        parser = FlashcardStreamParser()
+        self.assertEqual(parser.feed('[{"front": "only a front"}, ' + json.dumps(CARDS[0]) + "]"), CARDS[:1])
+
+
+def _message(text: str, stop_reason: str):
+    return SimpleNamespace(content=[SimpleNamespace(type="text", text=text)], stop_reason=stop_reason)
+
+
+class GenerateFlashcardsContinuationTests(SimpleTestCase):
+    def _generate(self, messages):
+        with mock.patch.object(llm, "hedged_create_message", side_effect=messages) as create:
+            return generate_flashcards("source text"), create.call_args_list
+
+    def test_continues_after_max_tokens_with_prefill(self):
+        raw = json.dumps(CARDS, indent=2)
+        # Cut just before the second card, after the whitespace that precedes it.
+        cut = raw.index("{", raw.index("}"))
+        cards, calls = self._generate(
+            [_message(raw[:cut], "max_tokens"), _message(raw[cut:], "end_turn")]
+        )
+        self.assertEqual(cards, CARDS)
+        self.assertEqual(len(calls), 2)
+        prefill = calls[1].kwargs["messages"][-1]
+        self.assertEqual(prefill, {"role": "assistant", "content": raw[:cut].rstrip()})
+
+    def test_stops_after_max_continuations(self):
+        raw = json.dumps(CARDS)
+        second = raw.index("{", raw.index("}"))
+        messages = [_message(raw[: second + 5], "max_tokens")] + [
+            _message(" ", "max_tokens") for _ in range(MAX_CONTINUATIONS + 1)
+        ]
+        cards, calls = self._generate(messages)
+        self.assertEqual(cards, CARDS[:1])
+        self.assertEqual(len(calls), MAX_CONTINUATIONS + 1)
+
+    def test_no_complete_card_is_an_error(self):
+        with self.assertRaises(FlashcardGenerationError):
+            self._generate([_message('[{"front": "cut', "end_turn")])
+
+
+class TranscriptTests(SimpleTestCase):
+    def setUp(self):
+        # Chunks of 4 characters ("c0 a") every 10 seconds, lasting 5.
+        self.transcript = Transcript.from_chunks(
+            [(i * 10.0, 5.0, f"c{i} a") for i in reversed(range(6))] + [(60.0, 5.0, "  ")]
+        )
+
+    def test_from_chunks_sorts_and_drops_empty_chunks(self):
+        self.assertEqual(len(self.transcript), 6)
+        self.assertEqual(list(self.transcript.starts), [0, 10, 20, 30, 40, 50])
+        self.assertEqual(self.transcript.text, "c0 a c1 a c2 a c3 a c4 a c5 a")
+        self.assertEqual(self.transcript.duration_seconds, 55.0)
+
+    def test_chunk_range_bisects_on_start_times(self):
+        self.assertEqual(self.transcript.chunk_range(10, 30), (1, 3))
+        self.assertEqual(self.transcript.chunk_range(11, 30), (2, 3))
+        self.assertEqual(self.transcript.chunk_range(0, 1000), (0, 6))
+        self.assertEqual(self.transcript.chunk_range(30, 10), (3, 3))
+        self.assertEqual(self.transcript.text_between(10, 30), "c1 a c2 a")
+        self.assertEqual(self.transcript.text_between(100, 200), "")
+
+    def test_partition_respects_max_chars(self):
+        ranges = self.transcript.partition(9)
+        self.assertEqual(ranges, [(0, 2), (2, 4), (4, 6)])
+        self.assertTrue(all(len(self.transcript.range_text(*r)) <= 9 for r in ranges))
+        self.assertEqual(self.transcript.partition(8), [(i, i + 1) for i in range(6)])
+        self.assertEqual(self.transcript.partition(1), [(i, i + 1) for i in range(6)])
+        self.assertEqual(self.transcript.partition(1000), [(0, 6)])
+
+    def test_chunk_at_char(self):
+        text = self.transcript.text
+        for position in range(len(text)):
+            index = self.transcript.chunk_at_char(position)
+            self.assertIn(text[position], " " + self.transcript.range_text(index, index + 1))
+
+    def test_round_trips(self):
+        for copy in (
+            Transcript.from_bytes(self.transcript.to_bytes()),
+            Transcript.from_columns(json.loads(json.dumps(self.transcript.to_columns()))),
+        ):
+            self.assertEqual(copy.to_columns(), self.transcript.to_columns())
+
+
+class FakeSupadataMixin:
+    """Points the Supadata client at a fake Supadata server."""
+
+    job_delay_seconds = 0
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = fake_supadata.make_server(
+            video_minutes=2, job_delay_seconds=cls.job_delay_seconds
+        )
+        cls.fake_state = cls.server.RequestHandlerClass.state
+        cls.settings_override = override_settings(
+            SUPADATA_BASE_URL=_serve(cls.server), CACHES=LOCMEM_CACHES
+        )
+        cls.settings_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        _stop(cls.server)
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(supadata, "_client", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+VIDEO_ID = "dQw4w9WgXcQ"
+VIDEO_URL = f"https://www.youtube.com/watch?v={VIDEO_ID}"
+
+
+class TranscriptJobTests(FakeSupadataMixin, TestCase):
+    # Jobs stay pending until a test lets the fake finish them.
+    job_delay_seconds = 3600
+
+    def setUp(self):
+        super().setUp()
+        self.fake_state.job_delay_seconds = self.job_delay_seconds
+        patcher = mock.patch.object(services, "SUPADATA_INLINE_POLL_ATTEMPTS", 1)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user(email="waiter@example.com")
+        self.other = User.objects.create_user(email="other@example.com")
+        transcript, self.job = request_youtube_transcript(self.user, VIDEO_ID, VIDEO_URL)
+        self.assertIsNone(transcript)
+
+    def _get(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.get(reverse("transcript_job_detail", args=[self.job.id]))
+
+    def _poll(self) -> str:
+        out = StringIO()
+        call_command("poll_transcript_jobs", stdout=out)
+        self.job.refresh_from_db()
+        return out.getvalue()
+
+    def _make_due(self):
+        TranscriptJob.objects.filter(pk=self.job.pk).update(
+            next_poll_at=timezone.now() - timedelta(seconds=1)
+        )
+
+    def test_job_is_visible_only_to_users_waiting_on_it(self):
+        self.assertEqual(self._get(self.user).data["status"], TranscriptJob.STATUS_PENDING)
+        self.assertEqual(self._get(self.other).status_code, 404)
+
+        _, job = request_youtube_transcript(self.other, VIDEO_ID, VIDEO_URL)
+        self.assertEqual(job, self.job)
+        self.assertEqual(self._get(self.other).status_code, 200)
+
+    def test_get_does_not_poll_upstream(self):
+        self._make_due()
+        self.fake_state.job_delay_seconds = 0
+        with mock.patch.object(services, "_check_supadata_job") as check:
+            self.assertEqual(self._get(self.user).data["status"], TranscriptJob.STATUS_PENDING)
+        check.assert_not_called()
+
+    def test_command_completes_due_jobs(self):
+        self._make_due()
+        self.fake_state.job_delay_seconds = 0
+        self.assertIn("Polled 1 transcript job(s).", self._poll())
+        self.assertEqual(self.job.status, TranscriptJob.STATUS_COMPLETED)
+        self.assertEqual(get_cached_transcript(VIDEO_ID).duration_seconds, 120)
+
+    def test_command_reschedules_unfinished_jobs(self):
+        self._make_due()
+        self._poll()
+        self.assertEqual(self.job.status, TranscriptJob.STATUS_PENDING)
+        self.assertGreater(self.job.next_poll_at, timezone.now())
+        self.assertEqual(self._poll(), "")
+
+    def test_command_times_out_old_jobs(self):
+        self._make_due()
+        TranscriptJob.objects.filter(pk=self.job.pk).update(
+            created_at=timezone.now()
+            - timedelta(seconds=services.SUPADATA_JOB_TIMEOUT_SECONDS + 1)
+        )
+        self._poll()
+        self.assertEqual(self.job.status, TranscriptJob.STATUS_FAILED)
+        self.assertIn("timed out", self.job.error)
+
+
+class SupadataClientRetryTests(FakeSupadataMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.fake_state.errors_remaining = 0
+        self.fake_state.requests = 0
+        self.fake_state.connections.clear()
+        self.metrics = supadata.SupadataMetrics(10)
+        for patcher in (
+            mock.patch.object(supadata, "metrics", self.metrics),
+            mock.patch.object(supadata, "SUPADATA_RETRY_BACKOFF_SECONDS", 0.05),
+            mock.patch.object(supadata, "SUPADATA_RETRY_MAX_BACKOFF_SECONDS", 0.2),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_retries_transient_errors_with_backoff(self):
+        self.fake_state.errors_remaining = 2
+        started = timezone.now()
+        response = supadata.get_client().get_transcript(VIDEO_URL)
+        elapsed = (timezone.now() - started).total_seconds()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.fake_state.requests, 3)
+        # No wait before the first retry, then backoff_factor * 2.
+        self.assertGreaterEqual(elapsed, 0.1)
+        self.assertEqual(self.metrics.snapshot()["retries"], 2)
+        self.assertEqual(self.metrics.snapshot()["errors"], 0)
+
+    def test_gives_up_after_max_retries_and_returns_the_error(self):
+        self.fake_state.errors_remaining = supadata.SUPADATA_MAX_RETRIES + 5
+        response = supadata.get_client().get_transcript(VIDEO_URL)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.fake_state.requests, supadata.SUPADATA_MAX_RETRIES + 1)
+        self.assertEqual(self.metrics.snapshot()["errors"], 1)
+
+    def test_client_errors_are_not_retried(self):
+        response = supadata.get_client().get_job("no-such-job")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.fake_state.requests, 1)
+
+    def test_requests_share_one_connection(self):
+        client = supadata.get_client()
+        self.fake_state.errors_remaining = 1
+        for _ in range(3):
+            client.get_transcript(VIDEO_URL)
+        self.assertEqual(self.fake_state.requests, 4)
+        self.assertEqual(len(self.fake_state.connections), 1)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TranscriptMinutesViewTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(email="minutes@example.com"))
+        transcript = Transcript.from_chunks((i * 20.0, 20.0, f"chunk {i}") for i in range(9))
+        services.cache_transcript(VIDEO_ID, transcript)
+        self.url = reverse("transcript_minutes", args=[VIDEO_ID])
+
+    def _get(self, **headers):
+        with mock.patch.object(
+            views, "get_transcript_minutes", wraps=services.get_transcript_minutes
+        ) as read:
+            response = self.client.get(self.url, headers=headers)
+        return response, read.call_count
+
+    def test_reads_the_cache_once_per_request(self):
+        response, reads = self._get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([minute["minute"] for minute in response.data["minutes"]], [0, 1, 2])
+        self.assertEqual(reads, 1)
+
+        response, reads = self._get(if_none_match=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(reads, 1)
+
+    def test_unknown_video_is_not_found(self):
+        self.url = reverse("transcript_minutes", args=["missingvid00"])
+        response, reads = self._get()
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(reads, 1)
+
+
+class WindowMinutesTests(SimpleTestCase):
+    MINUTES = [{"minute": minute} for minute in (0, 1, 2, 4, 5)]
+
+    def _window(self, start_minute, end_minute):
+        return [bucket["minute"] for bucket in window_minutes(self.MINUTES, start_minute, end_minute)]
+
+    def test_no_bounds_returns_every_bucket(self):
+        self.assertEqual(self._window(None, None), [0, 1, 2, 4, 5])
+
+    def test_start_is_inclusive_and_end_exclusive(self):
+        self.assertEqual(self._window(1, 4), [1, 2])
+        self.assertEqual(self._window(0, 1), [0])
+        self.assertEqual(self._window(2, None), [2, 4, 5])
+        self.assertEqual(self._window(None, 2), [0, 1])
+
+    def test_bounds_between_buckets(self):
+        self.assertEqual(self._window(3, 5), [4])
+        self.assertEqual(self._window(6, None), [])
+
+
+def _json_body(response):
+    return json.loads(b"".join(response.streaming_content))
+
+
+class StreamingJSONResponseTests(SimpleTestCase):
+    DATA = {
+        "title": "Zellatmung – Übersicht ✓",
+        "pages": [f"Page {i} " + "text " * 200 for i in range(100)],
+        "meta": {"total": Decimal("1.5"), "created": datetime(2026, 10, 17, 12, 0), "tags": ["a", None]},
+        "empty": [],
+    }
+
+    def _response(self, **headers):
+        request = RequestFactory().get("/", headers=headers)
+        return StreamingJSONResponse(self.DATA, request)
+
+    def test_plain_body_matches_the_json_renderer(self):
+        response = self._response()
+        chunks = list(response.streaming_content)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(b"".join(chunks), JSONRenderer().render(self.DATA))
+        self.assertNotIn("Content-Encoding", response)
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+
+    def test_gzip_body_decodes_to_the_same_json(self):
+        response = self._response(accept_encoding="br, gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        body = gzip.decompress(b"".join(response.streaming_content))
+        self.assertEqual(json.loads(body), json.loads(JSONRenderer().render(self.DATA)))
+
+    def test_without_a_request_the_body_is_plain_and_does_not_vary(self):
+        response = StreamingJSONResponse(self.DATA)
+        self.assertEqual(b"".join(response.streaming_content), JSONRenderer().render(self.DATA))
+        self.assertNotIn("Vary", response)
+        self.assertNotIn("Content-Encoding", response)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ExtractYouTubeViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(email="youtube@example.com"))
+        transcript = Transcript.from_chunks((i * 20.0, 20.0, f"chunk {i}") for i in range(9))
+        services.cache_transcript(VIDEO_ID, transcript)
+
+    def _extract(self, **data):
+        return self.client.post(
+            reverse("extract_youtube"),
+            {"url": f"https://www.youtube.com/watch?v={VIDEO_ID}", **data},
+            format="json",
+        )
+
+    def test_minutes_are_left_out_by_default(self):
+        response = self._extract()
+        self.assertEqual(response.status_code, 200)
+        body = _json_body(response)
+        self.assertEqual(body["video_id"], VIDEO_ID)
+        self.assertNotIn("minutes", body)
+
+    def test_include_minutes_is_parsed_as_a_boolean(self):
+        for value in (False, "false", "0"):
+            self.assertNotIn("minutes", _json_body(self._extract(include_minutes=value)))
+        for value in (True, "true", "1"):
+            minutes = _json_body(self._extract(include_minutes=value))["minutes"]
+            self.assertEqual([bucket["minute"] for bucket in minutes], [0, 1, 2])
+        self.assertEqual(minutes[0], {"minute": 0, "start": 0, "preview": "chunk 0 chunk 1 chunk 2"})
+
+    def test_invalid_include_minutes_is_rejected(self):
+        self.assertEqual(self._extract(include_minutes="maybe").status_code, 400)
+
+
+def _write_text_pdf(path: str, page_count: int) -> None:
+    writer = PdfWriter()
+    font = DictionaryObject(
+        {
+            NameObject("/Type"): NameObject("/Font"),
+            NameObject("/Subtype"): NameObject("/Type1"),
+            NameObject("/BaseFont"): NameObject("/Helvetica"),
+        }
+    )
+    for n in range(page_count):
+        page = writer.add_blank_page(width=200, height=200)
+        page[NameObject("/Resources")] = DictionaryObject(
+            {NameObject("/Font"): DictionaryObject({NameObject("/F1"): font})}
+        )
+        contents = _stream(f"BT /F1 12 Tf 20 100 Td (Page {n} text) Tj ET".encode())
+        page[NameObject("/Contents")] = writer._add_object(contents)
+    with open(path, "wb") as f:
+        writer.write(f)
+
+
+class PDFExtractionTests(SimpleTestCase):
+    PAGES = pdf.PDF_PARALLEL_MIN_PAGES + 4
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = cls.enterClassContext(TemporaryDirectory())
+        cls.path = f"{cls.directory}/doc.pdf"
+        _write_text_pdf(cls.path, cls.PAGES)
+
+    def tearDown(self):
+        pdf._shutdown_pools()
+
+    def test_parallel_matches_inline_and_reuses_the_pool(self):
+        total, inline = pdf.extract_pages(self.path, 100, processes=1)
+        self.assertEqual(total, self.PAGES)
+        self.assertEqual(inline[3], "Page 3 text")
+
+        self.assertEqual(pdf.extract_pages(self.path, 100, processes=2), (total, inline))
+        self.assertEqual(len(pdf._idle_pools), 1)
+        pool = pdf._idle_pools[0][1]
+        self.assertEqual(pdf.extract_pages(self.path, 100, processes=2), (total, inline))
+        self.assertEqual(pdf._idle_pools, [(2, pool)])
+
+    def _patch_rss(self, *readings):
+        # Each reading is MB over the baseline; once they run out RSS stays put.
+        values = iter([0, *(mb * 1024 * 1024 for mb in readings)])
+        return mock.patch.object(pdf, "resident_memory_bytes", side_effect=lambda: next(values, 0))
+
+    def test_rss_over_budget_drops_the_object_cache_and_carries_on(self):
+        reader = pdf.open_pdf(self.path)
+        over = pdf.PDF_EXTRACTION_RSS_BUDGET_MB + 1
+        cached_at_collect = []
+        with self._patch_rss(over, 0), mock.patch.object(
+            pdf.gc, "collect", side_effect=lambda: cached_at_collect.append(len(reader.resolved_objects))
+        ):
+            pages = pdf._extract_range(reader, 0, 3)
+        self.assertEqual(pages, ["Page 0 text", "Page 1 text", "Page 2 text"])
+        # Collected once, right after the object cache was emptied.
+        self.assertEqual(cached_at_collect, [0])
+        self.assertTrue(reader.resolved_objects)
+
+    def test_rss_still_over_budget_after_clearing_is_rejected(self):
+        reader = pdf.open_pdf(self.path)
+        over = pdf.PDF_EXTRACTION_RSS_BUDGET_MB + 1
+        with self._patch_rss(over, over), self.assertRaises(pdf.PDFMemoryBudgetExceeded):
+            pdf._extract_range(reader, 0, 3)
+        self.assertEqual(reader.resolved_objects, {})
+
+    def test_replaced_file_at_the_same_path_is_reread(self):
+        path = f"{self.directory}/reused.pdf"
+        _write_text_pdf(path, self.PAGES)
+        first = pdf.extract_pages_parallel(path, self.PAGES, processes=2)
+        _write_text_pdf(path, self.PAGES + 2)
+        second = pdf.extract_pages_parallel(path, self.PAGES + 2, processes=2)
+        self.assertEqual(second[: self.PAGES], first)
+        self.assertEqual(len(second), self.PAGES + 2)
+
+    def test_parallel_timeout_discards_the_pool(self):
+        with self.assertRaises(pdf.PDFExtractionTimeout):
+            pdf.extract_pages_parallel(self.path, self.PAGES, processes=2, timeout=0)
+        self.assertEqual(pdf._idle_pools, [])
+
+    def test_timeout_leaves_concurrent_extractions_running(self):
+        path = f"{self.directory}/long.pdf"
+        _write_text_pdf(path, 400)
+        checkout = pdf._checkout_pool
+        checked_out = threading.Event()
+
+        def checkout_and_signal(processes):
+            pool = checkout(processes)
+            checked_out.set()
+            return pool
+
+        results = []
+        with mock.patch.object(pdf, "_checkout_pool", side_effect=checkout_and_signal):
+            other = threading.Thread(
+                target=lambda: results.append(
+                    pdf.extract_pages_parallel(path, 400, processes=2, timeout=30)
+                )
+            )
+            other.start()
+            checked_out.wait(10)
+            with self.assertRaises(pdf.PDFExtractionTimeout):
+                pdf.extract_pages_parallel(self.path, self.PAGES, processes=2, timeout=0)
+            other.join(30)
+
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0][399], "Page 399 text")
+        self.assertEqual(len(pdf._idle_pools), 1)
+
+    def test_inline_extraction_is_bounded(self):
+        reader = pdf.open_pdf(self.path)
+        with self.assertRaises(pdf.PDFExtractionTimeout):
+            pdf._extract_range(reader, 0, self.PAGES, deadline=time.monotonic() - 1)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ExtractPDFViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with TemporaryDirectory() as tmp:
+            path = f"{tmp}/doc.pdf"
+            _write_text_pdf(path, 3)
+            with open(path, "rb") as f:
+                cls.content = f.read()
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(email="pdf@example.com"))
+
+    def _extract(self):
+        upload = SimpleUploadedFile("doc.pdf", self.content, content_type="application/pdf")
+        with mock.patch.object(
+            views, "is_ratelimited", wraps=views.is_ratelimited
+        ) as ratelimit, mock.patch.object(
+            services, "extract_pages", wraps=services.extract_pages
+        ) as extract:
+            response = self.client.post(reverse("extract_pdf"), {"pdf": upload}, format="multipart")
+        self.assertEqual(response.status_code, 200)
+        return _json_body(response), ratelimit.call_count, extract.call_count
+
+    def test_cached_extraction_skips_the_ratelimit_and_parsing(self):
+        body, ratelimits, extractions = self._extract()
+        self.assertEqual(body["pages"], ["Page 0 text", "Page 1 text", "Page 2 text"])
+        self.assertEqual((ratelimits, extractions), (1, 1))
+
+        cached, ratelimits, extractions = self._extract()
+        self.assertEqual(cached, body)
+        self.assertEqual((ratelimits, extractions), (0, 0))
+
+    def test_memory_budget_error_response(self):
+        over = (pdf.PDF_EXTRACTION_RSS_BUDGET_MB + 1) * 1024 * 1024
+        readings = iter([0])
+        upload = SimpleUploadedFile("doc.pdf", self.content, content_type="application/pdf")
+        with mock.patch.object(pdf, "resident_memory_bytes", side_effect=lambda: next(readings, over)):
+            response = self.client.post(reverse("extract_pdf"), {"pdf": upload}, format="multipart")
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.data["detail"], services.PDFTooLargeError.default_detail)
+
+    def test_extractor_version_invalidates_the_cache(self):
+        self._extract()
+        with mock.patch.object(services, "PDF_EXTRACTOR_VERSION", services.PDF_EXTRACTOR_VERSION + 1):
+            _, ratelimits, extractions = self._extract()
+        self.assertEqual((ratelimits, extractions), (1, 1))
+
+
+def _read_events(response) -> list[tuple[str, dict]]:
+    body = b"".join(response.streaming_content).decode("utf-8")
+    events = []
+    for block in body.strip().split("\n\n"):
+        event, data = block.split("\n")
+        events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return events
+
+
+class GenerateFlashcardsStreamViewTests(FakeAnthropicMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.user = User.objects.create_user(email="stream@example.com")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _post(self, data=None, **headers):
+        return self.client.post(
+            reverse("generate_flashcards_stream"),
+            data or {"text": SAMPLE_TEXT},
+            format="json",
+            headers={"Accept": "text/event-stream", **headers},
+        )
+
+    def test_streams_cards_then_replays_them_from_the_cache(self):
+        response = self._post()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        events = _read_events(response)
+        self.assertEqual(events[-1], ("done", {"count": 12, "input_tokens_saved": 0}))
+        cards = [data for event, data in events if event == "card"]
+        self.assertEqual(len(cards), 12)
+
+        with mock.patch.object(views, "stream_flashcards", side_effect=AssertionError):
+            replayed = _read_events(self._post())
+        self.assertEqual(replayed, events)
+
+    def test_generation_failure_ends_the_stream_with_an_error_event(self):
+        with mock.patch.object(views, "stream_flashcards", side_effect=FlashcardGenerationError):
+            events = _read_events(self._post())
+        self.assertEqual(events, [("error", {"detail": FlashcardGenerationError.default_detail})])
+
+    def test_errors_before_the_stream_are_json(self):
+        response = self._post({"text": "too short"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertIn("text", response.json())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class GenerationDocumentTests(TestCase):
+    PAGES = [f"Page {n}: " + "the cell membrane controls transport. " * 3 for n in range(1, 6)]
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="documents@example.com")
+        self.other = User.objects.create_user(email="other@example.com")
+        self.pdf_id = store_pdf_document(self.user, "abc123", self.PAGES)
+        self.transcript = Transcript.from_chunks(
+            (i * 60.0, 60.0, f"Minute {i} explains how enzymes lower activation energy.")
+            for i in range(10)
+        )
+        self.video_id = store_transcript_document(self.user, VIDEO_ID, self.transcript)
+
+    def _resolve(self, user=None, **data):
+        return resolve_generation_input(user or self.user, data)
+
+    def test_storing_the_same_source_again_reuses_the_document(self):
+        with mock.patch.object(Transcript, "to_columns") as to_columns:
+            self.assertEqual(
+                store_transcript_document(self.user, VIDEO_ID, self.transcript), self.video_id
+            )
+        to_columns.assert_not_called()
+        self.assertEqual(store_pdf_document(self.user, "abc123", []), self.pdf_id)
+        self.assertNotEqual(store_pdf_document(self.user, "def456", self.PAGES), self.pdf_id)
+        self.assertNotEqual(store_pdf_document(self.other, "abc123", self.PAGES), self.pdf_id)
+
+    def test_pdf_page_ranges(self):
+        kind, text = self._resolve(document_id=self.pdf_id, page_start=2, page_end=3)
+        self.assertEqual(kind, "pdf")
+        self.assertEqual(text, PAGE_SEPARATOR.join(self.PAGES[1:3]).strip())
+        self.assertEqual(
+            self._resolve(document_id=self.pdf_id)[1], PAGE_SEPARATOR.join(self.PAGES).strip()
+        )
+        self.assertEqual(
+            self._resolve(document_id=self.pdf_id, page_start=5, page_end=99)[1],
+            self.PAGES[4].strip(),
+        )
+        for bounds in ({"page_start": 4, "page_end": 2}, {"page_start": 6}):
+            with self.assertRaises(ValidationError):
+                self._resolve(document_id=self.pdf_id, **bounds)
+
+    def test_transcript_time_ranges(self):
+        kind, text = self._resolve(document_id=self.video_id, start_seconds=120, end_seconds=240)
+        self.assertEqual(kind, "youtube")
+        self.assertEqual(text, self.transcript.text_between(120, 240))
+        self.assertTrue(text.startswith("Minute 2 ") and "Minute 4" not in text)
+        self.assertEqual(self._resolve(document_id=self.video_id)[1], self.transcript.text)
+        with self.assertRaises(ValidationError):
+            self._resolve(document_id=self.video_id, start_seconds=240, end_seconds=120)
+        with self.assertRaises(ValidationError):
+            self._resolve(document_id=self.video_id, start_seconds=2000)
+
+    def test_input_type_comes_from_the_document(self):
+        kind, _ = self._resolve(document_id=self.pdf_id, input_type="text")
+        self.assertEqual(kind, "pdf")
+        with self.assertRaises(ValidationError):
+            load_transcript_document(self.user, self.pdf_id)
+        self.assertEqual(self._resolve(input_type="text", text=SAMPLE_TEXT), ("text", SAMPLE_TEXT))
+
+    def test_other_users_documents_are_not_found(self):
+        for document_id in (self.pdf_id, self.video_id, "00000000-0000-0000-0000-000000000000"):
+            with self.assertRaises(NotFound):
+                self._resolve(self.other, document_id=document_id)
+
+
+class ConcurrencySlotTests(SimpleTestCase):
+    def test_queued_call_fails_as_busy_after_the_queue_timeout(self):
+        with mock.patch.object(llm, "_slots", threading.BoundedSemaphore(1)) as slots:
+            slots.acquire()
+            with mock.patch.object(llm, "_queue_timeout", 0.01):
+                with self.assertRaises(llm.LLMUnavailableError):
+                    with llm._concurrency_slot():
+                        pass
+
+    def test_workers_wait_for_a_slot_instead(self):
+        with (
+            mock.patch.object(llm, "_slots", threading.BoundedSemaphore(1)) as slots,
+            mock.patch.object(llm, "_queue_timeout", 0.01),
+        ):
+            llm.wait_for_slots_indefinitely()
+            slots.acquire()
+            threading.Timer(0.1, slots.release).start()
+            with llm._concurrency_slot() as queued_seconds:
+                self.assertGreaterEqual(queued_seconds, 0.05)
+
+
+class GenerationJobTests(FakeAnthropicMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(email="jobs@example.com")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _credits_used(self):
+        self.user.profile.refresh_from_db()
+        return self.user.profile.monthly_credits_used
+
+    def test_background_request_queues_a_job_its_owner_can_poll(self):
+        response = self.client.post(
+            reverse("generate_flashcards"), {"text": SAMPLE_TEXT, "background": True}, format="json"
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data["status"], GenerationJob.STATUS_PENDING)
+        job = GenerationJob.objects.get(pk=response.data["id"])
+        self.assertEqual(job.credits_charged, 1)
+        self.assertEqual(self._credits_used(), 1)
+
+        url = reverse("generation_job_detail", args=[job.id])
+        self.assertEqual(self.client.get(url).data["id"], str(job.id))
+        stranger = APIClient()
+        stranger.force_authenticate(User.objects.create_user(email="stranger@example.com"))
+        self.assertEqual(stranger.get(url).status_code, 404)
+
+    def test_claim_takes_the_oldest_pending_direct_jobs(self):
+        jobs = [
+            enqueue_generation_job(self.user, "text", SAMPLE_TEXT, deck=None) for _ in range(3)
+        ]
+        enqueue_batch_generation_job(self.user, "text", SAMPLE_TEXT, deck=None)
+
+        claimed = claim_generation_jobs(2)
+        self.assertEqual([job.id for job in claimed], [job.id for job in jobs[:2]])
+        self.assertTrue(all(job.status == GenerationJob.STATUS_RUNNING for job in claimed))
+        self.assertEqual([job.id for job in claim_generation_jobs(5)], [jobs[2].id])
+        self.assertEqual(claim_generation_jobs(5), [])
+
+    def test_stale_running_jobs_are_requeued(self):
+        job = enqueue_generation_job(self.user, "text", SAMPLE_TEXT, deck=None)
+        claim_generation_jobs(1)
+        self.assertEqual(requeue_stale_generation_jobs(), 0)
+        GenerationJob.objects.filter(pk=job.pk).update(
+            started_at=timezone.now() - timedelta(seconds=GENERATION_JOB_STALE_SECONDS + 1)
+        )
+        self.assertEqual(requeue_stale_generation_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, GenerationJob.STATUS_PENDING)
+
+    def test_successful_job_keeps_its_credits(self):
+        self.user.profile.monthly_credits_used = 1
+        self.user.profile.save()
+        job = enqueue_generation_job(self.user, "text", SAMPLE_TEXT, deck=None, credits_charged=1)
+        run_generation_job(claim_generation_jobs(1)[0])
+        job.refresh_from_db()
+        self.assertEqual(job.status, GenerationJob.STATUS_COMPLETED)
+        self.assertEqual(len(job.result), 12)
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(self._credits_used(), 1)
+
+    def test_failed_job_is_refunded(self):
+        self.user.profile.monthly_credits_used = 3
+        self.user.profile.save()
+        job = enqueue_generation_job(self.user, "text", SAMPLE_TEXT, deck=None, credits_charged=2)
+        with mock.patch.object(services, "generate_flashcards", side_effect=FlashcardGenerationError):
+            run_generation_job(claim_generation_jobs(1)[0])
+        job.refresh_from_db()
+        self.assertEqual(job.status, GenerationJob.STATUS_FAILED)
+        self.assertEqual(job.error, FlashcardGenerationError.default_detail)
+        self.assertEqual(self._credits_used(), 1)
+
+
+def _pages_text(pages):
+    # Distinct sentences, so compaction leaves every page (and chunk) intact.
+    return PAGE_SEPARATOR.join(
+        " ".join(f"Page {p} fact {i} is about oxidative phosphorylation." for i in range(500))
+        for p in range(pages)
+    )
+
+
+def _fail_page_zero(chunk):
+    if chunk.startswith("Page 0 "):
+        raise FlashcardGenerationError()
+    return generate_flashcards(chunk)
+
+
+class FailedChunkTests(FakeAnthropicMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.user = User.objects.create_user(email="chunks@example.com")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _credits_used(self):
+        self.user.profile.refresh_from_db()
+        return self.user.profile.monthly_credits_used
+
+    def test_refund_is_the_failed_share_rounded_down(self):
+        chunks = ["a" * 100, "b" * 100, "c" * 200]
+        self.assertEqual(failed_chunks_refund(4, chunks, []), 0)
+        self.assertEqual(failed_chunks_refund(4, chunks, chunks[:1]), 1)
+        self.assertEqual(failed_chunks_refund(4, chunks, chunks[2:]), 2)
+        self.assertEqual(failed_chunks_refund(3, chunks, chunks[:1]), 0)
+
+    def test_sync_request_reports_and_refunds_failed_chunks(self):
+        text = _pages_text(4)
+        self.assertEqual(len(split_text_into_chunks(text)), 4)
+        self.assertEqual(credit_units(text), 3)
+        with mock.patch.object(services, "generate_flashcards", side_effect=_fail_page_zero):
+            response = self.client.post(reverse("generate_flashcards"), {"text": text}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Failed-Chunks"], "1")
+        self.assertGreater(len(response.data), 0)
+        # One of four equal chunks failed: a quarter of 3 credits rounds down to 0.
+        self.assertEqual(self._credits_used(), 3)
+
+    def test_sync_request_past_the_threshold_fails_and_refunds_everything(self):
+        def keep_last_page(chunk):
+            if not chunk.startswith("Page 3 "):
+                raise FlashcardGenerationError()
+            return generate_flashcards(chunk)
+
+        with mock.patch.object(services, "generate_flashcards", side_effect=keep_last_page):
+            response = self.client.post(
+                reverse("generate_flashcards"), {"text": _pages_text(4)}, format="json"
+            )
+        self.assertEqual(response.status_code, 502)
+        self.assertEqual(self._credits_used(), 0)
+
+    def test_job_records_failed_chunks_and_keeps_only_the_rest_of_the_charge(self):
+        self.user.profile.monthly_credits_used = 5
+        self.user.profile.save()
+        job = enqueue_generation_job(self.user, "text", _pages_text(2), deck=None, credits_charged=4)
+        with mock.patch.object(services, "generate_flashcards", side_effect=_fail_page_zero):
+            run_generation_job(claim_generation_jobs(1)[0])
+        job.refresh_from_db()
+        self.assertEqual(job.status, GenerationJob.STATUS_COMPLETED)
+        self.assertEqual(job.failed_chunks, 1)
+        self.assertEqual(job.credits_charged, 2)
+        self.assertEqual(self._credits_used(), 3)
+        response = self.client.get(reverse("generation_job_detail", args=[job.id]))
+        self.assertEqual(response.data["failed_chunks"], 1)
+
+
+class GenerationCacheTests(FakeAnthropicMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.user = User.objects.create_user(email="cache@example.com")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _generate(self, text=SAMPLE_TEXT):
+        with mock.patch.object(
+            services, "generate_flashcards", wraps=services.generate_flashcards
+        ) as generate:
+            response = self.client.post(reverse("generate_flashcards"), {"text": text}, format="json")
+        self.assertEqual(response.status_code, 200)
+        return response.data, generate.call_count
+
+    def _stats(self):
+        admin = APIClient()
+        admin.force_authenticate(User.objects.create_superuser(email="admin@example.com"))
+        return admin.get(reverse("generation_cache_stats")).data
+
+    def test_repeat_request_is_served_from_the_cache(self):
+        cards, calls = self._generate()
+        self.assertEqual((len(cards), calls), (12, 1))
+        cached, calls = self._generate()
+        self.assertEqual((cached, calls), (cards, 0))
+        # Whitespace differences don't change the key.
+        _, calls = self._generate(SAMPLE_TEXT.replace(" ", "  \n"))
+        self.assertEqual(calls, 0)
+
+        stats = self._stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["hit_rate"]), (2, 1, 0.6667))
+
+    def test_stats_start_empty(self):
+        stats = self._stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["hit_rate"]), (0, 0, 0.0))
+        self.assertEqual(stats["ttl_seconds"], services.GENERATION_CACHE_TTL_SECONDS)
+
+    def test_key_changes_with_anything_that_changes_the_output(self):
+        key = services.generation_cache_key(SAMPLE_TEXT)
+        self.assertEqual(services.generation_cache_key(f"  {SAMPLE_TEXT}\n"), key)
+        self.assertNotEqual(services.generation_cache_key(SAMPLE_TEXT + " More."), key)
+        with override_settings(CLAUDE_MODEL="another-model"):
+            self.assertNotEqual(services.generation_cache_key(SAMPLE_TEXT), key)
+        with mock.patch.object(services, "FLASHCARD_SYSTEM_PROMPT", "A different prompt."):
+            self.assertNotEqual(services.generation_cache_key(SAMPLE_TEXT), key)
+        with mock.patch.object(services, "MAX_TOKENS", services.MAX_TOKENS + 1):
+            self.assertNotEqual(services.generation_cache_key(SAMPLE_TEXT), key)
+        self.assertEqual(services.generation_cache_key(SAMPLE_TEXT), key)
+
+    def test_empty_results_are_not_cached(self):
+        services.cache_flashcards(SAMPLE_TEXT, [])
+        self.assertIsNone(services.get_cached_flashcards(SAMPLE_TEXT))
+        services.cache_flashcards(SAMPLE_TEXT, CARDS)
+        self.assertEqual(services.get_cached_flashcards(SAMPLE_TEXT), CARDS)
+
+
+class GenerateEstimateTests(FakeAnthropicMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.user = User.objects.create_user(email="estimate@example.com")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        patcher = mock.patch.object(llm, "get_history", return_value=[])
+        self.history = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _estimate(self, text):
+        with mock.patch.object(llm, "create_message") as create, mock.patch.object(
+            llm, "stream_message"
+        ) as stream:
+            response = self.client.post(reverse("generate_estimate"), {"text": text}, format="json")
+        create.assert_not_called()
+        stream.assert_not_called()
+        return response
+
+    def _expected_output(self, chunks):
+        tokens = [services._count_generation_tokens(chunk)[0] for chunk in chunks]
+        outputs = [round(count * services.ESTIMATE_DEFAULT_OUTPUT_RATIO) for count in tokens]
+        return sum(tokens), outputs
+
+    def test_single_chunk_estimate(self):
+        response = self._estimate(SAMPLE_TEXT)
+        self.assertEqual(response.status_code, 200)
+        input_tokens, outputs = self._expected_output([SAMPLE_TEXT])
+        latency = services.ESTIMATE_DEFAULT_CALL_SECONDS + (
+            outputs[0] * services.ESTIMATE_DEFAULT_SECONDS_PER_OUTPUT_TOKEN
+        )
+        self.assertEqual(response.data["input_tokens"], input_tokens)
+        self.assertTrue(response.data["input_tokens_exact"])
+        self.assertEqual(response.data["chunks"], 1)
+        self.assertEqual(response.data["cached_chunks"], 0)
+        self.assertEqual(response.data["estimated_output_tokens"], outputs[0])
+        self.assertEqual(response.data["estimated_latency_seconds"], round(latency, 1))
+        self.assertEqual(response.data["latency_samples"], 0)
+        self.assertEqual(response.data["credit_cost"], 1)
+        self.assertEqual(response.data["credits_remaining"], 10)
+        self.assertTrue(response.data["within_credit_limit"])
+        # Estimating is free.
+        self.user.profile.refresh_from_db()
+        self.assertEqual(self.user.profile.monthly_credits_used, 0)
+
+    def test_cached_chunks_add_no_output(self):
+        text = _pages_text(4)
+        chunks = split_text_into_chunks(text)
+        services.cache_flashcards(chunks[0], CARDS)
+        response = self._estimate(text)
+        input_tokens, outputs = self._expected_output(chunks)
+        self.assertEqual(response.data["chunks"], 4)
+        self.assertEqual(response.data["cached_chunks"], 1)
+        self.assertEqual(response.data["input_tokens"], input_tokens)
+        self.assertEqual(response.data["estimated_output_tokens"], sum(outputs[1:]))
+        self.assertEqual(response.data["credit_cost"], credit_units(text))
+
+    def test_over_the_credit_limit(self):
+        self.user.profile.monthly_credits_used = 10
+        self.user.profile.save()
+        response = self._estimate(SAMPLE_TEXT)
+        self.assertEqual(response.data["credits_remaining"], 0)
+        self.assertFalse(response.data["within_credit_limit"])
+
+    def test_falls_back_to_a_character_count(self):
+        with mock.patch.object(llm, "count_tokens", side_effect=llm.LLMUnavailableError), self.assertLogs(
+            "apps.ai.services", "WARNING"
+        ):
+            response = self._estimate(SAMPLE_TEXT)
+        self.assertFalse(response.data["input_tokens_exact"])
+        self.assertEqual(
+            response.data["input_tokens"],
+            (len(services.FLASHCARD_SYSTEM_PROMPT) + len(SAMPLE_TEXT)) // services.CHARS_PER_TOKEN,
+        )
+
+    def test_latency_model_fits_the_history(self):
+        self.history.return_value = [
+            (1000, output, 1.5 + output * 0.01) for output in range(200, 300, 10)
+        ]
+        ratio, per_call, per_token, samples = services._latency_model("model")
+        self.assertAlmostEqual(ratio, 0.245)
+        self.assertAlmostEqual(per_call, 1.5)
+        self.assertAlmostEqual(per_token, 0.01)
+        self.assertEqual(samples, 10)
+
+    def test_oversize_input_is_rejected(self):
+        response = self._estimate("a" * (services.GENERATION_MAX_INPUT_CHARS + 1))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("text", response.data)
+
+
+class GenerationWorkerTests(FakeAnthropicMixin, TransactionTestCase):
+    def test_default_concurrency_fits_the_llm_slots(self):
+        self.assertLessEqual(
+            services.GENERATION_WORKER_CONCURRENCY * services.GENERATION_MAX_WORKERS,
+            llm.LLM_MAX_CONCURRENCY,
+        )
+
+    def test_once_drains_the_queue_and_waits_for_llm_slots(self):
+        user = User.objects.create_user(email="worker@example.com")
+        jobs = [enqueue_generation_job(user, "text", SAMPLE_TEXT, deck=None) for _ in range(3)]
+        # One job at a time: SQLite's shared in-memory test database can't
+        # take the claim query while a job thread is writing.
+        with mock.patch.object(llm, "_queue_timeout", llm.LLM_QUEUE_TIMEOUT_SECONDS):
+            call_command("run_generation_worker", "--once", "--concurrency", "1", stdout=StringIO())
+            self.assertIsNone(llm._queue_timeout)
+
+        for job in jobs:
+            job.refresh_from_db()
+            self.assertEqual(job.status, GenerationJob.STATUS_COMPLETED)
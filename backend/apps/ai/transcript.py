@@ -0,0 +1,142 @@
+"""
+Column-oriented transcript storage.
+
+A Transcript keeps chunk start times and durations in parallel
+array('d') columns over a single normalized text buffer, with
+array('q') character offsets marking where each chunk starts in it. A
+five-hour video has tens of thousands of chunks; as columns that is a
+few hundred kilobytes instead of one Python object per chunk, and time
+ranges and character limits resolve by bisection instead of walking
+every chunk.
+
+This module has no Django imports, like normalization.py.
+"""
+
+import struct
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterable
+
+from apps.ai.normalization import normalize_transcript
+
+_SEPARATOR = " "
+_HEADER = struct.Struct("<Q")
+
+
+class Transcript:
+    __slots__ = ("starts", "durations", "offsets", "text")
+
+    def __init__(self, starts: array, durations: array, offsets: array, text: str):
+        # offsets has one more entry than there are chunks: chunk i spans
+        # text[offsets[i] : offsets[i + 1] - 1], the -1 dropping the
+        # separator that follows it.
+        self.starts = starts
+        self.durations = durations
+        self.offsets = offsets
+        self.text = text
+
+    @classmethod
+    def from_chunks(cls, chunks: Iterable[tuple[float, float, str]]) -> "Transcript":
+        """
+        Builds a transcript from (start, duration, text) tuples in seconds.
+        Each chunk's text is normalized; chunks left empty are dropped.
+        """
+        starts = array("d")
+        durations = array("d")
+        offsets = array("q")
+        texts = []
+        position = 0
+        for start, duration, text in sorted(chunks, key=lambda chunk: chunk[0]):
+            text = normalize_transcript(text)
+            if not text:
+                continue
+            starts.append(start)
+            durations.append(duration)
+            offsets.append(position)
+            texts.append(text)
+            position += len(text) + len(_SEPARATOR)
+        offsets.append(position)
+        return cls(starts, durations, offsets, _SEPARATOR.join(texts))
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    @property
+    def duration_seconds(self) -> float:
+        return self.starts[-1] + self.durations[-1] if self.starts else 0.0
+
+    def chunk_range(self, start_seconds: float, end_seconds: float) -> tuple[int, int]:
+        """Indices [first, stop) of the chunks starting in [start_seconds, end_seconds)."""
+        first = bisect_left(self.starts, start_seconds)
+        return first, max(first, bisect_left(self.starts, end_seconds, first))
+
+    def range_text(self, first: int, stop: int) -> str:
+        if first >= stop:
+            return ""
+        return self.text[self.offsets[first] : self.offsets[stop] - len(_SEPARATOR)]
+
+    def text_between(self, start_seconds: float, end_seconds: float) -> str:
+        return self.range_text(*self.chunk_range(start_seconds, end_seconds))
+
+    def partition(self, max_chars: int) -> list[tuple[int, int]]:
+        """
+        Splits the whole transcript into consecutive [first, stop) chunk
+        ranges of at most `max_chars` characters each. A single chunk longer
+        than that gets a range of its own.
+        """
+        ranges = []
+        first = 0
+        while first < len(self):
+            # [first, stop) spans offsets[stop] - offsets[first] - 1 characters.
+            limit = self.offsets[first] + max_chars + len(_SEPARATOR)
+            stop = max(first + 1, bisect_right(self.offsets, limit, first + 1) - 1)
+            ranges.append((first, stop))
+            first = stop
+        return ranges
+
+    def chunk_at_char(self, position: int) -> int:
+        """Index of the chunk that contains character `position` of the text."""
+        return bisect_right(self.offsets, position) - 1
+
+    def to_columns(self) -> dict:
+        """Plain lists for JSON; the inverse of from_columns."""
+        return {
+            "starts": self.starts.tolist(),
+            "durations": self.durations.tolist(),
+            "offsets": self.offsets.tolist(),
+            "text": self.text,
+        }
+
+    @classmethod
+    def from_columns(cls, columns: dict) -> "Transcript":
+        return cls(
+            array("d", columns["starts"]),
+            array("d", columns["durations"]),
+            array("q", columns["offsets"]),
+            columns["text"],
+        )
+
+    def to_bytes(self) -> bytes:
+        """Compact compressed encoding for the cache; the inverse of from_bytes."""
+        return zlib.compress(
+            _HEADER.pack(len(self))
+            + self.starts.tobytes()
+            + self.durations.tobytes()
+            + self.offsets.tobytes()
+            + self.text.encode("utf-8")
+        )
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Transcript":
+        data = memoryview(zlib.decompress(data))
+        (count,) = _HEADER.unpack_from(data)
+        position = _HEADER.size
+        columns = []
+        for typecode, length in (("d", count), ("d", count), ("q", count + 1)):
+            column = array(typecode)
+            end = position + length * column.itemsize
+            column.frombytes(data[position:end])
+            columns.append(column)
+            position = end
+        return cls(*columns, str(data[position:], "utf-8"))
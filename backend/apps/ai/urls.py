@@ -1,9 +1,41 @@
 from django.urls import path
 
-from apps.ai.views import ExtractPDFView, ExtractYouTubeView, GenerateFlashcardsView
+from apps.ai.views import (
+    ExtractPDFView,
+    ExtractYouTubeView,
+    GenerateBatchView,
+    GenerateEstimateView,
+    GenerateFlashcardsStreamView,
+    GenerateFlashcardsView,
+    GenerateVideoView,
+    GenerationCacheStatsView,
+    GenerationJobDetailView,
+    LLMMetricsView,
+    SupadataMetricsView,
+    TranscriptMinutesView,
+    TranscriptJobDetailView,
+)
 
 urlpatterns = [
     path("generate/", GenerateFlashcardsView.as_view(), name="generate_flashcards"),
+    path("generate/stream/", GenerateFlashcardsStreamView.as_view(), name="generate_flashcards_stream"),
+    path("generate/video/", GenerateVideoView.as_view(), name="generate_video"),
+    path("generate/estimate/", GenerateEstimateView.as_view(), name="generate_estimate"),
+    path("generate/batch/", GenerateBatchView.as_view(), name="generate_batch"),
+    path("generate/jobs/<uuid:pk>/", GenerationJobDetailView.as_view(), name="generation_job_detail"),
+    path("generate/cache/stats/", GenerationCacheStatsView.as_view(), name="generation_cache_stats"),
+    path("generate/metrics/", LLMMetricsView.as_view(), name="llm_metrics"),
     path("extract/pdf/", ExtractPDFView.as_view(), name="extract_pdf"),
     path("extract/youtube/", ExtractYouTubeView.as_view(), name="extract_youtube"),
+    path("extract/youtube/metrics/", SupadataMetricsView.as_view(), name="supadata_metrics"),
+    path(
+        "extract/youtube/<str:video_id>/minutes/",
+        TranscriptMinutesView.as_view(),
+        name="transcript_minutes",
+    ),
+    path(
+        "extract/youtube/jobs/<uuid:pk>/",
+        TranscriptJobDetailView.as_view(),
+        name="transcript_job_detail",
+    ),
 ]
@@ -1,25 +1,88 @@
+import json
 import logging
 
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
 from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from django_ratelimit.core import is_ratelimited
 from django_ratelimit.decorators import ratelimit
-from rest_framework import status
-from rest_framework.exceptions import ValidationError
-from rest_framework.permissions import IsAuthenticated
+from django_ratelimit.exceptions import Ratelimited
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException, PermissionDenied, ValidationError
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from youtube_transcript_api._errors import NoTranscriptFound, RequestBlocked, TranscriptsDisabled
 
-from apps.ai.serializers import GenerateSerializer
+from apps.ai import llm, supadata
+from apps.ai.documents import (
+    load_transcript_document,
+    resolve_generation_input,
+    store_pdf_document,
+    store_transcript_document,
+)
+from apps.ai.models import GenerationJob, TranscriptJob
+from apps.ai.serializers import (
+    GenerateBatchSerializer,
+    GenerateSerializer,
+    GenerateVideoSerializer,
+    GenerationJobSerializer,
+    TranscriptJobSerializer,
+)
 from apps.ai.services import (
+    NO_TRANSCRIPT_MESSAGE,
     PDF_MAX_FILE_SIZE_MB,
+    TRANSCRIPTS_DISABLED_MESSAGE,
+    FlashcardGenerationError,
+    cache_flashcards,
+    cache_pdf_extraction,
     check_and_deduct_credits,
+    compact_generation_input,
+    credit_units,
+    enqueue_batch_generation_job,
+    enqueue_generation_job,
+    enqueue_video_generation_job,
+    estimate_generation,
     extract_pdf_text,
-    extract_youtube_transcript,
-    generate_flashcards,
+    extract_video_id,
+    failed_chunks_refund,
+    flashcard_front_key,
+    generate_flashcards_for_chunks,
+    get_cached_flashcards,
+    get_cached_pdf_extraction,
+    get_cached_transcript,
+    get_generation_cache_stats,
+    get_transcript_minutes,
+    pdf_content_hash,
+    plan_video_segments,
+    process_youtube_transcript,
+    refund_credits,
+    request_youtube_transcript,
+    split_text_into_chunks,
+    stream_flashcards,
+    window_minutes,
 )
+from apps.decks.models import Deck
+from apps.decks.services import (
+    MAX_DECKS_PER_USER,
+    create_deck,
+    drop_near_duplicates,
+    get_deck_simhash_index,
+    get_user_deck,
+)
+from apps.users.models import UserProfile
+from distill.responses import StreamingJSONResponse
 
 logger = logging.getLogger(__name__)
 
+PDF_EXTRACT_RATE = "20/h"
+YOUTUBE_EXTRACT_RATE = "10/h"
+TRANSCRIPT_MINUTES_MAX_AGE_SECONDS = 60 * 60
+
 
 class GenerateFlashcardsView(APIView):
     permission_classes = [IsAuthenticated]
@@ -27,18 +90,241 @@ class GenerateFlashcardsView(APIView):
     def post(self, request):
         serializer = GenerateSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
+        deck_id = serializer.validated_data.get("deck_id")
+        deck = get_user_deck(request.user, deck_id) if deck_id else None
+        input_type, text = resolve_generation_input(request.user, serializer.validated_data)
+        text, tokens_saved = compact_generation_input(text, input_type)
+        chunks = split_text_into_chunks(text)
+        profile = request.user.profile
+        credits = check_and_deduct_credits(profile, input_type, units=credit_units(text))
+
+        if serializer.validated_data["background"]:
+            job = enqueue_generation_job(
+                request.user, input_type, text, deck=deck, credits_charged=credits
+            )
+            response = Response(
+                GenerationJobSerializer(job).data,
+                status=status.HTTP_202_ACCEPTED,
+            )
+        else:
+            charged_at = timezone.now()
+            try:
+                cards_data, failed = generate_flashcards_for_chunks(chunks)
+            except Exception:
+                refund_credits(request.user.pk, charged_at, credits)
+                raise
+            # Chunks that failed only lose their own cards, and the part of
+            # the charge that paid for them.
+            refund_credits(
+                request.user.pk, charged_at, failed_chunks_refund(credits, chunks, failed)
+            )
+            if deck is not None:
+                cards_data = drop_near_duplicates(deck, cards_data)
+            response = Response(cards_data)
+            response["X-Failed-Chunks"] = str(len(failed))
+
+        response["X-Input-Tokens-Saved"] = str(tokens_saved)
+        return response
+
+
+class GenerateVideoView(APIView):
+    """
+    Queues card generation for an entire long YouTube video: the transcript
+    is partitioned into segments that each fit a single-range generation,
+    and a background job generates all of them concurrently. Answers 202
+    with the job; its result holds the per-segment summary and the cards in
+    time order, tagged with their segment's timestamps. Costs the same
+    credits as generating every segment separately, refunded if the job
+    fails.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = GenerateVideoSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        deck_id = serializer.validated_data.get("deck_id")
+        deck = get_user_deck(request.user, deck_id) if deck_id else None
+        transcript = load_transcript_document(
+            request.user, serializer.validated_data["document_id"]
+        )
+        segments, tokens_saved = plan_video_segments(transcript)
+        credits = check_and_deduct_credits(
+            request.user.profile,
+            "youtube",
+            units=sum(segment["credit_units"] for segment in segments),
+        )
+        job = enqueue_video_generation_job(
+            request.user, segments, deck=deck, credits_charged=credits
+        )
+
+        response = Response(GenerationJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+        response["X-Input-Tokens-Saved"] = str(tokens_saved)
+        return response
+
+
+class GenerateEstimateView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @method_decorator(ratelimit(key='user', rate='120/h', method='POST', block=True))
+    def post(self, request):
+        serializer = GenerateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        input_type, text = resolve_generation_input(request.user, serializer.validated_data)
+        text, tokens_saved = compact_generation_input(text, input_type)
+        estimate = estimate_generation(request.user.profile, input_type, text)
+        estimate["input_tokens_saved"] = tokens_saved
+        return Response(estimate)
+
+
+class GenerateBatchView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = GenerateBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        profile = request.user.profile
+        if profile.tier != UserProfile.TIER_PRO:
+            raise PermissionDenied("Batch generation is available on the Pro plan.")
+
+        items = serializer.validated_data["items"]
+        new_decks = sum(1 for item in items if not item.get("deck_id"))
+        if Deck.objects.filter(user=request.user).count() + new_decks > MAX_DECKS_PER_USER:
+            raise PermissionDenied(f"You can have at most {MAX_DECKS_PER_USER} decks.")
+
+        jobs = []
+        # All-or-nothing: running out of credits part-way rolls back the
+        # decks and jobs created for the earlier items.
+        with transaction.atomic():
+            for item in items:
+                if item.get("deck_id"):
+                    deck = get_user_deck(request.user, item["deck_id"])
+                else:
+                    deck = create_deck(request.user, {"title": item["deck_title"]})
+                text, _ = compact_generation_input(item["text"], item["input_type"])
+                credits = check_and_deduct_credits(
+                    profile, item["input_type"], units=credit_units(text)
+                )
+                jobs.append(
+                    enqueue_batch_generation_job(
+                        request.user, item["input_type"], text, deck, credits_charged=credits
+                    )
+                )
+
+        return Response(
+            GenerationJobSerializer(jobs, many=True).data,
+            status=status.HTTP_202_ACCEPTED,
+        )
+
+
+class GenerationJobDetailView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        job = get_object_or_404(GenerationJob, pk=pk, user=request.user)
+        return Response(GenerationJobSerializer(job).data)
+
+
+def _sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _flashcard_events(chunks: list[str], duplicate_index=None, tokens_saved: int = 0):
+    # Chunks are streamed one after another so cards keep arriving in
+    # document order; duplicate fronts across chunks are skipped, as are
+    # near-duplicates of cards already in the target deck.
+    seen = set()
+    count = 0
+    for chunk in chunks:
+        cards = get_cached_flashcards(chunk)
+        from_cache = cards is not None
+        if not from_cache:
+            cards = []
+
+        try:
+            source = cards if from_cache else stream_flashcards(chunk)
+            for card in source:
+                if not from_cache:
+                    cards.append(card)
+                key = flashcard_front_key(card)
+                if key in seen:
+                    continue
+                seen.add(key)
+                if duplicate_index is not None:
+                    if duplicate_index.has_near_duplicate(card["front"]):
+                        continue
+                    duplicate_index.add(card["front"])
+                count += 1
+                yield _sse_event("card", card)
+        except APIException as e:
+            yield _sse_event("error", {"detail": str(e.detail)})
+            return
+        except Exception:
+            logger.exception("Streaming flashcard generation failed")
+            yield _sse_event("error", {"detail": FlashcardGenerationError.default_detail})
+            return
+
+        if not from_cache:
+            cache_flashcards(chunk, cards)
+
+    yield _sse_event("done", {"count": count, "input_tokens_saved": tokens_saved})
+
+
+class GenerateFlashcardsStreamView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def perform_content_negotiation(self, request, force=False):
+        # SSE clients send "Accept: text/event-stream", which no DRF renderer
+        # offers. The stream itself bypasses rendering, and errors raised
+        # before it starts are rendered as JSON whatever the client asked for.
+        return super().perform_content_negotiation(request, force=True)
+
+    def post(self, request):
+        serializer = GenerateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        deck_id = serializer.validated_data.get("deck_id")
+        duplicate_index = (
+            get_deck_simhash_index(get_user_deck(request.user, deck_id)) if deck_id else None
+        )
+        input_type, text = resolve_generation_input(request.user, serializer.validated_data)
+        text, tokens_saved = compact_generation_input(text, input_type)
+        chunks = split_text_into_chunks(text)
         profile = request.user.profile
-        check_and_deduct_credits(profile, serializer.validated_data["input_type"])
+        check_and_deduct_credits(profile, input_type, units=credit_units(text))
+
+        response = StreamingHttpResponse(
+            _flashcard_events(chunks, duplicate_index, tokens_saved),
+            content_type="text/event-stream",
+        )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+
+class GenerationCacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(get_generation_cache_stats())
+
+
+class LLMMetricsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(llm.metrics.snapshot())
 
-        cards_data = generate_flashcards(text=serializer.validated_data["text"])
 
-        return Response(cards_data)
+class SupadataMetricsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(supadata.metrics.snapshot())
 
 
 class ExtractPDFView(APIView):
     permission_classes = [IsAuthenticated]
 
-    @method_decorator(ratelimit(key='user', rate='20/h', method='POST', block=True))
     def post(self, request):
         file = request.FILES.get("pdf")
         if not file:
@@ -60,21 +346,40 @@ class ExtractPDFView(APIView):
                 status=413,
             )
 
-        try:
-            result = extract_pdf_text(file)
-            return Response(result)
-        except Exception:
-            logger.exception("PDF extraction failed")
-            return Response(
-                {"detail": "Failed to extract PDF. The file may be corrupted."},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            )
+        # Re-uploads of a file we have already parsed are served from the
+        # cache and, costing no parsing work, don't count against the limit.
+        content_hash = pdf_content_hash(file)
+        result = get_cached_pdf_extraction(content_hash)
+        if result is None:
+            if is_ratelimited(
+                request,
+                group="ai.extract_pdf",
+                key="user",
+                rate=PDF_EXTRACT_RATE,
+                method="POST",
+                increment=True,
+            ):
+                raise Ratelimited()
+
+            try:
+                result = extract_pdf_text(file)
+            except APIException:
+                raise
+            except Exception:
+                logger.exception("PDF extraction failed")
+                return Response(
+                    {"detail": "Failed to extract PDF. The file may be corrupted."},
+                    status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                )
+            cache_pdf_extraction(content_hash, result)
+
+        result["document_id"] = store_pdf_document(request.user, content_hash, result["pages"])
+        return StreamingJSONResponse(result, request)
 
 
 class ExtractYouTubeView(APIView):
     permission_classes = [IsAuthenticated]
 
-    @method_decorator(ratelimit(key='user', rate='10/h', method='POST', block=True))
     def post(self, request):
         url = (request.data.get("url") or "").strip()
         if not url:
@@ -88,19 +393,53 @@ class ExtractYouTubeView(APIView):
         if end_seconds is not None:
             end_seconds = int(end_seconds)
 
-        try:
-            result = extract_youtube_transcript(url, start_seconds, end_seconds)
-            return Response(result)
-        except TranscriptsDisabled:
+        include_minutes = serializers.BooleanField().run_validation(
+            request.data.get("include_minutes", False)
+        )
+
+        video_id = extract_video_id(url)
+        if not video_id:
             return Response(
-                {"detail": "This video has transcripts disabled."},
-                status=422,
+                {"detail": "Invalid YouTube URL."},
+                status=status.HTTP_400_BAD_REQUEST,
             )
-        except NoTranscriptFound:
-            return Response(
-                {"detail": "No transcript found. The video may not have captions available."},
-                status=422,
+
+        # Range changes and videos someone already fetched are served from
+        # the shared transcript cache and don't count against the limit.
+        transcript = get_cached_transcript(video_id)
+        if transcript is None and is_ratelimited(
+            request,
+            group="ai.extract_youtube",
+            key="user",
+            rate=YOUTUBE_EXTRACT_RATE,
+            method="POST",
+            increment=True,
+        ):
+            raise Ratelimited()
+
+        try:
+            if transcript is None:
+                transcript, job = request_youtube_transcript(request.user, video_id, url)
+                if job is not None:
+                    # Still being transcribed: the client polls the job and
+                    # repeats this request once it completes.
+                    return Response(
+                        TranscriptJobSerializer(job).data,
+                        status=status.HTTP_202_ACCEPTED,
+                    )
+            result = process_youtube_transcript(
+                video_id,
+                transcript,
+                start_seconds,
+                end_seconds,
+                include_minutes=include_minutes,
             )
+            result["document_id"] = store_transcript_document(request.user, video_id, transcript)
+            return StreamingJSONResponse(result, request)
+        except TranscriptsDisabled:
+            return Response({"detail": TRANSCRIPTS_DISABLED_MESSAGE}, status=422)
+        except NoTranscriptFound:
+            return Response({"detail": NO_TRANSCRIPT_MESSAGE}, status=422)
         except RequestBlocked:
             logger.warning("YouTube request blocked during transcript extraction")
             return Response(
@@ -118,3 +457,67 @@ class ExtractYouTubeView(APIView):
                 {"detail": "Failed to extract transcript. Please try again."},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
+
+
+def _transcript_minutes(request, video_id):
+    # Memoized on the request: the ETag check and the view both need the
+    # entry, and it should only be read from the cache once.
+    if not hasattr(request, "_transcript_minutes"):
+        request._transcript_minutes = get_transcript_minutes(video_id)
+    return request._transcript_minutes
+
+
+def _transcript_minutes_etag(request, video_id):
+    entry = _transcript_minutes(request, video_id)
+    return entry["etag"] if entry is not None else None
+
+
+def _optional_int_param(request, name: str) -> int | None:
+    value = request.query_params.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValidationError({name: "Must be an integer."})
+
+
+class TranscriptMinutesView(APIView):
+    """
+    Per-minute previews for the YouTube range selector, served separately
+    from the extraction so range changes don't resend them. The ETag lets
+    clients revalidate with If-None-Match and get a 304; `start_minute` and
+    `end_minute` fetch just the visible window of the timeline.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    @method_decorator(condition(etag_func=_transcript_minutes_etag))
+    def get(self, request, video_id):
+        entry = _transcript_minutes(request, video_id)
+        if entry is None:
+            return Response(
+                {"detail": "Transcript not found or expired. Please extract the video again."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        start_minute = _optional_int_param(request, "start_minute")
+        end_minute = _optional_int_param(request, "end_minute")
+        response = Response(
+            {
+                "video_id": video_id,
+                "minutes": window_minutes(entry["minutes"], start_minute, end_minute),
+            }
+        )
+        patch_cache_control(response, private=True, max_age=TRANSCRIPT_MINUTES_MAX_AGE_SECONDS)
+        return response
+
+
+class TranscriptJobDetailView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        # Read-only: poll_transcript_jobs is what moves jobs forward, so
+        # client polling never turns into upstream Supadata requests.
+        job = get_object_or_404(TranscriptJob, pk=pk, users=request.user)
+        return Response(TranscriptJobSerializer(job).data)
@@ -0,0 +1,142 @@
+# Generated by Django 6.0.2 on 2026-10-17 11:40
+
+import re
+from hashlib import blake2b
+
+from django.db import migrations, models
+
+# A frozen copy of apps.decks.similarity as of this migration, so the
+# backfill keeps producing these signatures if the live code changes.
+# Signatures are taken over content words only; fronts without any get
+# none.
+SIMHASH_BITS = 64
+SIMHASH_BANDS = 4
+SIMHASH_BAND_BITS = SIMHASH_BITS // SIMHASH_BANDS
+
+_MASK = (1 << SIMHASH_BITS) - 1
+_BAND_MASK = (1 << SIMHASH_BAND_BITS) - 1
+_WORD = re.compile(r"\w+")
+_STOP_WORDS = frozenset(
+    """
+    a an the and or of in on at to for from by with as into about
+    is are was were be been being do does did has have had s
+    what which who whom whose when where why how
+    this that these those it its there their they
+    """.split()
+)
+
+SIGNATURE_FIELDS = [
+    "front_simhash",
+    "simhash_band_0",
+    "simhash_band_1",
+    "simhash_band_2",
+    "simhash_band_3",
+]
+
+
+def compute_simhash(text):
+    words = [word for word in _WORD.findall(text.casefold()) if word not in _STOP_WORDS]
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    if not features:
+        return None
+
+    weights = [0] * SIMHASH_BITS
+    for feature in features:
+        value = int.from_bytes(blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+
+    signature = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            signature |= 1 << bit
+    return signature - (1 << SIMHASH_BITS) if signature >> (SIMHASH_BITS - 1) else signature
+
+
+def simhash_bands(signature):
+    if signature is None:
+        return [None] * SIMHASH_BANDS
+    unsigned = signature & _MASK
+    return [
+        unsigned >> (band * SIMHASH_BAND_BITS) & _BAND_MASK
+        for band in range(SIMHASH_BANDS)
+    ]
+
+
+def backfill_front_signatures(apps, schema_editor):
+    Flashcard = apps.get_model("decks", "Flashcard")
+    batch = []
+    for card in Flashcard.objects.only("id", "front").iterator(chunk_size=2000):
+        card.front_simhash = compute_simhash(card.front)
+        (
+            card.simhash_band_0,
+            card.simhash_band_1,
+            card.simhash_band_2,
+            card.simhash_band_3,
+        ) = simhash_bands(card.front_simhash)
+        batch.append(card)
+        if len(batch) >= 2000:
+            Flashcard.objects.bulk_update(batch, SIGNATURE_FIELDS)
+            batch = []
+    if batch:
+        Flashcard.objects.bulk_update(batch, SIGNATURE_FIELDS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("decks", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="flashcard",
+            name="front_simhash",
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="flashcard",
+            name="simhash_band_0",
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="flashcard",
+            name="simhash_band_1",
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="flashcard",
+            name="simhash_band_2",
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="flashcard",
+            name="simhash_band_3",
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="flashcard",
+            index=models.Index(
+                fields=["deck", "simhash_band_0"], name="decks_flash_deck_id_2948fe_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="flashcard",
+            index=models.Index(
+                fields=["deck", "simhash_band_1"], name="decks_flash_deck_id_752c59_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="flashcard",
+            index=models.Index(
+                fields=["deck", "simhash_band_2"], name="decks_flash_deck_id_34b160_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="flashcard",
+            index=models.Index(
+                fields=["deck", "simhash_band_3"], name="decks_flash_deck_id_3106e0_idx"
+            ),
+        ),
+        migrations.RunPython(backfill_front_signatures, migrations.RunPython.noop),
+    ]
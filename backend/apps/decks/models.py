@@ -3,6 +3,8 @@ import uuid
 from django.conf import settings
 from django.db import models
 
+from apps.decks.similarity import compute_simhash, simhash_bands
+
 
 class Deck(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -28,9 +30,34 @@ class Flashcard(models.Model):
     back = models.TextField()
     order = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
+    front_simhash = models.BigIntegerField(blank=True, null=True, editable=False)
+    simhash_band_0 = models.IntegerField(blank=True, null=True, editable=False)
+    simhash_band_1 = models.IntegerField(blank=True, null=True, editable=False)
+    simhash_band_2 = models.IntegerField(blank=True, null=True, editable=False)
+    simhash_band_3 = models.IntegerField(blank=True, null=True, editable=False)
 
     class Meta:
         ordering = ["order"]
+        indexes = [
+            models.Index(fields=["deck", "simhash_band_0"]),
+            models.Index(fields=["deck", "simhash_band_1"]),
+            models.Index(fields=["deck", "simhash_band_2"]),
+            models.Index(fields=["deck", "simhash_band_3"]),
+        ]
 
     def __str__(self):
         return self.front
+
+    def set_front_signature(self):
+        self.front_simhash = compute_simhash(self.front)
+        (
+            self.simhash_band_0,
+            self.simhash_band_1,
+            self.simhash_band_2,
+            self.simhash_band_3,
+        ) = simhash_bands(self.front_simhash)
+
+    def save(self, *args, **kwargs):
+        # bulk_create skips save(), so bulk callers set the signature themselves.
+        self.set_front_signature()
+        super().save(*args, **kwargs)
@@ -1,7 +1,11 @@
-from django.db.models import Count
+from django.db.models import Count, Q
 from django.shortcuts import get_object_or_404
 
 from apps.decks.models import Deck, Flashcard
+from apps.decks.similarity import SIMHASH_BANDS, SimHashIndex, compute_simhash, simhash_bands
+
+MAX_DECKS_PER_USER = 500
+MAX_CARDS_PER_DECK = 1000
 
 
 def get_user_decks(user):
@@ -22,3 +26,66 @@ def get_user_flashcard(user, flashcard_id):
 
 def create_flashcard(deck, validated_data):
     return Flashcard.objects.create(deck=deck, **validated_data)
+
+
+def add_flashcards_to_deck(deck, cards: list[dict], start_order: int | None = None) -> list[Flashcard]:
+    if start_order is None:
+        start_order = deck.flashcards.count()
+    flashcards = [
+        Flashcard(
+            deck=deck,
+            front=card["front"],
+            back=card["back"],
+            order=start_order + i,
+        )
+        for i, card in enumerate(cards)
+    ]
+    # bulk_create bypasses Flashcard.save(), which normally sets these.
+    for flashcard in flashcards:
+        flashcard.set_front_signature()
+    return Flashcard.objects.bulk_create(flashcards)
+
+
+def get_deck_simhash_index(deck, fronts=None) -> SimHashIndex:
+    """
+    Loads the deck's front signatures into an in-memory index. When `fronts`
+    is given only cards sharing at least one signature band with one of
+    them are fetched, using the indexed band columns.
+    """
+    cards = deck.flashcards.exclude(front_simhash=None)
+    if fronts is not None:
+        band_values = [set() for _ in range(SIMHASH_BANDS)]
+        for front in fronts:
+            signature = compute_simhash(front)
+            if signature is None:
+                continue
+            for values, band in zip(band_values, simhash_bands(signature)):
+                values.add(band)
+        if not any(band_values):
+            return SimHashIndex()
+        match = Q()
+        for band, values in enumerate(band_values):
+            match |= Q(**{f"simhash_band_{band}__in": values})
+        cards = cards.filter(match)
+    return SimHashIndex(cards.values_list("front_simhash", "front"))
+
+
+def find_near_duplicates(deck, cards: list[dict]) -> list[bool]:
+    """
+    Flags each card whose front is a near-duplicate of a card already in the
+    deck or of an earlier card in the same batch.
+    """
+    index = get_deck_simhash_index(deck, [card["front"] for card in cards])
+    flags = []
+    for card in cards:
+        duplicate = index.has_near_duplicate(card["front"])
+        if not duplicate:
+            index.add(card["front"])
+        flags.append(duplicate)
+    return flags
+
+
+def drop_near_duplicates(deck, cards: list[dict]) -> list[dict]:
+    """Filters out the cards find_near_duplicates flags."""
+    flags = find_near_duplicates(deck, cards)
+    return [card for card, duplicate in zip(cards, flags) if not duplicate]
@@ -0,0 +1,116 @@
+"""
+Near-duplicate detection for flashcard fronts.
+
+Each front is reduced to its content words (casefolded, with question
+words, articles and other function words removed) and a 64-bit SimHash
+over their unigrams and bigrams. Splitting the signature into
+SIMHASH_BANDS bands of 16 bits lets candidates be found with equality
+lookups on indexed band columns instead of comparing every pair.
+
+Flashcard fronts are short, and on a handful of features a SimHash is
+too coarse to decide on its own: "population of France" and "population
+of Mexico" can land a few bits apart. Candidates sharing a band are
+therefore confirmed by the Jaccard similarity of their content words,
+which must reach NEAR_DUPLICATE_MIN_SIMILARITY. Fronts with no content
+words get no signature and never match.
+"""
+
+import re
+from hashlib import blake2b
+
+SIMHASH_BITS = 64
+SIMHASH_BANDS = 4
+SIMHASH_BAND_BITS = SIMHASH_BITS // SIMHASH_BANDS
+NEAR_DUPLICATE_MIN_SIMILARITY = 0.6
+
+_MASK = (1 << SIMHASH_BITS) - 1
+_BAND_MASK = (1 << SIMHASH_BAND_BITS) - 1
+_WORD = re.compile(r"\w+")
+_STOP_WORDS = frozenset(
+    """
+    a an the and or of in on at to for from by with as into about
+    is are was were be been being do does did has have had s
+    what which who whom whose when where why how
+    this that these those it its there their they
+    """.split()
+)
+
+
+def content_words(text: str) -> list[str]:
+    return [word for word in _WORD.findall(text.casefold()) if word not in _STOP_WORDS]
+
+
+def _features(words: list[str]) -> list[str]:
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def compute_simhash(text: str) -> int | None:
+    """
+    Returns the signature as a signed 64-bit int so it fits a
+    BigIntegerField, or None when `text` has no content words.
+    """
+    features = _features(content_words(text))
+    if not features:
+        return None
+
+    weights = [0] * SIMHASH_BITS
+    for feature in features:
+        value = int.from_bytes(blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+
+    signature = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            signature |= 1 << bit
+    return signature - (1 << SIMHASH_BITS) if signature >> (SIMHASH_BITS - 1) else signature
+
+
+def simhash_bands(signature: int | None) -> list[int | None]:
+    if signature is None:
+        return [None] * SIMHASH_BANDS
+    unsigned = signature & _MASK
+    return [
+        unsigned >> (band * SIMHASH_BAND_BITS) & _BAND_MASK
+        for band in range(SIMHASH_BANDS)
+    ]
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return ((a ^ b) & _MASK).bit_count()
+
+
+def similarity(a: frozenset, b: frozenset) -> float:
+    """Jaccard similarity of two content-word sets."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class SimHashIndex:
+    """In-memory banded index used to check a batch of fronts at once."""
+
+    def __init__(self, entries=()):
+        self._bands: list[dict[int, list[frozenset]]] = [{} for _ in range(SIMHASH_BANDS)]
+        for signature, front in entries:
+            self.add(front, signature)
+
+    def add(self, front: str, signature: int | None = None) -> None:
+        if signature is None:
+            signature = compute_simhash(front)
+        if signature is None:
+            return
+        words = frozenset(content_words(front))
+        for band, value in zip(self._bands, simhash_bands(signature)):
+            band.setdefault(value, []).append(words)
+
+    def has_near_duplicate(self, front: str) -> bool:
+        signature = compute_simhash(front)
+        if signature is None:
+            return False
+        words = frozenset(content_words(front))
+        for band, value in zip(self._bands, simhash_bands(signature)):
+            for candidate in band.get(value, ()):
+                if similarity(words, candidate) >= NEAR_DUPLICATE_MIN_SIMILARITY:
+                    return True
+        return False
@@ -1,3 +1,124 @@
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from apps.decks.models import Deck, Flashcard
+from apps.decks.services import drop_near_duplicates, find_near_duplicates
+from apps.decks.similarity import (
+    SIMHASH_BANDS,
+    SimHashIndex,
+    compute_simhash,
+    hamming_distance,
+    simhash_bands,
+)
+from apps.users.models import User
+
+
+def _is_near_duplicate(a: str, b: str) -> bool:
+    index = SimHashIndex()
+    index.add(a)
+    return index.has_near_duplicate(b)
+
+
+class SimHashTests(SimpleTestCase):
+    def test_signature_fits_signed_bigint(self):
+        for text in ("mitochondria", "What is the capital of France?", "x " * 500):
+            signature = compute_simhash(text)
+            self.assertGreaterEqual(signature, -(2**63))
+            self.assertLess(signature, 2**63)
+
+    def test_bands_cover_the_signature(self):
+        signature = compute_simhash("Which enzyme unwinds DNA?")
+        bands = simhash_bands(signature)
+        self.assertEqual(len(bands), SIMHASH_BANDS)
+        rebuilt = sum(band << (16 * i) for i, band in enumerate(bands))
+        self.assertEqual(hamming_distance(rebuilt, signature), 0)
+
+    def test_function_words_and_case_are_ignored(self):
+        self.assertEqual(
+            compute_simhash("What is the capital of France?"),
+            compute_simhash("capital of FRANCE"),
+        )
+
+    def test_front_without_content_words_has_no_signature(self):
+        for text in ("", "?!", "What is it?"):
+            self.assertIsNone(compute_simhash(text))
+        self.assertEqual(simhash_bands(None), [None] * SIMHASH_BANDS)
+
+
+class SimHashIndexTests(SimpleTestCase):
+    def test_rephrasing_is_a_near_duplicate(self):
+        self.assertTrue(
+            _is_near_duplicate("What is the capital of France?", "What's the capital of France?")
+        )
+
+    def test_fronts_differing_in_their_subject_are_not(self):
+        self.assertFalse(_is_near_duplicate("population of France", "population of Mexico"))
+        self.assertFalse(
+            _is_near_duplicate(
+                "What is the population of France?", "What is the population of Mexico?"
+            )
+        )
+        self.assertFalse(_is_near_duplicate("Define mitochondria", "Define mitosis"))
+
+    def test_fronts_without_content_words_never_match(self):
+        self.assertFalse(_is_near_duplicate("?", "!!"))
+        self.assertFalse(_is_near_duplicate("What is it?", "What is it?"))
+
+
+class NearDuplicateServiceTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="decks@example.com")
+        self.deck = Deck.objects.create(user=self.user, title="Geography")
+        Flashcard.objects.create(deck=self.deck, front="What is the capital of France?", back="Paris")
+
+    def test_flags_duplicates_of_deck_and_of_earlier_cards(self):
+        cards = [
+            {"front": "Capital of France?", "back": "Paris"},
+            {"front": "What is the capital of Spain?", "back": "Madrid"},
+            {"front": "What's the capital of Spain?", "back": "Madrid"},
+        ]
+        self.assertEqual(find_near_duplicates(self.deck, cards), [True, False, True])
+        self.assertEqual(drop_near_duplicates(self.deck, cards), [cards[1]])
+
+
+class BulkCreateFlashcardsViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="bulk@example.com")
+        self.deck = Deck.objects.create(user=self.user, title="Geography")
+        Flashcard.objects.create(deck=self.deck, front="What is the capital of France?", back="Paris")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse("flashcard_bulk_create", args=[self.deck.id])
+        self.cards = [
+            {"front": "Capital of France?", "back": "Paris"},
+            {"front": "What is the capital of Spain?", "back": "Madrid"},
+        ]
+
+    def test_duplicates_are_created_and_flagged_by_default(self):
+        response = self.client.post(self.url, {"flashcards": self.cards}, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([card["near_duplicate"] for card in response.data], [True, False])
+        self.assertEqual(self.deck.flashcards.count(), 3)
+
+    def test_skip_duplicates_drops_them(self):
+        response = self.client.post(
+            self.url, {"flashcards": self.cards, "skip_duplicates": "true"}, format="json"
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([card["front"] for card in response.data], [self.cards[1]["front"]])
+        self.assertEqual(self.deck.flashcards.count(), 2)
+
+    def test_skip_duplicates_false_string_is_false(self):
+        response = self.client.post(
+            self.url, {"flashcards": self.cards, "skip_duplicates": "false"}, format="json"
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.deck.flashcards.count(), 3)
+
+    def test_invalid_skip_duplicates_is_rejected(self):
+        response = self.client.post(
+            self.url, {"flashcards": self.cards, "skip_duplicates": "maybe"}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.deck.flashcards.count(), 1)
@@ -1,5 +1,5 @@
 from django.shortcuts import get_object_or_404
-from rest_framework import status
+from rest_framework import serializers, status
 from rest_framework.exceptions import PermissionDenied
 from rest_framework.generics import (
     CreateAPIView,
@@ -9,12 +9,17 @@ from rest_framework.generics import (
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from apps.decks.models import Deck, Flashcard
+from apps.decks.models import Deck
 from apps.decks.serializers import DeckDetailSerializer, DeckSerializer, FlashcardSerializer
-from apps.decks.services import get_user_deck, get_user_decks, get_user_flashcard
-
-MAX_DECKS_PER_USER = 500
-MAX_CARDS_PER_DECK = 1000
+from apps.decks.services import (
+    MAX_CARDS_PER_DECK,
+    MAX_DECKS_PER_USER,
+    add_flashcards_to_deck,
+    find_near_duplicates,
+    get_user_deck,
+    get_user_decks,
+    get_user_flashcard,
+)
 
 
 class DeckListCreateView(ListCreateAPIView):
@@ -69,6 +74,18 @@ class BulkCreateFlashcardsView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+        skip_duplicates = serializers.BooleanField().run_validation(
+            request.data.get("skip_duplicates", False)
+        )
+        duplicate_flags = find_near_duplicates(deck, flashcards_data)
+        if skip_duplicates:
+            flashcards_data = [
+                card
+                for card, duplicate in zip(flashcards_data, duplicate_flags)
+                if not duplicate
+            ]
+            duplicate_flags = [False] * len(flashcards_data)
+
         existing_count = deck.flashcards.count()
         if existing_count + len(flashcards_data) > MAX_CARDS_PER_DECK:
             return Response(
@@ -76,17 +93,11 @@ class BulkCreateFlashcardsView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        flashcards = Flashcard.objects.bulk_create([
-            Flashcard(
-                deck=deck,
-                front=card["front"],
-                back=card["back"],
-                order=existing_count + i,
-            )
-            for i, card in enumerate(flashcards_data)
-        ])
+        flashcards = add_flashcards_to_deck(deck, flashcards_data, start_order=existing_count)
 
-        return Response(
-            FlashcardSerializer(flashcards, many=True).data,
-            status=status.HTTP_201_CREATED,
-        )
+        # Suspected near-duplicates are created but flagged, so the client
+        # can offer to remove them; skip_duplicates=true drops them instead.
+        data = FlashcardSerializer(flashcards, many=True).data
+        for card, duplicate in zip(data, duplicate_flags):
+            card["near_duplicate"] = duplicate
+        return Response(data, status=status.HTTP_201_CREATED)
@@ -0,0 +1,78 @@
+import json
+import re
+from collections.abc import Iterator
+
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence
+from rest_framework.utils.encoders import JSONEncoder
+
+STREAMING_JSON_CHUNK_BYTES = 64 * 1024
+
+_ACCEPTS_GZIP = re.compile(r"\bgzip\b")
+
+
+def _encode(value) -> str:
+    # Same output as DRF's JSONRenderer defaults: compact, UTF-8 unescaped.
+    return json.dumps(value, cls=JSONEncoder, ensure_ascii=False, separators=(",", ":"))
+
+
+def _iter_json(value, depth: int) -> Iterator[str]:
+    # Only the outer containers are walked; everything below `depth` is
+    # handed to the C encoder in one call.
+    if depth and isinstance(value, dict):
+        yield "{"
+        for i, (key, item) in enumerate(value.items()):
+            yield f"{',' if i else ''}{_encode(str(key))}:"
+            yield from _iter_json(item, depth - 1)
+        yield "}"
+    elif depth and isinstance(value, (list, tuple)):
+        yield "["
+        for i, item in enumerate(value):
+            if i:
+                yield ","
+            yield from _iter_json(item, depth - 1)
+        yield "]"
+    else:
+        yield _encode(value)
+
+
+def iter_json_bytes(value, depth: int = 2) -> Iterator[bytes]:
+    """Encodes `value` as JSON in chunks of about STREAMING_JSON_CHUNK_BYTES."""
+    buffer = []
+    size = 0
+    for piece in _iter_json(value, depth):
+        buffer.append(piece)
+        size += len(piece)
+        if size >= STREAMING_JSON_CHUNK_BYTES:
+            yield "".join(buffer).encode("utf-8")
+            buffer = []
+            size = 0
+    if buffer:
+        yield "".join(buffer).encode("utf-8")
+
+
+class StreamingJSONResponse(StreamingHttpResponse):
+    """
+    JSON response encoded while it is sent, for large payloads such as
+    extracted documents, so the whole body never sits in one buffer. When
+    `request` accepts gzip the chunks are compressed on the fly.
+
+    Compression is done here rather than with gzip_page or GZipMiddleware:
+    the decorator runs before DRF renders error responses, and the
+    middleware would buffer the SSE generation stream.
+    """
+
+    def __init__(self, data, request=None, status=200, **kwargs):
+        kwargs.setdefault("content_type", "application/json")
+        content = iter_json_bytes(data)
+        accepts_gzip = request is not None and _ACCEPTS_GZIP.search(
+            request.META.get("HTTP_ACCEPT_ENCODING", "")
+        )
+        if accepts_gzip:
+            content = compress_sequence(content)
+        super().__init__(content, status=status, **kwargs)
+        if request is not None:
+            patch_vary_headers(self, ("Accept-Encoding",))
+        if accepts_gzip:
+            self.headers["Content-Encoding"] = "gzip"
@@ -91,6 +91,9 @@ DATABASES = {
 }
 
 # Cache
+# Redis should run with maxmemory-policy allkeys-lru so that generation and
+# extraction cache entries are evicted least-recently-used under memory
+# pressure, on top of their per-key TTLs.
 CACHES = {
     "default": {
         "BACKEND": "django_redis.cache.RedisCache",
@@ -101,6 +104,13 @@ CACHES = {
     },
 }
 
+# File uploads
+# Spool every upload to a temporary file instead of holding small ones in
+# memory; PDF extraction memory-maps the file rather than reading it.
+FILE_UPLOAD_HANDLERS = [
+    "django.core.files.uploadhandler.TemporaryFileUploadHandler",
+]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -144,6 +154,7 @@ AUTH_USER_MODEL = "users.User"
 
 # CORS
 CORS_ALLOWED_ORIGINS = env("CORS_ALLOWED_ORIGINS")
+CORS_EXPOSE_HEADERS = ["X-Failed-Chunks", "X-Input-Tokens-Saved"]
 
 # Proxy / Cloudflare settings
 USE_X_FORWARDED_HOST = True
@@ -168,8 +179,15 @@ SIMPLE_JWT = {
 
 # Claude API
 ANTHROPIC_API_KEY = env("ANTHROPIC_API_KEY")
+# Point at `manage.py run_fake_anthropic` to develop without the real API.
+ANTHROPIC_BASE_URL = env("ANTHROPIC_BASE_URL", default=None)
 SUPADATA_API_KEY = env("SUPADATA_API_KEY")
+# Point at `manage.py run_fake_supadata` to develop without the real API.
+SUPADATA_BASE_URL = env("SUPADATA_BASE_URL", default="https://api.supadata.ai")
 CLAUDE_MODEL = "claude-haiku-4-5-20251001"
+# Fire a second, identical generation request when the first runs past the
+# recent p95 latency (bounded to a small share of extra calls).
+LLM_HEDGING_ENABLED = env.bool("LLM_HEDGING_ENABLED", default=False)
 
 
 #Stripe 
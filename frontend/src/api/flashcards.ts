@@ -3,21 +3,100 @@ import type { FlashcardDraft } from "@/types";
 
 type GenerateInputType = "text" | "pdf" | "youtube";
 
-export function generateFlashcards(
-  text: string,
-  inputType: GenerateInputType = "text"
-) {
-  return client.post<FlashcardDraft[]>("/generate/", {
-    text,
-    input_type: inputType,
-  });
+// Either the text itself, or a document from /extract/pdf/ or
+// /extract/youtube/ and an optional page or time range within it, which
+// the backend resolves without the text being sent back.
+export type GenerateFlashcardsBody =
+  | { text: string; input_type?: GenerateInputType }
+  | {
+      document_id: string;
+      page_start?: number;
+      page_end?: number;
+      start_seconds?: number;
+      end_seconds?: number;
+    };
+
+export function generateFlashcards(body: GenerateFlashcardsBody) {
+  return client.post<FlashcardDraft[]>("/generate/", body);
+}
+
+export interface VideoSegment {
+  start_seconds: number;
+  end_seconds: number;
+  card_count: number;
+}
+
+interface VideoJobResult {
+  segments: VideoSegment[];
+  cards: FlashcardDraft[];
+}
+
+export interface WholeVideoResult extends VideoJobResult {
+  // Chunks whose generation failed; their credits were refunded.
+  failed_chunks: number;
+}
+
+type GenerationJob<Result> = {
+  id: string;
+  status: "pending" | "running" | "completed" | "failed";
+  result: Result | null;
+  failed_chunks: number;
+  error: string;
+};
+
+const GENERATION_JOB_POLL_MS = 2000;
+
+const wait = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms));
+
+// Whole-video generation runs as a background job: /generate/video/ answers
+// 202 with the job, which is polled until it finishes.
+// With a deck, cards near-duplicating ones already in it are left out.
+export async function generateWholeVideo(
+  documentId: string,
+  deckId?: string
+): Promise<WholeVideoResult> {
+  let job = (
+    await client.post<GenerationJob<VideoJobResult>>("/generate/video/", {
+      document_id: documentId,
+      ...(deckId ? { deck_id: deckId } : {}),
+    })
+  ).data;
+  while (job.status === "pending" || job.status === "running") {
+    await wait(GENERATION_JOB_POLL_MS);
+    job = (
+      await client.get<GenerationJob<VideoJobResult>>(
+        `/generate/jobs/${job.id}/`
+      )
+    ).data;
+  }
+  if (job.status === "failed" || !job.result) {
+    // Same shape as an axios error so callers keep one error path.
+    throw { response: { data: { detail: job.error } } };
+  }
+  return { ...job.result, failed_chunks: job.failed_chunks };
 }
 
-export function bulkCreateFlashcards(
+const BULK_CREATE_MAX_CARDS = 100;
+
+// The bulk endpoint takes at most 100 cards per request, which whole-video
+// generation can exceed, so larger sets are sent in consecutive batches.
+export async function bulkCreateFlashcards(
   deckId: string,
   flashcards: FlashcardDraft[]
 ) {
-  return client.post(`/decks/${deckId}/cards/bulk/`, { flashcards });
+  let res = await client.post(`/decks/${deckId}/cards/bulk/`, {
+    flashcards: flashcards.slice(0, BULK_CREATE_MAX_CARDS),
+  });
+  for (
+    let i = BULK_CREATE_MAX_CARDS;
+    i < flashcards.length;
+    i += BULK_CREATE_MAX_CARDS
+  ) {
+    res = await client.post(`/decks/${deckId}/cards/bulk/`, {
+      flashcards: flashcards.slice(i, i + BULK_CREATE_MAX_CARDS),
+    });
+  }
+  return res;
 }
 
 export function deleteFlashcard(id: string) {
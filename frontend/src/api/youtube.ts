@@ -0,0 +1,51 @@
+import client from "./client";
+import type { YoutubeMinute } from "@/state/youtubeStore";
+
+const TRANSCRIPT_JOB_POLL_MS = 2000;
+
+type ExtractYoutubeBody = {
+  url: string;
+  start_seconds?: number;
+  end_seconds?: number;
+};
+
+type TranscriptJob = {
+  id: string;
+  status: "pending" | "completed" | "failed";
+  error: string;
+};
+
+const wait = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms));
+
+// Long videos are transcribed in a background job: /extract/youtube/ answers
+// 202 with the job, which is polled until it finishes. The transcript is then
+// cached server-side, so repeating the request returns it straight away.
+export async function extractYoutube(body: ExtractYoutubeBody) {
+  let res = await client.post("/extract/youtube/", body);
+  while (res.status === 202) {
+    let job: TranscriptJob = res.data;
+    while (job.status === "pending") {
+      await wait(TRANSCRIPT_JOB_POLL_MS);
+      job = (await client.get<TranscriptJob>(`/extract/youtube/jobs/${job.id}/`)).data;
+    }
+    if (job.status === "failed") {
+      // Same shape as an axios error so callers keep one error path.
+      throw { response: { data: { detail: job.error } } };
+    }
+    res = await client.post("/extract/youtube/", body);
+  }
+  return res;
+}
+
+// Minute previews for the range selector. Served with an ETag and cached by
+// the browser, and windowed by start/end minute for long timelines.
+export function getYoutubeMinutes(
+  videoId: string,
+  startMinute?: number,
+  endMinute?: number
+) {
+  return client.get<{ video_id: string; minutes: YoutubeMinute[] }>(
+    `/extract/youtube/${videoId}/minutes/`,
+    { params: { start_minute: startMinute, end_minute: endMinute } }
+  );
+}
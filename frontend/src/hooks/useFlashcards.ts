@@ -4,19 +4,14 @@ import {
   deleteFlashcard,
   generateFlashcards,
   updateFlashcard,
+  type GenerateFlashcardsBody,
 } from "@/api/flashcards";
 import { QUERY_KEYS } from "@/hooks/queryKeys";
 import type { FlashcardDraft } from "@/types";
 
 export function useGenerateFlashcards() {
   return useMutation({
-    mutationFn: ({
-      text,
-      input_type = "text",
-    }: {
-      text: string;
-      input_type?: "text" | "pdf" | "youtube";
-    }) => generateFlashcards(text, input_type),
+    mutationFn: (body: GenerateFlashcardsBody) => generateFlashcards(body),
   });
 }
 
@@ -15,6 +15,8 @@ import {
 } from "lucide-react";
 import { toast } from "sonner";
 import client from "@/api/client";
+import { generateWholeVideo } from "@/api/flashcards";
+import { extractYoutube, getYoutubeMinutes } from "@/api/youtube";
 import { useDecks } from "@/hooks/useDecks";
 import {
   useGenerateFlashcards,
@@ -200,6 +202,16 @@ function getMinutePreview(
   return entry?.preview || "";
 }
 
+// Generation keeps the cards of the parts of a long input that worked, and
+// refunds the credits of the parts that didn't.
+function warnFailedChunks(count: number) {
+  if (count > 0) {
+    toast.warning(
+      `${count} part${count === 1 ? "" : "s"} of the input couldn't be turned into cards, so some may be missing. Their credits were refunded.`
+    );
+  }
+}
+
 export default function GeneratePage() {
   const navigate = useNavigate();
   const [searchParams] = useSearchParams();
@@ -221,6 +233,15 @@ export default function GeneratePage() {
   const [pdfPages, setPdfPages] = useState<string[]>(saved.pages);
   const [pdfTotalPages, setPdfTotalPages] = useState(saved.totalPages);
   const [pdfFilename, setPdfFilename] = useState(saved.filename);
+  const [pdfDocumentId, setPdfDocumentId] = useState(saved.documentId);
+  // The page range last loaded into the editor. While the editor still holds
+  // exactly that text, generation references the stored document instead of
+  // sending the text back.
+  const [loadedPdfRange, setLoadedPdfRange] = useState<{
+    text: string;
+    pageStart: number;
+    pageEnd: number;
+  } | null>(null);
   const [suggestedStart, setSuggestedStart] = useState(saved.suggestedStart);
   const [pageStart, setPageStart] = useState(saved.pageStart);
   const [pageEnd, setPageEnd] = useState(saved.pageEnd);
@@ -235,6 +256,7 @@ export default function GeneratePage() {
   // picks a time range and hits generate, which triggers a second API call.
   const [ytUrl, setYtUrl] = useState(savedYt.url);
   const [ytVideoId, setYtVideoId] = useState(savedYt.videoId);
+  const [ytDocumentId, setYtDocumentId] = useState(savedYt.documentId);
   const [ytDuration, setYtDuration] = useState(savedYt.totalDurationSeconds);
   const [ytNeedsSegmentation, setYtNeedsSegmentation] = useState(
     savedYt.needsSegmentation
@@ -253,6 +275,7 @@ export default function GeneratePage() {
   useEffect(() => {
     setYoutubeStore({
       videoId: ytVideoId,
+      documentId: ytDocumentId,
       url: ytUrl,
       totalDurationSeconds: ytDuration,
       needsSegmentation: ytNeedsSegmentation,
@@ -264,6 +287,7 @@ export default function GeneratePage() {
     });
   }, [
     ytVideoId,
+    ytDocumentId,
     ytUrl,
     ytDuration,
     ytNeedsSegmentation,
@@ -279,11 +303,20 @@ export default function GeneratePage() {
       pages: pdfPages,
       totalPages: pdfTotalPages,
       filename: pdfFilename,
+      documentId: pdfDocumentId,
       suggestedStart,
       pageStart,
       pageEnd,
     });
-  }, [pdfPages, pdfTotalPages, pdfFilename, suggestedStart, pageStart, pageEnd]);
+  }, [
+    pdfPages,
+    pdfTotalPages,
+    pdfFilename,
+    pdfDocumentId,
+    suggestedStart,
+    pageStart,
+    pageEnd,
+  ]);
 
   const { data: decks = [] } = useDecks();
   const { mutate: generate, isPending } = useGenerateFlashcards();
@@ -297,12 +330,23 @@ export default function GeneratePage() {
       return;
     }
     setDeckError(false);
+    const fromPdf =
+      pdfDocumentId && loadedPdfRange && loadedPdfRange.text === text
+        ? loadedPdfRange
+        : null;
     generate(
-      { text, input_type: 'text' },
+      fromPdf
+        ? {
+            document_id: pdfDocumentId,
+            page_start: fromPdf.pageStart,
+            page_end: fromPdf.pageEnd,
+          }
+        : { text, input_type: "text" },
       {
         onSuccess: (res) => {
           setGeneratedCards(res.data);
           toast.success(`${res.data.length} flashcards generated!`);
+          warnFailedChunks(Number(res.headers["x-failed-chunks"] ?? 0));
         },
         onError: (err: unknown) => {
           const resp = (err as { response?: { status?: number; data?: { detail?: string } } })?.response;
@@ -360,6 +404,7 @@ export default function GeneratePage() {
     resetYoutubeStore();
     setYtUrl("");
     setYtVideoId("");
+    setYtDocumentId("");
     setYtDuration(0);
     setYtNeedsSegmentation(false);
     setYtMinutes([]);
@@ -376,18 +421,19 @@ export default function GeneratePage() {
   // If it exceeds 50k chars, needs_segmentation=true and the sliders default
   // to the full video duration so the user must actively narrow the range
   // rather than silently getting a partial transcript. We leave ytText empty
-  // for segmented videos — the actual text fetch happens in
-  // handleYoutubeGenerate (phase 2) after the user confirms a time range.
+  // for segmented videos — the selected range is only sliced out server-side
+  // by handleYoutubeGenerate (phase 2), from the stored document.
   const handleYoutubeExtract = async () => {
     if (!ytUrl.trim()) return;
     setIsYtExtracting(true);
     try {
-      const res = await client.post("/extract/youtube/", { url: ytUrl });
+      const res = await extractYoutube({ url: ytUrl });
       const d = res.data;
       setYtVideoId(d.video_id);
+      setYtDocumentId(d.document_id);
       setYtDuration(d.total_duration_seconds);
       setYtNeedsSegmentation(d.needs_segmentation);
-      setYtMinutes(d.minutes);
+      setYtMinutes([]);
       setYtStartSeconds(d.start_seconds);
 
       if (!d.needs_segmentation) {
@@ -402,6 +448,11 @@ export default function GeneratePage() {
         setYtEndSeconds(d.end_seconds);
         setYtText("");
         setYtCharCount(0);
+        // Slider previews load separately; they're optional, so a failure
+        // just leaves the plain timestamps.
+        getYoutubeMinutes(d.video_id)
+          .then((minutesRes) => setYtMinutes(minutesRes.data.minutes))
+          .catch(() => {});
         toast.success(
           `Video is ${formatDuration(d.total_duration_seconds)} — recommended range pre-selected`
         );
@@ -416,88 +467,47 @@ export default function GeneratePage() {
     }
   };
 
-  // Phase 2: generates flashcards from the YouTube transcript. Two paths:
-  // - Short videos already have ytText from phase 1, so we skip straight
-  //   to the /generate/ call with the text we already hold in memory.
-  // - Long videos (ytNeedsSegmentation && !ytText) need a second call to
-  //   /extract/youtube/ with the user's chosen start_seconds/end_seconds
-  //   to fetch only the selected segment's text, then chains into /generate/.
-  //   We cache the fetched text in ytText so re-generating the same range
-  //   doesn't re-fetch.
-  const handleYoutubeGenerate = async () => {
+  // Phase 2: generates flashcards from the YouTube transcript by document
+  // id, so the transcript never travels back to the server:
+  // - Short videos already have ytText from phase 1, which is checked here
+  //   and generated from as a whole.
+  // - Long videos (ytNeedsSegmentation) send the user's chosen
+  //   start_seconds/end_seconds, and the backend slices that range out of
+  //   the stored transcript.
+  const handleYoutubeGenerate = () => {
     if (!selectedDeckId) {
       setDeckError(true);
       return;
     }
     setDeckError(false);
 
-    // If segmented and we need to fetch the text for the selected range
-    if (ytNeedsSegmentation && !ytText) {
-      setIsYtGenerating(true);
-      try {
-        const res = await client.post("/extract/youtube/", {
-          url: ytUrl,
-          start_seconds: ytStartSeconds,
-          end_seconds: ytEndSeconds,
-        });
-        const fetchedText = res.data.text;
-        setYtText(fetchedText);
-        setYtCharCount(res.data.char_count);
-
-        // Segmented videos intentionally keep all YouTube state after
-        // generation so the user can tweak the time range and re-generate.
-        generate(
-          { text: fetchedText, input_type: "youtube" },
-          {
-            onSuccess: (genRes) => {
-              setGeneratedCards(genRes.data);
-              toast.success(`${genRes.data.length} flashcards generated!`);
-            },
-            onError: (err: unknown) => {
-              const resp = (err as { response?: { status?: number; data?: { detail?: string } } })?.response;
-              if (resp?.status === 403) {
-                setUpgradeModalOpen(true);
-                return;
-              }
-              toast.error(resp?.data?.detail || "Failed to generate flashcards. Please try again.");
-            },
-            onSettled: () => setIsYtGenerating(false),
-          }
-        );
-      } catch (err: unknown) {
-        const raw = (err as { response?: { data?: { detail?: unknown } } })
-          ?.response?.data?.detail;
-        const message = Array.isArray(raw) ? raw[0] : raw;
+    const isShortVideo = !ytNeedsSegmentation;
+    if (isShortVideo) {
+      if (!ytText || ytText.length < MIN_CHARS) {
+        toast.error("Transcript is too short to generate flashcards.");
+        return;
+      }
+      if (ytText.length > YT_MAX_CHARS) {
         toast.error(
-          (typeof message === "string" && message) ||
-          "Failed to extract segment. Please try again."
+          `Transcript exceeds ${YT_MAX_CHARS.toLocaleString()} characters. Please use a shorter video.`
         );
-        setIsYtGenerating(false);
+        return;
       }
-      return;
-    }
-
-    // Text already available — either a short video (full transcript loaded
-    // in phase 1) or a segmented video whose range was already fetched.
-    const textToUse = ytText;
-    if (!textToUse || textToUse.length < MIN_CHARS) {
-      toast.error("Transcript is too short to generate flashcards.");
-      return;
-    }
-    if (textToUse.length > YT_MAX_CHARS) {
-      toast.error(
-        `Transcript exceeds ${YT_MAX_CHARS.toLocaleString()} characters. Please use a shorter video.`
-      );
-      return;
     }
     setIsYtGenerating(true);
-    const isShortVideo = !ytNeedsSegmentation;
     generate(
-      { text: textToUse, input_type: "youtube" },
+      isShortVideo
+        ? { document_id: ytDocumentId }
+        : {
+            document_id: ytDocumentId,
+            start_seconds: ytStartSeconds,
+            end_seconds: ytEndSeconds,
+          },
       {
         onSuccess: (res) => {
           setGeneratedCards(res.data);
           toast.success(`${res.data.length} flashcards generated!`);
+          warnFailedChunks(Number(res.headers["x-failed-chunks"] ?? 0));
           // Short videos are a one-shot flow — reset YouTube state so the
           // left panel returns to the URL input, ready for the next video.
           // Long/segmented videos keep state intact so the user can adjust
@@ -507,23 +517,57 @@ export default function GeneratePage() {
           }
         },
         onError: (err: unknown) => {
-          const resp = (err as { response?: { status?: number; data?: { detail?: string } } })?.response;
+          const resp = (err as { response?: { status?: number; data?: { detail?: string } | string[] } })?.response;
           if (resp?.status === 403) {
             setUpgradeModalOpen(true);
             return;
           }
-          toast.error(resp?.data?.detail || "Failed to generate flashcards. Please try again.");
+          // Problems with the selected range come back as a plain list.
+          const data = resp?.data;
+          const detail = Array.isArray(data) ? data[0] : data?.detail;
+          toast.error(detail || "Failed to generate flashcards. Please try again.");
         },
         onSettled: () => setIsYtGenerating(false),
       }
     );
   };
 
+  // Whole-video mode for long videos: the backend splits the transcript into
+  // segments, generates them all in parallel and returns one time-ordered
+  // card set, instead of the user stepping through ranges one at a time.
+  const handleYoutubeGenerateWholeVideo = async () => {
+    if (!selectedDeckId) {
+      setDeckError(true);
+      return;
+    }
+    setDeckError(false);
+    setIsYtGenerating(true);
+    try {
+      const result = await generateWholeVideo(ytDocumentId, selectedDeckId);
+      setGeneratedCards(result.cards);
+      toast.success(
+        `${result.cards.length} flashcards generated from ${result.segments.length} segments!`
+      );
+      warnFailedChunks(result.failed_chunks);
+    } catch (err: unknown) {
+      const resp = (err as { response?: { status?: number; data?: { detail?: string } } })?.response;
+      if (resp?.status === 403) {
+        setUpgradeModalOpen(true);
+        return;
+      }
+      toast.error(resp?.data?.detail || "Failed to generate flashcards. Please try again.");
+    } finally {
+      setIsYtGenerating(false);
+    }
+  };
+
   const resetPdfState = () => {
     resetPdfStore();
     setPdfPages([]);
     setPdfTotalPages(0);
     setPdfFilename("");
+    setPdfDocumentId("");
+    setLoadedPdfRange(null);
     setSuggestedStart(1);
     setPageStart(1);
     setPageEnd(1);
@@ -535,10 +579,12 @@ export default function GeneratePage() {
     formData.append("pdf", file);
     try {
       const res = await client.post("/extract/pdf/", formData);
-      const { pages, total_pages, suggested_start_page } = res.data;
+      const { pages, total_pages, suggested_start_page, document_id } = res.data;
       setPdfPages(pages);
       setPdfTotalPages(total_pages);
       setPdfFilename(file.name);
+      setPdfDocumentId(document_id);
+      setLoadedPdfRange(null);
       setSuggestedStart(suggested_start_page);
       setPageStart(suggested_start_page);
       setPageEnd(Math.min(suggested_start_page + 9, pages.length));
@@ -575,6 +621,7 @@ export default function GeneratePage() {
       return;
     }
     setText(joined);
+    setLoadedPdfRange({ text: joined, pageStart, pageEnd });
     setInputMode("text");
     toast.success(`Pages ${pageStart}–${pageEnd} loaded into editor`);
   };
@@ -937,6 +984,15 @@ export default function GeneratePage() {
                     </>
                   )}
                 </Button>
+
+                <Button
+                  variant="ghost"
+                  onClick={handleYoutubeGenerateWholeVideo}
+                  disabled={isYtGenerating || isPending || !ytDocumentId}
+                  className="w-full text-xs text-[#555b6e] hover:text-white hover:bg-[#2a2f42] cursor-pointer disabled:opacity-50 disabled:cursor-not-allowed"
+                >
+                  Or generate the whole video ({formatDuration(ytDuration)}) at once
+                </Button>
               </div>
             )
           ) : pdfPages.length === 0 ? (
@@ -2,6 +2,7 @@ export interface PdfStore {
   pages: string[];
   totalPages: number;
   filename: string;
+  documentId: string;
   suggestedStart: number;
   pageStart: number;
   pageEnd: number;
@@ -11,6 +12,7 @@ const defaults: PdfStore = {
   pages: [],
   totalPages: 0,
   filename: "",
+  documentId: "",
   suggestedStart: 1,
   pageStart: 1,
   pageEnd: 1,
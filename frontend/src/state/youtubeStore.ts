@@ -6,6 +6,7 @@ export interface YoutubeMinute {
 
 export interface YoutubeStore {
   videoId: string;
+  documentId: string;
   url: string;
   totalDurationSeconds: number;
   needsSegmentation: boolean;
@@ -18,6 +19,7 @@ export interface YoutubeStore {
 
 const defaults: YoutubeStore = {
   videoId: "",
+  documentId: "",
   url: "",
   totalDurationSeconds: 0,
   needsSegmentation: false,
@@ -21,11 +21,16 @@ export interface Flashcard {
   back: string;
   order: number;
   created_at: string;
+  // Set by the bulk endpoint on cards that look like an existing card.
+  near_duplicate?: boolean;
 }
 
 export interface FlashcardDraft {
   front: string;
   back: string;
+  // Set on cards from whole-video generation: the segment they came from.
+  start_seconds?: number;
+  end_seconds?: number;
 }
 
 export interface Profile {